@@ -0,0 +1,68 @@
+"""
+Benchmarks printed by: python manage.py run_benchmarks
+"""
+import datetime
+
+import pytz
+from django.utils.timezone import override
+from rest_framework import serializers as drf_serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from radioco.apps.api import serializers
+from radioco.apps.programmes.models import Episode
+from radioco.apps.radioco.benchmark_utils import measure_time
+from radioco.apps.radioco.test_utils import create_test_data
+from radioco.apps.schedules.models import Schedule, Transmission
+
+
+NUMBER_OF_TRANSMISSIONS = 1000
+
+
+def serialize_with_fields(serializer, transmissions):
+    """
+    Goes through every declared field of the serializer, the transmission serializers build the data by hand
+    """
+    return [drf_serializers.Serializer.to_representation(serializer, transmission) for transmission in transmissions]
+
+
+def serialize(serializer, transmissions):
+    return [serializer.to_representation(transmission) for transmission in transmissions]
+
+
+def create_transmissions():
+    """
+    Returns: Transmissions of the existing schedules, half of them with an episode
+    """
+    schedules = list(Schedule.objects.select_related('programme'))
+    episodes = {episode.programme_id: episode for episode in Episode.objects.all()}
+    start = pytz.utc.localize(datetime.datetime(2015, 3, 29))
+    return [
+        Transmission(
+            schedules[number % len(schedules)],
+            start + datetime.timedelta(hours=number),
+            episodes.get(schedules[number % len(schedules)].programme_id) if number % 2 else None)
+        for number in range(NUMBER_OF_TRANSMISSIONS)
+    ]
+
+
+def render(serializer_class, serialize, transmissions):
+    serializer = serializer_class(context={'request': APIRequestFactory().get('/')})
+    with override(timezone=pytz.timezone('Europe/Madrid')):
+        return JSONRenderer().render(serialize(serializer, transmissions))
+
+
+def benchmark_transmission_serializers():
+    create_test_data()
+    transmissions = create_transmissions()
+    return [
+        ('%s %s' % (serializer_class.__name__, function.__name__),
+         measure_time(render, serializer_class, function, transmissions), 's')
+        for serializer_class in [serializers.TransmissionSerializer, serializers.RadiocomTransmissionSerializer]
+        for function in [serialize, serialize_with_fields]
+    ]
+
+
+BENCHMARKS = [
+    benchmark_transmission_serializers,
+]
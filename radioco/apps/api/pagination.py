@@ -0,0 +1,32 @@
+import base64
+import binascii
+import datetime
+
+import pytz
+from django.conf import settings
+
+TRANSMISSIONS_MAX_LIMIT = getattr(settings, 'TRANSMISSIONS_MAX_LIMIT', 500)
+
+CURSOR_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def encode_cursor(transmission):
+    """
+    Returns: An opaque string with the position of the transmission (start date and schedule id)
+    """
+    start = transmission.start.astimezone(pytz.utc).strftime(CURSOR_DATETIME_FORMAT)
+    position = '%s|%s' % (start, transmission.schedule.id)
+    return base64.urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Returns: A tuple of start date and schedule id, ValueError is raised if the cursor is not valid
+    """
+    try:
+        position = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii')
+        start, schedule_id = position.split('|')
+        start = pytz.utc.localize(datetime.datetime.strptime(start, CURSOR_DATETIME_FORMAT))
+        return start, int(schedule_id)
+    except (TypeError, UnicodeError, binascii.Error) as e:
+        raise ValueError(e)
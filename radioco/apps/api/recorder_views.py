@@ -38,9 +38,8 @@ def recording_schedules(request):
     )
 
     for transmission in next_transmissions:
-        try:
-            episode = Episode.objects.get(issue_date=transmission.start, programme=transmission.programme)
-        except Episode.DoesNotExist:
+        episode = transmission.episode
+        if not episode:
             episode = Episode.objects.create_episode(transmission.start, transmission.programme)
 
         issue_date = transform_dt_to_default_tz(transmission.start)
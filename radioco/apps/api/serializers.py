@@ -1,9 +1,16 @@
+import copy
+from collections import OrderedDict
+
 from django.core.urlresolvers import reverse
+from django.utils import six
 
 from radioco.apps.global_settings.models import SiteConfiguration, RadiocomConfiguration
 from radioco.apps.radioco.tz_utils import transform_datetime_tz, get_active_timezone
 from radioco.apps.programmes.models import Programme, Episode
-from radioco.apps.schedules.models import Schedule
+from radioco.apps.schedules.conflicts import (
+    SCHEDULE_OVERLAP_VALIDATION, find_schedule_conflicts, find_transmission_conflicts, validate_no_conflicts
+)
+from radioco.apps.schedules.models import Schedule, Calendar
 from rest_framework import serializers
 
 
@@ -67,6 +74,12 @@ class EpisodeSerializer(serializers.ModelSerializer):
         fields = ('title', 'programme', 'summary', 'issue_date', 'season', 'number_in_season')
 
 
+class CalendarSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Calendar
+        fields = ('id', 'name', 'is_active')
+
+
 class ScheduleSerializer(serializers.ModelSerializer):
     title = serializers.SerializerMethodField()
     programme = serializers.SlugRelatedField(slug_field='slug', queryset=Programme.objects.all())
@@ -89,10 +102,56 @@ class ScheduleSerializer(serializers.ModelSerializer):
         if programme.start_dt and programme.start_dt > start \
                 or programme.end_dt and programme.end_dt < start:
                     raise serializers.ValidationError('Schedule is outside of the programme dates constraints')
+
+        if SCHEDULE_OVERLAP_VALIDATION:
+            self.validate_overlaps(attrs)
         return attrs
 
+    def validate_overlaps(self, attrs):
+        # The instance is not modified until the serializer is saved
+        schedule = copy.copy(self.instance) if self.instance else Schedule()
+        for attr, value in attrs.items():
+            setattr(schedule, attr, value)
+        schedule._update_effective_dates()
+        validate_no_conflicts(find_schedule_conflicts(schedule))
+
+
+def format_datetime_tz(date, tz):
+    """
+    Same output as DateTimeFieldTz without going through the field
+    """
+    value = transform_datetime_tz(date, tz=tz).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+class TransmissionSerializerMixin(object):
+    """
+    Transmissions are serialized by hand instead of going through the declared fields, which are kept for the
+    browsable API. Everything depending only on the programme is calculated once per serializer, the same child
+    serializer is used for every transmission of a response.
+    """
 
-class TransmissionSerializer(serializers.Serializer):
+    def get_programme_data(self, programme, get_representation):
+        """
+        Returns: The data of the programme calculated with get_representation, only the first time it's called
+        """
+        try:
+            programmes_data = self._programmes_data
+        except AttributeError:
+            programmes_data = self._programmes_data = {}
+        try:
+            return programmes_data[programme.pk]
+        except KeyError:
+            programme_data = programmes_data[programme.pk] = get_representation(programme)
+            return programme_data
+
+    def build_absolute_uri(self, url):
+        return self.context['request'].build_absolute_uri(url)
+
+
+class TransmissionSerializer(TransmissionSerializerMixin, serializers.Serializer):
     id = serializers.IntegerField(source='schedule.id')
     name = serializers.CharField(max_length=100)
     slug = serializers.SlugField(max_length=100)
@@ -106,8 +165,55 @@ class TransmissionSerializer(serializers.Serializer):
     type = serializers.CharField(max_length=1, source='schedule.type')
     source = serializers.IntegerField(source='schedule.source.id')
 
+    def get_programme_representation(self, programme):
+        return {
+            'id': programme.id,
+            'name': six.text_type(programme.name),
+            'slug': six.text_type(programme.slug),
+            'url': self.build_absolute_uri(reverse('programmes:detail', args=[programme.slug])),
+        }
+
+    def to_representation(self, transmission):
+        programme = self.get_programme_data(transmission.programme, self.get_programme_representation)
+        schedule = transmission.schedule
+        episode = transmission.episode
+        tz = get_active_timezone()
+        return OrderedDict((
+            ('id', schedule.id),
+            ('name', programme['name']),
+            ('slug', programme['slug']),
+            ('start', format_datetime_tz(transmission.start, tz)),
+            ('end', format_datetime_tz(transmission.end, tz)),
+            ('schedule', schedule.id),
+            ('episode', episode.id if episode else None),
+            ('programme', programme['id']),
+            ('programme_url', programme['url']),
+            ('episode_url', self.build_absolute_uri(transmission.episode_url) if episode else None),
+            ('type', six.text_type(schedule.type)),
+            ('source', schedule.source_id),
+        ))
+
+
+class FreeSlotSerializer(serializers.Serializer):
+    start = DateTimeFieldTz()
+    end = DateTimeFieldTz()
+
+
+class OccupancySerializer(serializers.Serializer):
+    start = DateTimeFieldTz()
+    slot_duration = serializers.DurationField()
+    slots_per_day = serializers.IntegerField()
+    programmes = serializers.DictField()
+    slots = serializers.ListField()
+
 
-class RadiocomTransmissionSerializer(serializers.Serializer):
+class ConflictSerializer(serializers.Serializer):
+    start = DateTimeFieldTz()
+    end = DateTimeFieldTz()
+    transmissions = TransmissionSerializer(many=True)
+
+
+class RadiocomTransmissionSerializer(TransmissionSerializerMixin, serializers.Serializer):
     name = serializers.CharField(max_length=100)
     description = serializers.CharField(source='programme.synopsis')
     start = DateTimeFieldTz()
@@ -117,6 +223,30 @@ class RadiocomTransmissionSerializer(serializers.Serializer):
     type = serializers.CharField(max_length=1, source='schedule.type')
     rss_url = AbsoluteURLField(source='slug', reverse_url='programmes:rss')
 
+    def get_programme_representation(self, programme):
+        logo_url = programme.photo.url
+        return {
+            'name': six.text_type(programme.name),
+            'description': six.text_type(programme.synopsis) if programme.synopsis is not None else None,
+            'url': self.build_absolute_uri(reverse('programmes:detail', args=[programme.slug])),
+            'logo_url': self.build_absolute_uri(logo_url) if logo_url else None,
+            'rss_url': self.build_absolute_uri(reverse('programmes:rss', args=[programme.slug])),
+        }
+
+    def to_representation(self, transmission):
+        programme = self.get_programme_data(transmission.programme, self.get_programme_representation)
+        tz = get_active_timezone()
+        return OrderedDict((
+            ('name', programme['name']),
+            ('description', programme['description']),
+            ('start', format_datetime_tz(transmission.start, tz)),
+            ('end', format_datetime_tz(transmission.end, tz)),
+            ('programme_url', programme['url']),
+            ('logo_url', programme['logo_url']),
+            ('type', six.text_type(transmission.schedule.type)),
+            ('rss_url', programme['rss_url']),
+        ))
+
 
 class TransmissionSerializerLight(serializers.Serializer):  # WARNING: Hack to save changes
     id = serializers.IntegerField(source='schedule.id')
@@ -130,6 +260,9 @@ class TransmissionSerializerLight(serializers.Serializer):  # WARNING: Hack to s
         if programme.start_dt and programme.start_dt > new_start \
                 or programme.end_dt and programme.end_dt < new_start:
                     raise serializers.ValidationError('Schedule is outside of the programme dates constraints')
+
+        if SCHEDULE_OVERLAP_VALIDATION:
+            validate_no_conflicts(find_transmission_conflicts(self.instance, new_start, moved_from=attrs['start']))
         return attrs
 
 
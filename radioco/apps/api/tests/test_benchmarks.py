@@ -0,0 +1,25 @@
+from django.test import TestCase
+from django.test import override_settings
+
+from radioco.apps.api import serializers
+from radioco.apps.api.benchmarks import create_transmissions, render, serialize, serialize_with_fields
+from radioco.apps.radioco.test_utils import TestDataMixin
+
+
+@override_settings(TIME_ZONE='UTC')
+class TransmissionSerializerTests(TestDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super(TransmissionSerializerTests, cls).setUpTestData()
+        cls.transmissions = create_transmissions()
+
+    def _compare(self, serializer_class):
+        self.assertEqual(
+            render(serializer_class, serialize, self.transmissions),
+            render(serializer_class, serialize_with_fields, self.transmissions))
+
+    def test_transmission_serializer(self):
+        self._compare(serializers.TransmissionSerializer)
+
+    def test_radiocom_transmission_serializer(self):
+        self._compare(serializers.RadiocomTransmissionSerializer)
@@ -57,6 +57,21 @@ class TestFullCalendarApi(TestDataMixin, APITestCase):
                 'runtime': datetime.timedelta(0, 3600), 'type': 'L', 'programme': 'classic-hits'
             })
 
+    @override_settings(TIME_ZONE='UTC')
+    @mock.patch('radioco.apps.api.serializers.SCHEDULE_OVERLAP_VALIDATION', True)
+    @mock.patch('django.utils.timezone.now', lambda: pytz.utc.localize(datetime.datetime(2015, 1, 1)))
+    def test_schedules_post_overlapping(self):
+        self._login()
+        response = self.client.post(
+            '/api/2/schedules', data=dict(self._get_schedule_data(), start='2015-01-06T14:30:00'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['non_field_errors'], ['Schedule overlaps with Classic hits at 2015-01-06T14:00:00+00:00'])
+
+        response = self.client.post(
+            '/api/2/schedules', data=dict(self._get_schedule_data(), start='2015-01-06T15:00:00'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
     @override_settings(TIME_ZONE='Europe/Madrid')
     def test_schedules_post_in_tz(self):
         self._login()
@@ -87,6 +102,25 @@ class TestFullCalendarApi(TestDataMixin, APITestCase):
         new_schedule.refresh_from_db()
         self.assertEqual(new_schedule.start_dt, pytz.utc.localize(datetime.datetime(2015, 1, 1, 20, 30, 0)))
 
+    @override_settings(TIME_ZONE='UTC')
+    @mock.patch('radioco.apps.api.serializers.SCHEDULE_OVERLAP_VALIDATION', True)
+    def test_move_schedule_overlapping(self):
+        self._login()
+        response = self.client.patch(
+            '/api/2/operations/{id}'.format(id=self.schedule.id),
+            data={'id': self.schedule.id, 'start': '2015-01-06T14:00:00Z', 'new_start': '2015-01-06T12:30:00'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['non_field_errors'], ['Schedule overlaps with Local Gossips at 2015-01-06T12:00:00+00:00'])
+
+        # The transmission being moved doesn't overlap with itself
+        response = self.client.patch(
+            '/api/2/operations/{id}'.format(id=self.schedule.id),
+            data={'id': self.schedule.id, 'start': '2015-01-06T14:00:00Z', 'new_start': '2015-01-06T14:30:00'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     @override_settings(TIME_ZONE='Europe/Madrid')
     def test_move_schedule_in_tz(self):
         new_schedule = self._create_schedule()
@@ -83,6 +83,23 @@ class TestProgrammesAPI(TestDataMixin, APITestCase):
             })
         self.assertNotIn('summer-programme', [t['slug'] for t in response.data])
 
+    def test_programmes_conditional_get(self):
+        response = self.client.get('/api/2/programmes')
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.client.get('/api/2/programmes', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.summer_programme.synopsis = 'Changed'
+        self.summer_programme.save()
+        response = self.client.get('/api/2/programmes', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_programmes_etag_by_url(self):
+        etag = self.client.get('/api/2/programmes')['ETag']
+        response = self.client.get('/api/2/programmes/summer-programme', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_episodes_get_all(self):
         response = self.client.get('/api/2/episodes')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
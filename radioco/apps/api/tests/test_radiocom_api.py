@@ -5,6 +5,7 @@ import pytz
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from radioco.apps.global_settings.models import RadiocomConfiguration, SiteConfiguration
 from radioco.apps.programmes.models import Programme
 from radioco.apps.radioco.test_utils import TestDataMixin
 
@@ -57,3 +58,20 @@ class TestTransmission(TestDataMixin, APITestCase):
                 'type': 'L',
             }
         )
+
+
+class TestRadiostation(TestDataMixin, APITestCase):
+    def setUp(self):
+        RadiocomConfiguration.get_global()
+        SiteConfiguration.get_global()
+
+    def test_radiostation_conditional_get(self):
+        response = self.client.get('/api/2/radiocom/radiostation')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get('/api/2/radiocom/radiostation', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        RadiocomConfiguration.get_global().save()
+        response = self.client.get('/api/2/radiocom/radiostation', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -1,11 +1,14 @@
 import datetime
+import json
 
 import mock
 import pytz
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from radioco.apps.programmes.models import Programme
 from radioco.apps.radioco.test_utils import TestDataMixin
+from radioco.apps.schedules.models import Schedule, Transmission, TransmissionIndex
 
 
 def mock_now():
@@ -161,12 +164,197 @@ class TestTransmissionAPI(TestDataMixin, APITestCase):
             (response.data['slug'], response.data['start']),
             ('classic-hits', '2015-01-06T14:00:00Z'))
 
+    def test_transmission_now_index(self):
+        TransmissionIndex.clear()
+        self.client.get('/api/2/transmissions/now')
+        # The current date is taken by the view before looking up the index
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/2/transmissions/now')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @mock.patch('django.utils.timezone.now', mock_now)
+    def test_transmission_next(self):
+        response = self.client.get('/api/2/transmissions/next', {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual(
+            [(transmission['slug'], transmission['start']) for transmission in response.data],
+            [('classic-hits', '2015-01-06T14:00:00Z'), ('morning-news', '2015-01-07T08:00:00Z')])
+
+        response = self.client.get('/api/2/transmissions/next', {'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_transmissions_cache(self):
+        params = {'after': datetime.date(2015, 2, 1), 'before': datetime.date(2015, 2, 1)}
+        response = self.client.get('/api/2/transmissions', params)
+        with mock.patch.object(Transmission, 'between', side_effect=AssertionError('Cache not used')):
+            self.assertEqual(self.client.get('/api/2/transmissions', params).data, response.data)
+
+        self.programme.name = 'Renamed'
+        self.programme.save()
+        response = self.client.get('/api/2/transmissions', params)
+        self.assertIn('Renamed', [transmission['name'] for transmission in response.data])
+
+    def test_transmissions_stream(self):
+        params = {'timezone': 'Europe/Madrid', 'after': datetime.date(2015, 1, 1), 'before': datetime.date(2015, 2, 1)}
+        expected = self.client.get('/api/2/transmissions', params)
+        response = self.client.get('/api/2/transmissions', dict(params, stream=True))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(b''.join(response.streaming_content).decode('utf-8')), expected.json())
+
+    def _get_pages(self, params):
+        results = []
+        response = self.client.get('/api/2/transmissions', params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), params['limit'])
+            results.extend(response.data['results'])
+            if not response.data['next']:
+                return results
+            response = self.client.get(response.data['next'])
+
+    def test_transmissions_pages(self):
+        params = {'timezone': 'Europe/Madrid', 'after': datetime.date(2015, 1, 1), 'before': datetime.date(2015, 1, 14)}
+        expected = sorted(
+            self.client.get('/api/2/transmissions', params).data,
+            key=lambda transmission: (transmission['start'], transmission['schedule']))
+        self.assertListEqual(self._get_pages(dict(params, limit=7)), expected)
+
+    def test_transmissions_pages_running(self):
+        madrid = pytz.timezone('Europe/Madrid')
+        Schedule.objects.create(
+            programme=self.programme, type='L', calendar=self.calendar,
+            start_dt=madrid.localize(datetime.datetime(2014, 12, 31, 23, 30)))
+        # It starts after the running transmission but it has already ended
+        short_programme = Programme.objects.create(
+            name='Short programme', synopsis='', language='en', current_season=1, _runtime=15)
+        Schedule.objects.create(
+            programme=short_programme, type='L', calendar=self.calendar,
+            start_dt=madrid.localize(datetime.datetime(2014, 12, 31, 23, 40)))
+
+        params = {'timezone': 'Europe/Madrid', 'after': datetime.date(2015, 1, 1), 'before': datetime.date(2015, 1, 2)}
+        expected = sorted(
+            self.client.get('/api/2/transmissions', params).data,
+            key=lambda transmission: (transmission['start'], transmission['schedule']))
+        self.assertEqual(expected[0]['start'], '2014-12-31T23:30:00+01:00')
+        self.assertNotIn('Short programme', [transmission['name'] for transmission in expected])
+        self.assertListEqual(self._get_pages(dict(params, limit=1)), expected)
+
+    def test_transmissions_pages_without_before(self):
+        params = {'after': datetime.date(2015, 1, 1), 'limit': 20}
+        response = self.client.get('/api/2/transmissions', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+
+        next_page = self.client.get(response.data['next']).data['results']
+        self.assertEqual(len(next_page), 20)
+        self.assertLess(
+            (response.data['results'][-1]['start'], response.data['results'][-1]['schedule']),
+            (next_page[0]['start'], next_page[0]['schedule']))
+
+    def test_incorrect_transmission_pages(self):
+        response = self.client.get('/api/2/transmissions', {'limit': 20})
+        self.assertEqual(response.data['after'], ['This field is required.'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get('/api/2/transmissions', {'limit': 20, 'cursor': 'foo'})
+        self.assertEqual(response.data['cursor'], ['Invalid cursor.'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get('/api/2/transmissions', {'after': datetime.date(2015, 1, 1), 'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_transmission_conflicts(self):
+        params = {'after': datetime.date(2015, 1, 6), 'before': datetime.date(2015, 1, 7)}
+        response = self.client.get('/api/2/transmissions/conflicts', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual(response.data, [])
+
+        Schedule.objects.create(
+            programme=Programme.objects.get(slug='morning-news'), type='L', calendar=self.calendar,
+            start_dt=pytz.utc.localize(datetime.datetime(2015, 1, 6, 14, 30, 0)))
+        response = self.client.get('/api/2/transmissions/conflicts', dict(params, timezone='Europe/Madrid'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(
+            (response.data[0]['start'], response.data[0]['end']),
+            ('2015-01-06T15:30:00+01:00', '2015-01-06T16:00:00+01:00'))
+        self.assertListEqual(
+            [(transmission['slug'], transmission['start']) for transmission in response.data[0]['transmissions']],
+            [('classic-hits', '2015-01-06T15:00:00+01:00'), ('morning-news', '2015-01-06T15:30:00+01:00')])
+
+    def test_incorrect_transmission_conflicts(self):
+        response = self.client.get('/api/2/transmissions/conflicts', {'after': datetime.date(2015, 1, 6)})
+        self.assertEqual(response.data['before'], ['This field is required.'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_transmissions_filter_calendar_nonexistend(self):
         response = self.client.get(
             '/api/2/transmissions', {'calendar': 9999})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class TestCalendarAPI(TestDataMixin, APITestCase):
+    def test_calendars_get_all(self):
+        response = self.client.get('/api/2/calendars')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn({'id': self.calendar.id, 'name': 'Example', 'is_active': True}, response.data)
+
+    def test_free_slots(self):
+        response = self.client.get(
+            '/api/2/calendars/%s/free_slots' % self.calendar.id,
+            {'after': datetime.date(2015, 1, 5), 'before': datetime.date(2015, 1, 6), 'min_duration': '02:00:00'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual(
+            [(free_slot['start'], free_slot['end']) for free_slot in response.data],
+            [
+                ('2015-01-05T00:00:00Z', '2015-01-05T08:00:00Z'),
+                ('2015-01-05T15:00:00Z', '2015-01-06T08:00:00Z'),
+                ('2015-01-06T15:00:00Z', '2015-01-07T00:00:00Z'),
+            ])
+
+    def test_occupancy(self):
+        url = '/api/2/calendars/%s/occupancy' % self.calendar.id
+        params = {'week': datetime.date(2015, 1, 7), 'timezone': 'Europe/Madrid'}
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['start'], '2015-01-05T00:00:00+01:00')
+        self.assertEqual(response.data['slot_duration'], '00:30:00')
+        self.assertEqual(response.data['slots_per_day'], 48)
+        self.assertEqual(sum(length for programme, length in response.data['slots']), 7 * 48)
+        self.assertEqual(response.data['programmes'][str(self.programme.id)]['slug'], 'classic-hits')
+        # Morning News is on air from 9 to 10 in Madrid
+        self.assertListEqual(response.data['slots'][:2], [[None, 18], [response.data['slots'][1][0], 2]])
+        self.assertEqual(response.data['programmes'][str(response.data['slots'][1][0])]['slug'], 'morning-news')
+
+        with mock.patch.object(Transmission, 'dates_between', side_effect=AssertionError('Cache not used')):
+            self.assertEqual(self.client.get(url, params).data, response.data)
+
+    def test_incorrect_occupancy_queries(self):
+        response = self.client.get('/api/2/calendars/%s/occupancy' % self.calendar.id, {'week': 'foo'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get('/api/2/calendars/9999/occupancy')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_incorrect_free_slots_queries(self):
+        url = '/api/2/calendars/%s/free_slots' % self.calendar.id
+        response = self.client.get(url, {'after': datetime.date(2015, 1, 5)})
+        self.assertEqual(response.data['before'], ['This field is required.'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(
+            url, {'after': datetime.date(2015, 1, 5), 'before': datetime.date(2015, 1, 6), 'min_duration': '00:00:00'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(
+            '/api/2/calendars/9999/free_slots',
+            {'after': datetime.date(2015, 1, 5), 'before': datetime.date(2015, 1, 6)})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
 class TestRestrictedMethodsScheduleAPI(TestDataMixin, APITestCase):
 
     def test_schedules_post(self):
@@ -7,6 +7,7 @@ router = routers.DefaultRouter(trailing_slash=False)
 router.register(r'programmes', views.ProgrammeViewSet)
 router.register(r'episodes', views.EpisodeViewSet)
 router.register(r'schedules', views.ScheduleViewSet)
+router.register(r'calendars', views.CalendarViewSet)
 router.register(r'transmissions', views.TransmissionViewSet, base_name='transmission')
 router.register(r'operations', views.TransmissionOperationViewSet, base_name='operation')
 
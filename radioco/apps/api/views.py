@@ -1,23 +1,41 @@
 import datetime
+import hashlib
+from collections import OrderedDict
+from itertools import islice
 
 import django_filters
 import pytz
 from django import forms
 from django import utils
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.utils.timezone import override
 from recurrence import Recurrence
 from rest_framework import filters, permissions, viewsets
-from rest_framework.decorators import list_route
+from rest_framework.decorators import detail_route, list_route
 from rest_framework.exceptions import ValidationError as DRFValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 from . import serializers
-from radioco.apps.api.viewsets import UpdateOnlyModelViewSet
-from radioco.apps.global_settings.models import RadiocomConfiguration
+from radioco.apps.api.pagination import TRANSMISSIONS_MAX_LIMIT, decode_cursor, encode_cursor
+from radioco.apps.api.viewsets import UpdateOnlyModelViewSet, ConditionalGetMixin
+from radioco.apps.radioco.cache_utils import get_version
+from radioco.apps.global_settings.models import CalendarConfiguration, RadiocomConfiguration, \
+    GLOBAL_SETTINGS_VERSION_KEY
 from radioco.apps.programmes.models import Programme, Episode
-from radioco.apps.schedules.models import Schedule, Transmission
+from radioco.apps.schedules.cache import get_schedules_version
+from radioco.apps.schedules.conflicts import find_conflicts
+from radioco.apps.schedules.models import Calendar, Schedule, Transmission
+from radioco.apps.schedules.slots import get_free_slots, get_week_occupancy, get_week_start, run_length_encode
+
+TRANSMISSIONS_CACHE_TIMEOUT = getattr(settings, 'TRANSMISSIONS_CACHE_TIMEOUT', 60 * 60 * 24)
+NEXT_TRANSMISSIONS_DEFAULT_LIMIT = 10
 
 
 class ProgrammeFilter(filters.FilterSet):
@@ -38,7 +56,7 @@ class ProgrammeFilterForm(forms.Form):
         return cleaned_data
 
 
-class ProgrammeViewSet(viewsets.ModelViewSet):
+class ProgrammeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     permission_classes = (permissions.DjangoModelPermissionsOrAnonReadOnly,)
     queryset = Programme.objects.all()
     filter_backends = (filters.DjangoFilterBackend, filters.OrderingFilter)
@@ -77,7 +95,7 @@ class EpisodeFilter(filters.FilterSet):
     programme = django_filters.CharFilter(field_name="programme__slug")
 
 
-class EpisodeViewSet(viewsets.ReadOnlyModelViewSet):  # FIXME: allowing creation breaks the view
+class EpisodeViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):  # FIXME: allowing creation breaks the view
     queryset = Episode.objects.all().select_related('programme')
     filter_backends = (filters.DjangoFilterBackend, filters.OrderingFilter)
     filter_class = EpisodeFilter
@@ -92,7 +110,7 @@ class ScheduleFilter(filters.FilterSet):
     programme = django_filters.CharFilter(field_name="programme__slug")
 
 
-class ScheduleViewSet(viewsets.ModelViewSet):
+class ScheduleViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     permission_classes = (permissions.DjangoModelPermissionsOrAnonReadOnly,)
     queryset = Schedule.objects.all()
     filter_backends = (filters.DjangoFilterBackend, filters.OrderingFilter)
@@ -111,19 +129,134 @@ class TimezoneForm(forms.Form):
 
 
 class TransmissionForm(TimezoneForm):
-    after = forms.DateField()
-    before = forms.DateField()
+    after = forms.DateField(required=False)
+    before = forms.DateField(required=False)
     calendar = forms.CharField(required=False)
+    stream = forms.BooleanField(required=False)
+    limit = forms.IntegerField(required=False, min_value=1, max_value=TRANSMISSIONS_MAX_LIMIT)
+    cursor = forms.CharField(required=False)
+
+    def clean_cursor(self):
+        cursor = self.cleaned_data.get('cursor')
+        if not cursor:
+            return None
+        try:
+            return decode_cursor(cursor)
+        except ValueError:
+            raise ValidationError('Invalid cursor.')
 
     def clean(self):
         cleaned_data = super(TransmissionForm, self).clean()
+        # Pages don't need an end date and the next pages start from the cursor
+        if cleaned_data.get('limit'):
+            required_fields = () if cleaned_data.get('cursor') or 'cursor' in self.errors else ('after',)
+        else:
+            required_fields = ('after', 'before')
+        for field_name in required_fields:
+            if cleaned_data.get(field_name) is None and field_name not in self.errors:
+                self.add_error(field_name, self.fields[field_name].error_messages['required'])
         if cleaned_data.get('before') and cleaned_data.get('after'):
             if cleaned_data['after'] > cleaned_data['before']:
                 raise ValidationError('after date has to be greater or equals than before date.')
         return cleaned_data
 
 
-class TransmissionViewSet(viewsets.ReadOnlyModelViewSet):
+class DateRangeForm(TimezoneForm):
+    after = forms.DateField()
+    before = forms.DateField()
+
+    def clean(self):
+        cleaned_data = super(DateRangeForm, self).clean()
+        if cleaned_data.get('before') and cleaned_data.get('after'):
+            if cleaned_data['after'] > cleaned_data['before']:
+                raise ValidationError('after date has to be greater or equals than before date.')
+        return cleaned_data
+
+
+class ConflictsForm(DateRangeForm):
+    calendar = forms.CharField(required=False)
+
+
+class FreeSlotsForm(DateRangeForm):
+    min_duration = forms.DurationField(required=False)
+
+    def clean_min_duration(self):
+        min_duration = self.cleaned_data.get('min_duration')
+        if min_duration is not None and min_duration <= datetime.timedelta(0):
+            raise ValidationError('min_duration has to be positive.')
+        return min_duration
+
+
+class OccupancyForm(TimezoneForm):
+    week = forms.DateField(required=False)
+
+
+class NextTransmissionsForm(TimezoneForm):
+    limit = forms.IntegerField(required=False, min_value=1, max_value=TRANSMISSIONS_MAX_LIMIT)
+
+
+class CalendarViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Calendar.objects.all()
+    serializer_class = serializers.CalendarSerializer
+
+    @detail_route()
+    def free_slots(self, request, pk=None):
+        """
+        Periods of time without transmissions between after and before inside the hours displayed in the calendar
+        """
+        data = FreeSlotsForm(request.query_params)
+        if not data.is_valid():
+            raise DRFValidationError(data.errors)
+        requested_timezone = data.cleaned_data.get('timezone')
+
+        tz = requested_timezone or pytz.utc
+        free_slots = get_free_slots(
+            self.get_object(), data.cleaned_data['after'], data.cleaned_data['before'], tz,
+            CalendarConfiguration.get_global(), min_duration=data.cleaned_data.get('min_duration')
+        )
+        serializer = serializers.FreeSlotSerializer(
+            [{'start': start, 'end': end} for start, end in free_slots], many=True)
+        with override(timezone=tz):
+            return Response(serializer.data)
+
+    @detail_route()
+    def occupancy(self, request, pk=None):
+        """
+        Programme on air in every slot of a week, run-length encoded
+        """
+        data = OccupancyForm(request.query_params)
+        if not data.is_valid():
+            raise DRFValidationError(data.errors)
+        requested_timezone = data.cleaned_data.get('timezone')
+
+        tz = requested_timezone or pytz.utc
+        calendar_configuration = CalendarConfiguration.get_global()
+        week = data.cleaned_data.get('week') or utils.timezone.now().astimezone(tz).date()
+        week_start = get_week_start(week, calendar_configuration)
+
+        # Calendars are not queried if the week is cached, the key changes when a calendar is deleted
+        cache_key = 'occupancy:%s:%s:%s:%s:%s' % (
+            get_schedules_version(), get_version(GLOBAL_SETTINGS_VERSION_KEY), pk, week_start.isoformat(), tz.zone)
+        occupancy_data = cache.get(cache_key)
+        if occupancy_data is None:
+            windows, programme_ids = get_week_occupancy(self.get_object(), week_start, tz, calendar_configuration)
+            programmes = Programme.objects.filter(id__in=set(programme_ids)).values_list('id', 'slug', 'name')
+            serializer = serializers.OccupancySerializer({
+                'start': windows[0][0],
+                'slot_duration': calendar_configuration.slot_duration,
+                'slots_per_day': (windows[0][1] - windows[0][0]) // calendar_configuration.slot_duration,
+                'programmes': {
+                    programme_id: {'slug': slug, 'name': name} for programme_id, slug, name in programmes
+                },
+                'slots': run_length_encode(programme_ids),
+            })
+            with override(timezone=tz):
+                occupancy_data = serializer.data
+            cache.set(cache_key, occupancy_data, TRANSMISSIONS_CACHE_TIMEOUT)
+        return Response(occupancy_data)
+
+
+class TransmissionViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Schedule.objects.all()
     filter_backends = (filters.DjangoFilterBackend,)  # Transmissions are always order by date
     filter_class = ScheduleFilter
@@ -139,8 +272,8 @@ class TransmissionViewSet(viewsets.ReadOnlyModelViewSet):
         before = data.cleaned_data['before']
 
         tz = requested_timezone or pytz.utc
-        after_date = tz.localize(datetime.datetime.combine(after, datetime.time()))
-        before_date = tz.localize(datetime.datetime.combine(before, datetime.time(23, 59, 59)))
+        after_date = tz.localize(datetime.datetime.combine(after, datetime.time())) if after else None
+        before_date = tz.localize(datetime.datetime.combine(before, datetime.time(23, 59, 59))) if before else None
 
         # Apply filters to the queryset
         schedules = self.filter_queryset(self.get_queryset())
@@ -148,14 +281,79 @@ class TransmissionViewSet(viewsets.ReadOnlyModelViewSet):
         if not data.cleaned_data.get('calendar'):
             schedules = schedules.filter(calendar__is_active=True)
 
-        transmissions = Transmission.between(
-            after_date,
-            before_date,
-            schedules=schedules
-        )
+        limit = data.cleaned_data.get('limit')
+        if limit:
+            cache_key = self.get_cache_key()
+            page_data = cache.get(cache_key)
+            if page_data is None:
+                # The first page includes the transmissions running at after like the list without pages
+                transmissions = Transmission.starting_after(
+                    after_date, cursor=data.cleaned_data.get('cursor'), before=before_date, schedules=schedules)
+                page_data = self.get_page_data(transmissions, limit, tz)
+                cache.set(cache_key, page_data, TRANSMISSIONS_CACHE_TIMEOUT)
+            return Response(page_data)
+
+        if data.cleaned_data.get('stream'):
+            transmissions = Transmission.between(after_date, before_date, schedules=schedules)
+            return StreamingHttpResponse(
+                self.stream_transmissions(transmissions, tz), content_type='application/json')
+
+        cache_key = self.get_cache_key()
+        transmissions_data = cache.get(cache_key)
+        if transmissions_data is None:
+            transmissions = Transmission.between(
+                after_date,
+                before_date,
+                schedules=schedules
+            )
+            serializer = self.get_serializer(transmissions, many=True)
+            with override(timezone=tz):
+                transmissions_data = serializer.data
+            cache.set(cache_key, transmissions_data, TRANSMISSIONS_CACHE_TIMEOUT)
+        return Response(transmissions_data)
+
+    def get_page_data(self, transmissions, limit, tz):
+        """
+        Returns: The first transmissions up to limit and the url of the next page if there are more
+        """
+        transmissions = list(islice(transmissions, limit + 1))
+        next_url = None
+        if len(transmissions) > limit:
+            transmissions = transmissions[:limit]
+            next_url = replace_query_param(
+                self.request.build_absolute_uri(), 'cursor', encode_cursor(transmissions[-1]))
         serializer = self.get_serializer(transmissions, many=True)
         with override(timezone=tz):
-            return Response(serializer.data)
+            return OrderedDict((
+                ('next', next_url),
+                ('results', serializer.data),
+            ))
+
+    def stream_transmissions(self, transmissions, tz):
+        """
+        Returns: A generator of the JSON list of transmissions, serializing one transmission at a time
+        """
+        serializer = self.get_serializer()
+        renderer = JSONRenderer()
+        yield b'['
+        for index, transmission in enumerate(transmissions):
+            with override(timezone=tz):
+                transmission_data = serializer.to_representation(transmission)
+            if index:
+                yield b','
+            yield renderer.render(transmission_data)
+        yield b']'
+
+    def get_cache_key(self):
+        """
+        The key changes with the schedules version, a cached response is never outdated
+        """
+        params = sorted(
+            (param, self.request.query_params.get(param))
+            for param in TransmissionForm.base_fields.keys() | ScheduleFilter.base_filters.keys()
+        )
+        key = repr((self.serializer_class.__name__, self.action, self.request.build_absolute_uri('/'), params))
+        return 'transmissions:%s:%s' % (get_schedules_version(), hashlib.md5(key.encode('utf-8')).hexdigest())
 
     @list_route()
     def now(self, request):
@@ -176,6 +374,48 @@ class TransmissionViewSet(viewsets.ReadOnlyModelViewSet):
             with override(timezone=tz):
                 return Response(serializer.data)
 
+    @list_route()
+    def next(self, request):
+        data = NextTransmissionsForm(request.query_params)
+        if not data.is_valid():
+            raise DRFValidationError(data.errors)
+        requested_timezone = data.cleaned_data.get('timezone')
+
+        tz = requested_timezone or pytz.utc
+        now = utils.timezone.now()
+        transmissions = Transmission.next(now, data.cleaned_data.get('limit') or NEXT_TRANSMISSIONS_DEFAULT_LIMIT)
+        serializer = self.get_serializer(transmissions, many=True)
+        with override(timezone=tz):
+            return Response(serializer.data)
+
+    @list_route()
+    def conflicts(self, request):
+        """
+        Overlapping transmissions between after and before
+        """
+        data = ConflictsForm(request.query_params)
+        if not data.is_valid():
+            raise DRFValidationError(data.errors)
+        requested_timezone = data.cleaned_data.get('timezone')
+
+        tz = requested_timezone or pytz.utc
+        after_date = tz.localize(datetime.datetime.combine(data.cleaned_data['after'], datetime.time()))
+        before_date = tz.localize(datetime.datetime.combine(data.cleaned_data['before'], datetime.time(23, 59, 59)))
+
+        schedules = self.filter_queryset(self.get_queryset())
+        if not data.cleaned_data.get('calendar'):
+            schedules = schedules.filter(calendar__is_active=True)
+
+        cache_key = self.get_cache_key()
+        conflicts_data = cache.get(cache_key)
+        if conflicts_data is None:
+            conflicts = find_conflicts(Transmission.between(after_date, before_date, schedules=schedules))
+            serializer = serializers.ConflictSerializer(conflicts, many=True, context=self.get_serializer_context())
+            with override(timezone=tz):
+                conflicts_data = serializer.data
+            cache.set(cache_key, conflicts_data, TRANSMISSIONS_CACHE_TIMEOUT)
+        return Response(conflicts_data)
+
 
 class RadiocomTransmissionViewSet(TransmissionViewSet):
     serializer_class = serializers.RadiocomTransmissionSerializer
@@ -194,6 +434,7 @@ class TransmissionOperationViewSet(UpdateOnlyModelViewSet):
         self.perform_update(serializer)
         return Response('ok')
 
+    @transaction.atomic
     def perform_update(self, serializer):
         schedule = serializer.instance
         start = serializer.validated_data['start']
@@ -234,8 +475,9 @@ class TransmissionOperationViewSet(UpdateOnlyModelViewSet):
                 schedule.save()
 
 
-class RadiocomStation(viewsets.ReadOnlyModelViewSet):
+class RadiocomStation(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = serializers.RadiocomConfigurationSerializer
+    version_keys = (GLOBAL_SETTINGS_VERSION_KEY,)
 
     def list(self, request, *args, **kwargs):
         serializer = self.get_serializer(RadiocomConfiguration.get_global(), many=False)
@@ -1,6 +1,42 @@
+import hashlib
+
+from django.views.decorators.http import condition
 from rest_framework import mixins
 from rest_framework.viewsets import GenericViewSet
 
+from radioco.apps.radioco.cache_utils import get_version, get_last_modified
+from radioco.apps.schedules.cache import SCHEDULES_VERSION_KEY
+
+
+class ConditionalGetMixin(object):
+    """
+    A mixin that adds ETag and Last-Modified to read actions.
+    Both are calculated from version counters, unchanged resources return 304 without being queried.
+    """
+    version_keys = (SCHEDULES_VERSION_KEY,)
+    conditional_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        method = 'get' if request.method == 'HEAD' else request.method.lower()
+        if self.action_map.get(method) in self.conditional_actions:
+            conditional_dispatch = condition(
+                etag_func=self.get_etag, last_modified_func=self.get_last_modified
+            )(super(ConditionalGetMixin, self).dispatch)
+            return conditional_dispatch(request, *args, **kwargs)
+        return super(ConditionalGetMixin, self).dispatch(request, *args, **kwargs)
+
+    def get_etag(self, request, *args, **kwargs):
+        key = repr((
+            [get_version(version_key) for version_key in self.version_keys],
+            request.build_absolute_uri(),
+            request.META.get('HTTP_ACCEPT'),
+            request.META.get('HTTP_ACCEPT_LANGUAGE'),
+        ))
+        return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return max(get_last_modified(version_key) for version_key in self.version_keys)
+
 
 class UpdateOnlyModelViewSet(mixins.UpdateModelMixin, GenericViewSet):
     """
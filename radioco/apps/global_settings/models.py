@@ -25,8 +25,11 @@ from django.utils.translation import ugettext as _u
 from django.utils.translation import ugettext_lazy as _
 from rest_framework.authtoken.models import Token
 
+from radioco.apps.radioco.cache_utils import bump_version
 from radioco.apps.schedules.models import WEEKDAY_CHOICES
 
+GLOBAL_SETTINGS_VERSION_KEY = 'global_settings_version'
+
 
 class SingletonModelManager(models.Manager):
     def get(self, *args, **kwargs):
@@ -42,6 +45,7 @@ class SingletonModel(models.Model):
         self.pk = 1
         super(SingletonModel, self).save(*args, **kwargs)
         self._set_cache(self)
+        bump_version(GLOBAL_SETTINGS_VERSION_KEY)
 
     def delete(self, *args, **kwargs):
         pass
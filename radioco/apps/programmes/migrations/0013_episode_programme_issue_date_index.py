@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 19:43
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('programmes', '0012__v5_0__podcast_podcast_file'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='episode',
+            index_together=set([('programme', 'issue_date')]),
+        ),
+    ]
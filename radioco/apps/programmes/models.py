@@ -21,15 +21,17 @@ from django.contrib.auth.models import User
 from django.core.exceptions import FieldError
 from django.core.urlresolvers import reverse
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
 from django.db.models.signals import post_save, pre_save
 from django.template.defaultfilters import slugify
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 import datetime
+from collections import namedtuple
 
-from radioco.apps.radioco.utils import field_has_changed
+from radioco.apps.radioco.utils import field_has_changed, bulk_update
+from radioco.apps.schedules.cache import bump_schedules_version
 from radioco.apps.schedules.utils import next_dates
 
 if hasattr(settings, 'PROGRAMME_LANGUAGES'):
@@ -38,6 +40,9 @@ else:
     PROGRAMME_LANGUAGES = settings.LANGUAGES
 
 
+EpisodeMove = namedtuple('EpisodeMove', ['episode', 'old_issue_date', 'new_issue_date'])
+
+
 class Programme(models.Model):
     class Meta:
         verbose_name = _('programme')
@@ -125,33 +130,34 @@ class Programme(models.Model):
             self.slug = slugify(self.name)
         super(Programme, self).save(*args, **kwargs)
 
-    def rearrange_episodes(self, after, calendar):
+    def get_episode_moves(self, after, calendar):
         """
-        Update the issue_date of episodes from a given date
+        Calculate the issue_date of episodes from a given date without saving them
+        Returns: A list of EpisodeMove with the episodes whose issue_date has changed
         """
         episodes = Episode.objects.unfinished(self, after)
         dates = next_dates(calendar, self, after)
 
-        # Further dates and episodes available -> re-order
-        while True:
-            try:
-                date = next(dates)
-                episode = next(episodes)
-            except StopIteration:
-                break
-            else:
+        moves = []
+        for episode in episodes:
+            # No further dates available -> unschedule
+            date = next(dates, None)
+            if episode.issue_date != date:
+                moves.append(EpisodeMove(episode, episode.issue_date, date))
                 episode.issue_date = date
-                episode.save()
-
-        # No further dates available -> unschedule
-        while True:
-            try:
-                episode = next(episodes)
-            except StopIteration:
-                break
-            else:
-                episode.issue_date = None
-                episode.save()
+        return moves
+
+    def rearrange_episodes(self, after, calendar):
+        """
+        Update the issue_date of episodes from a given date
+        Returns: A list of EpisodeMove with the episodes whose issue_date has changed
+        """
+        moves = self.get_episode_moves(after, calendar)
+        if moves:
+            with transaction.atomic():
+                bulk_update(Episode, [move.episode for move in moves], ['issue_date'])
+            bump_schedules_version()
+        return moves
 
     def get_absolute_url(self):
         return reverse('programmes:detail', args=[self.slug])
@@ -160,16 +166,27 @@ class Programme(models.Model):
         return "%s" % (self.name)
 
 
+@transaction.atomic
 def update_schedule_performance(programme):
-    for schedule in programme.schedule_set.all():
-        # schedule.effective_start_dt = calculate_effective_schedule_start_dt(schedule)
-        # schedule.effective_end_dt = calculate_effective_schedule_end_dt(schedule)
-        schedule.save()  # TODO: improve performance, update objects in bulk? We need custom logic on save
+    from radioco.apps.schedules.models import recompute_effective_dates, rearrange_episodes_on_commit, \
+        suspend_rearrange_episodes
+
+    with suspend_rearrange_episodes():
+        # Using the related manager the schedules see the changes of the programme that are not saved yet
+        schedules = programme.schedule_set.all()
+        recompute_effective_dates(schedules)
+        for schedule in schedules:
+            # The stored occurrences depend on the effective dates and the runtime
+            schedule.materialize_occurrences()
+    rearrange_episodes_on_commit(programme)
 
 
 def update_schedule_if_dt_has_changed(sender, instance, **kwargs):
     if field_has_changed(instance, 'start_date') or field_has_changed(instance, 'end_date'):  # TODO: improve
         update_schedule_performance(instance)
+    elif field_has_changed(instance, '_runtime'):
+        # The end of stored occurrences depends on the runtime
+        update_schedule_performance(instance)
 
 
 pre_save.connect(
@@ -202,6 +219,23 @@ class EpisodeManager(models.Manager):
             )
         return episode
 
+    def by_programme_and_date(self, keys):
+        """
+        Returns: A dict of episodes by (programme_id, issue_date) for the given keys using a single query
+        """
+        keys = set(keys)
+        if not keys:
+            return {}
+        issue_dates = [issue_date for programme_id, issue_date in keys]
+        episodes = self.filter(
+            programme_id__in={programme_id for programme_id, issue_date in keys},
+            issue_date__gte=min(issue_dates), issue_date__lte=max(issue_dates)
+        )
+        return {
+            (episode.programme_id, episode.issue_date): episode
+            for episode in episodes if (episode.programme_id, episode.issue_date) in keys
+        }
+
     @staticmethod
     def last(programme):
         return (programme.episode_set
@@ -220,6 +254,7 @@ class EpisodeManager(models.Manager):
 class Episode(models.Model):
     class Meta:
         unique_together = (('season', 'number_in_season', 'programme'),)
+        index_together = (('programme', 'issue_date'),)
         verbose_name = _('episode')
         verbose_name_plural = _('episodes')
         permissions = (("see_all_episodes", "Can see all episodes"),)
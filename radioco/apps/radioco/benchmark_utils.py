@@ -0,0 +1,23 @@
+import time
+import tracemalloc
+
+
+def measure_time(function, *args, **kwargs):
+    """
+    Returns: The seconds spent calling the function
+    """
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def measure_memory(function, *args, **kwargs):
+    """
+    Returns: The peak of memory allocated while calling the function, in KiB
+    """
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1] / 1024.0
+    finally:
+        tracemalloc.stop()
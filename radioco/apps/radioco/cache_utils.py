@@ -0,0 +1,50 @@
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+
+def _new_version():
+    # Not starting from 1, a process could keep data of a previous version if the key is evicted
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    """
+    Returns: The current number of a version counter stored in the cache
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_last_modified(key):
+    """
+    Returns: The datetime when a version counter was incremented
+    """
+    last_modified = cache.get('%s:modified' % key)
+    if last_modified is None:
+        cache.add('%s:modified' % key, timezone.now(), None)
+        last_modified = cache.get('%s:modified' % key)
+    return last_modified
+
+
+def _increment_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+    cache.set('%s:modified' % key, timezone.now(), None)
+
+
+def bump_version(key):
+    """
+    Increment a version counter to invalidate the data calculated with the previous one
+    It's bumped again on commit, otherwise other processes could cache uncommitted data with the new version
+    """
+    _increment_version(key)
+    transaction.on_commit(partial(_increment_version, key))
@@ -0,0 +1,40 @@
+from importlib import import_module
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+BENCHMARK_MODULES = [
+    'radioco.apps.schedules.benchmarks',
+    'radioco.apps.api.benchmarks',
+]
+
+
+class Command(BaseCommand):
+    help = 'Print the time spent by the current implementations and the previous ones in a temporary database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks to run, all of them by default')
+
+    def handle(self, *args, **options):
+        benchmarks = [
+            benchmark
+            for module in BENCHMARK_MODULES
+            for benchmark in import_module(module).BENCHMARKS
+            if not options['names'] or benchmark.__name__ in options['names']
+        ]
+        # The data is created in the test database, the configured one is never touched
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(TIME_ZONE='UTC'):
+                for benchmark in benchmarks:
+                    self.stdout.write(benchmark.__name__)
+                    with transaction.atomic():
+                        for implementation, value, unit in benchmark():
+                            self.stdout.write('    %-60s %12.3f %s' % (implementation, value, unit))
+                        transaction.set_rollback(True)
+        finally:
+            runner.teardown_databases(old_config)
@@ -0,0 +1,289 @@
+import calendar
+import datetime
+
+import pytz
+from recurrence import DAILY, WEEKLY
+
+ONE_DAY = datetime.timedelta(days=1)
+
+SIMPLE_FREQUENCIES = (WEEKLY, DAILY)
+UNSUPPORTED_BYPARAMS = ('bysetpos', 'bymonth', 'bymonthday', 'byyearday', 'byweekno', 'byhour', 'byminute', 'bysecond')
+
+
+def get_recurrence_expander(recurrence, start_dt, anchor_dt=None):
+    """
+    Returns: An object implementing between, before and after like a dateutil rruleset
+
+    Simple daily and weekly rules are calculated without walking every occurrence since start_dt,
+    any other rule is delegated to dateutil starting from anchor_dt when it is possible.
+    """
+    if SimpleRecurrence.is_supported(recurrence):
+        return SimpleRecurrence(recurrence, start_dt)
+    if anchor_dt and AnchoredRecurrence.is_supported(recurrence):
+        return AnchoredRecurrence(recurrence, start_dt, anchor_dt)
+    return recurrence.to_dateutil_rruleset(start_dt)
+
+
+def calculate_recurrence_anchor(recurrence, start_dt, dt):
+    """
+    Returns: The last occurrence of the rule before dt to be used as anchor, None if the recurrence can't be anchored
+    """
+    if SimpleRecurrence.is_supported(recurrence) or not AnchoredRecurrence.is_supported(recurrence):
+        return None
+    anchor_dt = recurrence.rrules[0].to_dateutil_rrule(start_dt).before(dt, inc=True)
+    if not anchor_dt or anchor_dt <= start_dt:
+        return None
+    return anchor_dt
+
+
+def _weekday_number(weekday):
+    return getattr(weekday, 'weekday', weekday)
+
+
+class SimpleRecurrence(object):
+    """
+    Closed-form expansion of FREQ=WEEKLY/DAILY rules with BYDAY, INTERVAL, UNTIL and EXDATE
+
+    It reproduces the results of django-recurrence: start_dt is always an occurrence, dates keep the wall clock
+    time of start_dt and they are compared using the utc offset of start_dt.
+    """
+    def __init__(self, recurrence, start_dt):
+        self.start_dt = start_dt
+        self.tzinfo = start_dt.tzinfo
+        self.offset = start_dt.utcoffset()
+        self.time = start_dt.time()
+
+        self.local_start_dt = start_dt.replace(tzinfo=None)
+        self.start_date = self.local_start_dt.date()
+        self.include_start = getattr(recurrence, 'include_dtstart', True)
+        self.exdates = frozenset(self._to_local(_dt) for _dt in recurrence.exdates)
+        self.rules = [self._compile_rule(rrule) for rrule in recurrence.rrules]
+
+    @staticmethod
+    def is_supported(recurrence):
+        if recurrence.exrules or recurrence.rdates or recurrence.dtend:
+            return False
+        for rrule in recurrence.rrules:
+            if rrule.freq not in SIMPLE_FREQUENCIES or rrule.count:
+                return False
+            if any(getattr(rrule, param, None) for param in UNSUPPORTED_BYPARAMS):
+                return False
+        return True
+
+    def _to_local(self, dt):
+        """
+        Returns: A naive datetime in the wall clock of start_dt (using its utc offset)
+        """
+        if dt.tzinfo is None:
+            return dt
+        return dt.astimezone(pytz.utc).replace(tzinfo=None) + self.offset
+
+    def _compile_rule(self, rrule):
+        interval = rrule.interval or 1
+        wkst = calendar.firstweekday() if rrule.wkst is None else _weekday_number(rrule.wkst)
+        weekdays = frozenset(_weekday_number(_weekday) for _weekday in rrule.byday or [])
+        if rrule.freq == WEEKLY and not weekdays:
+            weekdays = frozenset([self.start_date.weekday()])
+        # Days of the week sorted from the first day of the week
+        offsets = sorted((_weekday - wkst) % 7 for _weekday in weekdays)
+        last_date = None
+        if rrule.until:
+            until = self._to_local(rrule.until)
+            last_date = until.date()
+            if datetime.datetime.combine(last_date, self.time) > until:
+                last_date -= ONE_DAY
+        return rrule.freq, interval, wkst, weekdays, offsets, last_date
+
+    def _week_start(self, date, wkst):
+        return date - datetime.timedelta(days=(date.weekday() - wkst) % 7)
+
+    def _next_rule_date(self, rule, date):
+        """
+        Returns: The first date of the rule on or after date, None if there isn't any
+        """
+        freq, interval, wkst, weekdays, offsets, last_date = rule
+        date = max(date, self.start_date)
+        try:
+            next_date = self._next_daily_date(rule, date) if freq == DAILY else self._next_weekly_date(rule, date)
+        except OverflowError:
+            return None
+        if next_date is None or last_date and next_date > last_date:
+            return None
+        return next_date
+
+    def _next_daily_date(self, rule, date):
+        freq, interval, wkst, weekdays, offsets, last_date = rule
+        number = -(-(date - self.start_date).days // interval)  # Rounding up
+        # The weekdays of the dates repeat every 7 intervals, a rule can't match if none of them does
+        for step in range(number, number + (7 if weekdays else 1)):
+            next_date = self.start_date + datetime.timedelta(days=step * interval)
+            if not weekdays or next_date.weekday() in weekdays:
+                return next_date
+        return None
+
+    def _next_weekly_date(self, rule, date):
+        freq, interval, wkst, weekdays, offsets, last_date = rule
+        first_week_start = self._week_start(self.start_date, wkst)
+        week = (self._week_start(date, wkst) - first_week_start).days // 7
+        week_number = -(-week // interval) * interval  # Rounding up to a week of the rule
+        for week_number in (week_number, week_number + interval):
+            week_start = first_week_start + datetime.timedelta(weeks=week_number)
+            for offset in offsets:
+                next_date = week_start + datetime.timedelta(days=offset)
+                if next_date >= date:
+                    return next_date
+        return None
+
+    def _previous_rule_date(self, rule, date):
+        """
+        Returns: The last date of the rule on or before date, None if there isn't any
+        """
+        freq, interval, wkst, weekdays, offsets, last_date = rule
+        if last_date:
+            date = min(date, last_date)
+        if date < self.start_date:
+            return None
+        if freq == DAILY:
+            return self._previous_daily_date(rule, date)
+        return self._previous_weekly_date(rule, date)
+
+    def _previous_daily_date(self, rule, date):
+        freq, interval, wkst, weekdays, offsets, last_date = rule
+        number = (date - self.start_date).days // interval
+        for step in range(number, max(number - (7 if weekdays else 1), -1), -1):
+            previous_date = self.start_date + datetime.timedelta(days=step * interval)
+            if not weekdays or previous_date.weekday() in weekdays:
+                return previous_date
+        return None
+
+    def _previous_weekly_date(self, rule, date):
+        freq, interval, wkst, weekdays, offsets, last_date = rule
+        first_week_start = self._week_start(self.start_date, wkst)
+        week = (self._week_start(date, wkst) - first_week_start).days // 7
+        week_number = week // interval * interval
+        for week_number in (week_number, week_number - interval):
+            week_start = first_week_start + datetime.timedelta(weeks=week_number)
+            for offset in reversed(offsets):
+                previous_date = week_start + datetime.timedelta(days=offset)
+                if self.start_date <= previous_date <= date:
+                    return previous_date
+        return None
+
+    def _to_dt(self, date):
+        return datetime.datetime.combine(date, self.time).replace(tzinfo=self.tzinfo)
+
+    def _iter_forward(self, first_date):
+        date = max(first_date, self.start_date)
+        while True:
+            candidates = [self._next_rule_date(rule, date) for rule in self.rules]
+            if self.include_start and date <= self.start_date:
+                candidates.append(self.start_date)
+            candidates = [candidate for candidate in candidates if candidate]
+            if not candidates:
+                return
+            date = min(candidates)
+            local_dt = datetime.datetime.combine(date, self.time)
+            if local_dt not in self.exdates:
+                yield local_dt
+            try:
+                date += ONE_DAY
+            except OverflowError:
+                return
+
+    def _iter_backward(self, first_date):
+        date = first_date
+        while date >= self.start_date:
+            candidates = [self._previous_rule_date(rule, date) for rule in self.rules]
+            if self.include_start:
+                candidates.append(self.start_date)
+            candidates = [candidate for candidate in candidates if candidate]
+            if not candidates:
+                return
+            date = max(candidates)
+            local_dt = datetime.datetime.combine(date, self.time)
+            if local_dt not in self.exdates:
+                yield local_dt
+            date -= ONE_DAY
+
+    def xafter(self, dt, inc=False):
+        """
+        Returns: A generator of occurrences after dt
+        """
+        local_dt = self._to_local(dt)
+        for occurrence in self._iter_forward(local_dt.date()):
+            if occurrence > local_dt or inc and occurrence == local_dt:
+                yield self._to_dt(occurrence.date())
+
+    def between(self, after, before, inc=False):
+        local_before = self._to_local(before)
+        dates = []
+        for occurrence in self.xafter(after, inc):
+            local_occurrence = occurrence.replace(tzinfo=None)
+            if local_occurrence > local_before or not inc and local_occurrence == local_before:
+                break
+            dates.append(occurrence)
+        return dates
+
+    def after(self, dt, inc=False):
+        return next(self.xafter(dt, inc), None)
+
+    def before(self, dt, inc=False):
+        local_dt = self._to_local(dt)
+        for occurrence in self._iter_backward(local_dt.date()):
+            if occurrence < local_dt or inc and occurrence == local_dt:
+                return self._to_dt(occurrence.date())
+        return None
+
+
+class AnchoredRecurrence(object):
+    """
+    Expansion of a rule starting from one of its later occurrences (anchor) instead of start_dt
+
+    dateutil walks every occurrence since the dtstart, using the anchor the cost doesn't grow with the age of
+    the schedule. Queries before the anchor still use the whole series.
+    """
+    def __init__(self, recurrence, start_dt, anchor_dt):
+        self.recurrence = recurrence
+        self.start_dt = start_dt
+        if anchor_dt.tzinfo is not None:
+            # Using the same offset than start_dt, otherwise the dates could be shifted
+            anchor_date = anchor_dt.astimezone(start_dt.tzinfo).date()
+            anchor_dt = datetime.datetime.combine(anchor_date, start_dt.time()).replace(tzinfo=start_dt.tzinfo)
+        self.anchor_dt = anchor_dt
+        self.anchored_rruleset = recurrence.to_dateutil_rruleset(anchor_dt)
+        self._rruleset = None
+
+    @staticmethod
+    def is_supported(recurrence):
+        """
+        Only one rule without count, otherwise the occurrences depend on the original dtstart
+        """
+        return len(recurrence.rrules) == 1 and not recurrence.rrules[0].count and not recurrence.exrules
+
+    @property
+    def rruleset(self):
+        if self._rruleset is None:
+            self._rruleset = self.recurrence.to_dateutil_rruleset(self.start_dt)
+        return self._rruleset
+
+    def _get_rruleset(self, dt):
+        if dt >= self.anchor_dt:
+            return self.anchored_rruleset
+        return self.rruleset
+
+    def xafter(self, dt, inc=False):
+        return self._get_rruleset(dt).xafter(dt, inc=inc)
+
+    def between(self, after, before, inc=False):
+        return self._get_rruleset(after).between(after, before, inc)
+
+    def after(self, dt, inc=False):
+        return self._get_rruleset(dt).after(dt, inc)
+
+    def before(self, dt, inc=False):
+        if dt >= self.anchor_dt:
+            date = self.anchored_rruleset.before(dt, inc)
+            # The anchor could be excluded, looking for previous dates
+            if date and date >= self.anchor_dt:
+                return date
+        return self.rruleset.before(dt, inc)
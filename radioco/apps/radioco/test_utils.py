@@ -16,10 +16,12 @@
 
 
 import datetime
+from contextlib import contextmanager
 
 import pytz
 import recurrence
 from django.contrib.auth.models import User
+from django.db import connection
 
 from radioco.apps.programmes.models import Programme, Episode, Podcast, Role
 from radioco.apps.schedules.models import Calendar, Schedule
@@ -175,6 +177,17 @@ def create_test_data():
         programme.rearrange_episodes(pytz.utc.localize(datetime.datetime(1970, 1, 1)), Calendar.get_active())
 
 
+@contextmanager
+def run_on_commit_callbacks():
+    """
+    TestCase never commits, executing the callbacks registered with transaction.on_commit at the end of the block
+    """
+    yield
+    callbacks, connection.run_on_commit = connection.run_on_commit, []
+    for sids, func in callbacks:
+        func()
+
+
 class TestDataMixin(object):
     @classmethod
     def setUpTestData(cls):
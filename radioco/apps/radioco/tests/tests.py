@@ -19,7 +19,8 @@ import pytz
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 
-from radioco.apps.radioco.utils import create_example_data
+from radioco.apps.programmes.models import Episode
+from radioco.apps.radioco.utils import bulk_update, create_example_data
 from radioco.apps.radioco.test_utils import TestDataMixin, SPAIN_TZ
 
 
@@ -44,6 +45,25 @@ class UtilsTest(TestCase):
         self.assertEqual(spain_dict.get(spanish_dt), spain_dict.get(spanish_dt.astimezone(pytz.utc)))
 
 
+class BulkUpdateTests(TestDataMixin, TestCase):
+    def test_bulk_update(self):
+        episodes = list(Episode.objects.filter(programme=self.programme).order_by('pk'))
+        dates = [pytz.utc.localize(datetime.datetime(2015, 1, 1 + day, 14, 0, 0)) for day in range(len(episodes))]
+        for episode, date in zip(episodes, dates):
+            episode.issue_date = date
+        bulk_update(Episode, episodes, ['issue_date'], batch_size=2)
+        self.assertListEqual(
+            list(Episode.objects.filter(programme=self.programme).order_by('pk').values_list('issue_date', flat=True)),
+            dates)
+
+    def test_bulk_update_null_values(self):
+        episodes = list(Episode.objects.filter(programme=self.programme))
+        for episode in episodes:
+            episode.issue_date = None
+        bulk_update(Episode, episodes, ['issue_date'])
+        self.assertFalse(Episode.objects.filter(programme=self.programme, issue_date__isnull=False).exists())
+
+
 class RadioIntegrationTests(TestDataMixin, TestCase):
     def test_index(self):
         response = self.client.get(reverse("home"))
@@ -4,6 +4,7 @@ import pytz
 from dateutil.tz import tzoffset
 from django.utils import timezone
 
+from radioco.apps.radioco.recurrence_utils import get_recurrence_expander
 from radioco.apps.radioco.utils import memorize
 
 timestamp = datetime.datetime(2009, 1, 1)  # any unambiguous timestamp will work here
@@ -120,23 +121,55 @@ def _fix_invalid_dt(recurrence, dt):
     return None
 
 
-def recurrence_after(recurrence, after_dt, start_dt):
+def _get_expander(recurrence, start_dt, anchor_dt, expander):
+    """
+    Returns: The given expander, a new one is created if it wasn't provided
+    """
+    if expander is None:
+        return get_recurrence_expander(recurrence, start_dt, anchor_dt)
+    return expander
+
+
+def recurrence_after(recurrence, after_dt, start_dt, anchor_dt=None, expander=None):
     """
     Fix for django-recurrence 1.3
     Avoid outputting a impossible dt
     """
-    dt = recurrence.after(after_dt, True, dtstart=start_dt)
+    dt = _get_expander(recurrence, start_dt, anchor_dt, expander).after(after_dt, True)
     if dt == start_dt:
         return _fix_invalid_dt(recurrence, dt)
     return dt
 
 
-def recurrence_before(recurrence, before_dt, start_dt):
+def recurrence_xafter(recurrence, after_dt, start_dt, anchor_dt=None, expander=None):
+    """
+    Fix for django-recurrence 1.3
+    Returns: A generator of dates after after_dt (included) skipping impossible dts
+    """
+    for dt in _get_expander(recurrence, start_dt, anchor_dt, expander).xafter(after_dt, inc=True):
+        if dt == start_dt:
+            dt = _fix_invalid_dt(recurrence, dt)
+            if dt is None:
+                continue
+        yield dt
+
+
+def recurrence_before(recurrence, before_dt, start_dt, anchor_dt=None, expander=None):
     """
     Fix for django-recurrence 1.3
     Avoid outputting a impossible dt
     """
-    dt = recurrence.before(before_dt, True, dtstart=start_dt)
+    dt = _get_expander(recurrence, start_dt, anchor_dt, expander).before(before_dt, True)
     if dt == start_dt:
         return _fix_invalid_dt(recurrence, dt)
     return dt
+
+
+def recurrence_between(recurrence, after_dt, before_dt, start_dt, anchor_dt=None, expander=None):
+    """
+    Returns: A generator of dates between after_dt and before_dt (both included)
+    """
+    for dt in _get_expander(recurrence, start_dt, anchor_dt, expander).xafter(after_dt, inc=True):
+        if dt > before_dt:
+            break
+        yield dt
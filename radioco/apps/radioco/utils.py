@@ -1,3 +1,6 @@
+from django.db import connections
+from django.db.models import Case, When, Value
+from django.db.models.functions import Cast
 from django.http import HttpResponseForbidden
 from django.views.generic.detail import SingleObjectMixin
 
@@ -53,6 +56,28 @@ def field_has_changed(_object, field):
     return _object.id and getattr(_object.__class__.objects.get(id=_object.id), field) != getattr(_object, field)
 
 
+def bulk_update(model, objects, field_names, batch_size=100):
+    """
+    Update fields of several objects using a query per batch (Django 1.11 doesn't have bulk_update)
+    """
+    fields = [model._meta.get_field(field_name) for field_name in field_names]
+    # PostgreSQL can't infer the type of a CASE whose values are all NULL
+    requires_casting = connections[model.objects.db].vendor == 'postgresql'
+    for index in range(0, len(objects), batch_size):
+        batch = objects[index:index + batch_size]
+        values = {}
+        for field in fields:
+            when_list = [
+                When(pk=_object.pk, then=Value(getattr(_object, field.attname), output_field=field))
+                for _object in batch
+            ]
+            case_statement = Case(*when_list, output_field=field)
+            if requires_casting:
+                case_statement = Cast(case_statement, output_field=field)
+            values[field.attname] = case_statement
+        model.objects.filter(pk__in=[_object.pk for _object in batch]).update(**values)
+
+
 def check_delete_permission(user, model):
     permission = '%s.%s' % (model._meta.app_label, "delete_%s" % model._meta.model_name)
     return user.has_perm(permission)
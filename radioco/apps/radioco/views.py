@@ -15,8 +15,6 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import datetime
-
 from django.contrib.auth import (
     logout,
 )
@@ -33,30 +31,15 @@ from radioco.apps.global_settings.models import SiteConfiguration
 def index(request):
     now = timezone.now()
 
-    transmissions_between = Transmission.between(
-        now, now + datetime.timedelta(hours=+16))
-    next_transmissions = []
-
-    try:
-        live_transmission = next(transmissions_between)
-        if live_transmission.start <= now < live_transmission.end:
-            percentage = int(round(
-                (now - live_transmission.start).total_seconds() /
-                (live_transmission.end - live_transmission.start).total_seconds() * 100))
-        else:
-            next_transmissions.append(live_transmission)
-            live_transmission = None
-            percentage = None
-    except StopIteration:
-        live_transmission = None
-        percentage = None
-
-    try:
-        max_num_of_next_transmissions = 6 - len(next_transmissions)
-        for num in range(max_num_of_next_transmissions):
-            next_transmissions.append(next(transmissions_between))
-    except StopIteration:
-        pass
+    transmissions = Transmission.next(now, 7)
+    live_transmission = None
+    percentage = None
+    if transmissions and transmissions[0].start <= now < transmissions[0].end:
+        live_transmission = transmissions.pop(0)
+        percentage = int(round(
+            (now - live_transmission.start).total_seconds() /
+            (live_transmission.end - live_transmission.start).total_seconds() * 100))
+    next_transmissions = transmissions[:6]
 
     latest_episodes = Episode.objects.filter(podcast__isnull=False).select_related(
         'programme').order_by('-issue_date')[:25]
@@ -15,14 +15,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import copy
-
 from django.contrib import admin
 from django.core.checks import messages
+from django.utils import timezone
+from django.utils.html import format_html
 from django.utils.translation import ugettext_lazy as _
 
 from radioco.apps.global_settings.models import CalendarConfiguration
-from radioco.apps.schedules.models import Schedule, Calendar
+from radioco.apps.schedules.models import Schedule, Calendar, CalendarActivation, BlackoutPeriod, compact_schedules
 
 try:
     from django.utils.encoding import force_unicode
@@ -30,58 +30,64 @@ except ImportError:
     from django.utils.encoding import force_text as force_unicode
 
 
+class BlackoutPeriodInline(admin.TabularInline):
+    model = BlackoutPeriod
+    extra = 0
+
+
 @admin.register(Calendar)
 class CalendarAdmin(admin.ModelAdmin):
-    list_display = ('name', 'is_active')
+    inlines = [BlackoutPeriodInline]
+    list_display = ('name', 'is_active', 'activation_progress')
     list_filter = ['is_active']
     search_fields = ['name']
     ordering = ['name']
-    actions = ['clone_calendar', 'set_active']
+    actions = ['clone_calendar', 'set_active', 'compact_schedules']
+
+    def save_model(self, request, obj, form, change):
+        if obj.becomes_active():
+            # Episodes are rearranged in background, the calendar is activated after that
+            obj.is_active = False
+            super(CalendarAdmin, self).save_model(request, obj, form, change)
+            obj.activate_in_background()
+            self.message_user(request, _('The calendar will be active after rearranging the episodes'))
+        else:
+            super(CalendarAdmin, self).save_model(request, obj, form, change)
 
     def set_active(self, request, queryset):
         if queryset.count() == 1:
             calendar = queryset.get()
-            calendar.is_active = True
-            calendar.save()
-            self.message_user(request, _('Calendar marked as active'))
+            calendar.activate_in_background()
+            self.message_user(request, _('The calendar will be active after rearranging the episodes'))
         else:
             self.message_user(request, _('You cannot mark more than 1 schedule as active'), level=messages.ERROR)
     set_active.short_description = _("Set a calendar active")
 
+    def compact_schedules(self, request, queryset):
+        past_schedules = compact_schedules(Schedule.objects.filter(calendar__in=queryset), timezone.now())
+        self.message_user(request, _('%(count)s schedules compacted') % {'count': len(past_schedules)})
+    compact_schedules.short_description = _("Move the past excluded dates out of the schedules")
+
+    def activation_progress(self, obj):
+        activation = obj.get_last_activation()
+        if not activation or activation.status == CalendarActivation.DONE:
+            return ''
+        if activation.status == CalendarActivation.RUNNING:
+            return format_html('{} {}/{}', activation.get_status_display(), activation.processed, activation.total)
+        return activation.get_status_display()
+    activation_progress.short_description = _('activation')
+
     def clone_calendar(self, request, queryset):
         for obj in queryset:
-            obj_copy = copy.copy(obj)
-            obj_copy.id = None
-            obj_copy.pk = None
             copy_name = _('Copy of ') + obj.name
-            obj_copy.name = copy_name
-            obj_copy.is_active = False
-            try:
-                if Calendar.objects.get(name=copy_name):
-                    self.message_user(
-                        request,
-                        _('A calendar with the name %(obj)s already exists') % {'obj': force_unicode(obj)},
-                        level=messages.ERROR
-                    )
-            except Calendar.DoesNotExist:
-                obj_copy.save()
-                # Live schedules have to be created first because we are linking to those objects
-                schedules = []
-                schedules.extend(Schedule.objects.filter(calendar=obj, type='L'))
-                schedules.extend(Schedule.objects.filter(calendar=obj).exclude(type='L'))
-                for schedule in schedules:
-                    schedule_copy = copy.copy(schedule)
-                    schedule_copy.id = schedule_copy.pk = None
-                    schedule_copy.calendar = obj_copy
-                    if schedule_copy.source:
-                        source = schedule_copy.source
-                        # We should have created the referenced object first
-                        # Only live schedules should be in the source field
-                        schedule_copy.source = Schedule.objects.get(
-                            calendar=obj_copy, start_dt=source.start_dt,
-                            type=source.type, programme=source.programme
-                        )
-                    schedule_copy.save()
+            if Calendar.objects.filter(name=copy_name).exists():
+                self.message_user(
+                    request,
+                    _('A calendar with the name %(obj)s already exists') % {'obj': force_unicode(obj)},
+                    level=messages.ERROR
+                )
+            else:
+                obj.clone(copy_name)
 
     clone_calendar.short_description = _("Make a Clone of the selected calendar")
 
@@ -94,10 +100,16 @@ class ScheduleAdmin(admin.ModelAdmin):
         }),
         (_('Advanced options'), {
             'classes': ('collapse',),
-            'fields': ('effective_start_dt', 'effective_end_dt', 'from_collection', 'source'),
+            'fields': (
+                'effective_start_dt', 'effective_end_dt', 'recurrence_anchor_dt',
+                'materialized_after', 'materialized_before', 'from_collection', 'source'
+            ),
         }),
     )
-    readonly_fields = ('effective_start_dt', 'effective_end_dt', 'source', 'from_collection')
+    readonly_fields = (
+        'effective_start_dt', 'effective_end_dt', 'recurrence_anchor_dt',
+        'materialized_after', 'materialized_before', 'source', 'from_collection'
+    )
     change_list_template = "admin/schedules/calendar.html"
 
     def changelist_view(self, request, extra_context=None):
@@ -0,0 +1,213 @@
+"""
+Benchmarks printed by: python manage.py run_benchmarks
+The previous implementations are kept here, the test suite checks that they give the same results
+"""
+import datetime
+from itertools import islice
+from unittest import mock
+
+import recurrence
+from pytz import utc
+from recurrence.fields import RecurrenceField
+
+from radioco.apps.global_settings.models import CalendarConfiguration
+from radioco.apps.programmes.models import Programme, Episode
+from radioco.apps.radioco.benchmark_utils import measure_memory, measure_time
+from radioco.apps.schedules.fields import LazyRecurrenceField
+from radioco.apps.schedules.models import Calendar, Schedule, Transmission
+from radioco.apps.schedules.slots import get_free_slots
+from radioco.apps.schedules.utils import next_dates
+
+
+NUMBER_OF_SCHEDULES = 20
+NUMBER_OF_EPISODES = 500
+NUMBER_OF_TRANSMISSIONS = 10000
+NUMBER_OF_LOADED_SCHEDULES = 5000
+NUMBER_OF_SEASON_DAYS = 90
+
+
+def search_next_dates(calendar, programme, after):
+    """
+    Looks for the closest date of every schedule each time, next_dates merges the dates of the schedules instead
+    """
+    schedules = Schedule.objects.filter(programme=programme, type='L', calendar=calendar)
+    while True:
+        candidates = [schedule.date_after(after) for schedule in schedules]
+        try:
+            next_date = min(filter(None, candidates))
+        except ValueError:
+            break
+        yield next_date
+        after = next_date + datetime.timedelta(seconds=1)
+
+
+class DictTransmission(object):
+    """
+    Transmission as a plain object with a __dict__, calculating its end on every access
+    """
+    def __init__(self, schedule, date, episode=None):
+        self.schedule = schedule
+        self.programme = schedule.programme
+        self.start = date
+        self.episode = episode
+
+    @property
+    def end(self):
+        return self.start + self.programme.runtime
+
+
+def search_free_slots(calendar, after, before, tz, calendar_configuration):
+    """
+    Expands the transmissions day by day and checks every slot, get_free_slots sweeps the sorted transmissions
+    """
+    slot_duration = calendar_configuration.slot_duration
+    free_slots = []
+    date = after
+    while date <= before:
+        slot_start = tz.localize(datetime.datetime.combine(date, calendar_configuration.min_time))
+        day_end = tz.localize(datetime.datetime.combine(date, calendar_configuration.max_time))
+        transmissions = list(Transmission.between(slot_start, day_end, schedules=calendar.schedule_set.all()))
+        while slot_start < day_end:
+            slot_end = slot_start + slot_duration
+            overlapping = [
+                transmission for transmission in transmissions
+                if transmission.start < slot_end and slot_start < transmission.end
+            ]
+            if not overlapping:
+                if free_slots and free_slots[-1][1] == slot_start:
+                    free_slots[-1] = (free_slots[-1][0], slot_end)
+                else:
+                    free_slots.append((slot_start, slot_end))
+            slot_start = slot_end
+        date += datetime.timedelta(days=1)
+    return free_slots
+
+
+def load_parsed_schedules():
+    """
+    Loads the schedules parsing their recurrences with the rows, LazyRecurrenceField parses them on first access
+    """
+    with mock.patch.object(LazyRecurrenceField, 'from_db_value', RecurrenceField.from_db_value):
+        return list(Schedule.objects.all())
+
+
+def create_weekly_schedules(number_of_schedules=NUMBER_OF_SCHEDULES, number_of_episodes=NUMBER_OF_EPISODES):
+    """
+    Returns: A programme of the active calendar with weekly schedules starting at different hours and its episodes
+    """
+    calendar = Calendar.objects.create(name='Calendar', is_active=True)
+    programme = Programme.objects.create(name='Programme', synopsis='', language='en', current_season=1, _runtime=60)
+    for number in range(number_of_schedules):
+        Schedule.objects.create(
+            programme=programme,
+            calendar=calendar,
+            type='L',
+            start_dt=utc.localize(datetime.datetime(2015, 1, 1 + number % 7, number, 0, 0)),
+            recurrences=recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.WEEKLY)]))
+    Episode.objects.bulk_create([
+        Episode(programme=programme, title='Episode %s' % number, season=1, number_in_season=number)
+        for number in range(1, number_of_episodes + 1)
+    ])
+    return programme
+
+
+def benchmark_next_dates():
+    programme = create_weekly_schedules()
+    calendar = Calendar.get_active()
+    after = utc.localize(datetime.datetime(2015, 1, 1))
+    return [
+        ('next_dates', measure_time(list, islice(next_dates(calendar, programme, after), NUMBER_OF_EPISODES)), 's'),
+        ('search_next_dates', measure_time(
+            list, islice(search_next_dates(calendar, programme, after), NUMBER_OF_EPISODES)), 's'),
+    ]
+
+
+def create_schedules_with_excluded_dates(number_of_schedules=NUMBER_OF_SCHEDULES):
+    """
+    Creates schedules on several days of the week with excluded dates, their recurrences take longer to parse
+    """
+    calendar = Calendar.objects.create(name='Calendar', is_active=True)
+    programme = Programme.objects.create(name='Programme', synopsis='', language='en', current_season=1, _runtime=60)
+    start_dt = utc.localize(datetime.datetime(2015, 1, 1, 10, 0, 0))
+    recurrences = recurrence.Recurrence(
+        rrules=[recurrence.Rule(recurrence.WEEKLY, byday=[recurrence.MO, recurrence.WE, recurrence.FR])],
+        exdates=[start_dt + datetime.timedelta(weeks=week) for week in range(1, 11)])
+    Schedule.objects.bulk_create([
+        Schedule(programme=programme, calendar=calendar, type='L', start_dt=start_dt, recurrences=recurrences)
+        for _ in range(number_of_schedules)
+    ])
+
+
+def benchmark_load_schedules():
+    create_schedules_with_excluded_dates(NUMBER_OF_LOADED_SCHEDULES)
+    return [
+        ('LazyRecurrenceField', measure_time(list, Schedule.objects.all()), 's'),
+        ('load_parsed_schedules', measure_time(load_parsed_schedules), 's'),
+    ]
+
+
+def create_programmes_with_schedules(number_of_schedules=NUMBER_OF_SCHEDULES):
+    """
+    Returns: The active calendar with a weekly schedule for programmes of different runtimes
+    """
+    calendar = Calendar.objects.create(name='Calendar', is_active=True)
+    for number in range(number_of_schedules):
+        programme = Programme.objects.create(
+            name='Programme %s' % number, synopsis='', language='en', current_season=1, _runtime=30 + number * 5)
+        Schedule.objects.create(
+            programme=programme,
+            calendar=calendar,
+            type='L',
+            start_dt=utc.localize(datetime.datetime(2015, 1, 1 + number % 7, number, 15 * (number % 3), 0)),
+            recurrences=recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.WEEKLY)]))
+    return calendar
+
+
+def create_calendar_configuration():
+    return CalendarConfiguration(
+        slot_duration=datetime.timedelta(minutes=30),
+        min_time=datetime.time(0, 0),
+        max_time=datetime.time(23, 59, 59))
+
+
+def benchmark_free_slots():
+    calendar = create_programmes_with_schedules()
+    calendar_configuration = create_calendar_configuration()
+    after = datetime.date(2015, 1, 1)
+    before = after + datetime.timedelta(days=NUMBER_OF_SEASON_DAYS - 1)
+    return [
+        ('get_free_slots', measure_time(
+            list, get_free_slots(calendar, after, before, utc, calendar_configuration)), 's'),
+        ('search_free_slots', measure_time(
+            search_free_slots, calendar, after, before, utc, calendar_configuration), 's'),
+    ]
+
+
+def create_transmissions(transmission_class, schedule, after):
+    transmissions = [
+        transmission_class(schedule, after + datetime.timedelta(hours=number))
+        for number in range(NUMBER_OF_TRANSMISSIONS)
+    ]
+    # Templates access the end of each transmission more than once
+    for transmission in transmissions:
+        transmission.end
+        transmission.end
+    return transmissions
+
+
+def benchmark_transmissions_memory():
+    programme = create_weekly_schedules(number_of_schedules=1, number_of_episodes=0)
+    schedule = Schedule.objects.select_related('programme').get(programme=programme)
+    after = utc.localize(datetime.datetime(2015, 1, 1))
+    return [
+        ('Transmission', measure_memory(create_transmissions, Transmission, schedule, after), 'KiB'),
+        ('DictTransmission', measure_memory(create_transmissions, DictTransmission, schedule, after), 'KiB'),
+    ]
+
+
+BENCHMARKS = [
+    benchmark_next_dates,
+    benchmark_transmissions_memory,
+    benchmark_load_schedules,
+    benchmark_free_slots,
+]
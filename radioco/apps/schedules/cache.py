@@ -0,0 +1,17 @@
+from radioco.apps.radioco.cache_utils import get_version, bump_version
+
+SCHEDULES_VERSION_KEY = 'schedules_version'
+
+
+def get_schedules_version():
+    """
+    Returns: A number that changes every time schedules, calendars, programmes or episodes are modified
+    """
+    return get_version(SCHEDULES_VERSION_KEY)
+
+
+def bump_schedules_version(*args, **kwargs):
+    """
+    Invalidate the data calculated from schedules, it can be connected to signals
+    """
+    bump_version(SCHEDULES_VERSION_KEY)
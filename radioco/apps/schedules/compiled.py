@@ -0,0 +1,77 @@
+import copy
+
+from django.conf import settings
+from django.utils import timezone
+
+from radioco.apps.radioco.recurrence_utils import get_recurrence_expander
+from radioco.apps.radioco.tz_utils import transform_dt_to_default_tz
+
+COMPILED_SCHEDULES_CACHE_SIZE = getattr(settings, 'COMPILED_SCHEDULES_CACHE_SIZE', 5000)
+
+_compiled_schedules = {}
+
+
+class CompiledSchedule(object):
+    """
+    Everything needed to expand the recurrences of a schedule: the rules ready to be expanded, the start date in the
+    default timezone and the programme bounds
+
+    Compiled schedules are cached per process by the values they are built from, so a modified schedule gets a new one
+    """
+
+    def __init__(self, schedule):
+        programme = schedule.programme
+        recurrences_field = schedule._meta.get_field('recurrences')
+        unparsed_recurrences = recurrences_field.get_unparsed_value(schedule)
+        if unparsed_recurrences is not None:
+            self.recurrences = recurrences_field.to_python(unparsed_recurrences)
+        else:
+            # The recurrences of the schedule could be modified in place later
+            self.recurrences = copy.deepcopy(schedule.recurrences)
+        self.start_dt = transform_dt_to_default_tz(schedule.start_dt)
+        self.expander = get_recurrence_expander(self.recurrences, self.start_dt, schedule.recurrence_anchor_dt)
+        if schedule.recurrence_anchor_dt:
+            self._unanchored_expander = None
+        else:
+            self._unanchored_expander = self.expander
+        self.programme_start_dt = programme.start_dt
+        self.programme_end_dt = programme.end_dt
+
+    @property
+    def unanchored_expander(self):
+        """
+        Expander starting always from start_dt, used while the anchor could be outdated
+        """
+        if self._unanchored_expander is None:
+            self._unanchored_expander = get_recurrence_expander(self.recurrences, self.start_dt)
+        return self._unanchored_expander
+
+    @staticmethod
+    def get_version(schedule):
+        """
+        Returns: A value which changes when any of the values used to compile the schedule changes
+        """
+        programme = schedule.programme
+        # Schedules loaded from the database don't need to parse their recurrences
+        recurrences = schedule._meta.get_field('recurrences').get_unparsed_value(schedule)
+        if recurrences is None:
+            recurrences = (hash(schedule.recurrences), getattr(schedule.recurrences, 'include_dtstart', True))
+        return (
+            schedule.start_dt, schedule.recurrence_anchor_dt, recurrences,
+            programme.start_date, programme.end_date, timezone.get_default_timezone_name(),
+        )
+
+    @classmethod
+    def get(cls, schedule):
+        key = (schedule.pk, cls.get_version(schedule))
+        try:
+            return _compiled_schedules[key]
+        except KeyError:
+            if len(_compiled_schedules) >= COMPILED_SCHEDULES_CACHE_SIZE:
+                _compiled_schedules.clear()
+            compiled_schedule = _compiled_schedules[key] = cls(schedule)
+            return compiled_schedule
+
+    @staticmethod
+    def clear():
+        _compiled_schedules.clear()
@@ -0,0 +1,113 @@
+import bisect
+import datetime
+import heapq
+from itertools import count
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from radioco.apps.schedules.models import Schedule, Transmission
+
+SCHEDULE_OVERLAP_VALIDATION = getattr(settings, 'SCHEDULE_OVERLAP_VALIDATION', False)
+SCHEDULE_OVERLAP_VALIDATION_DAYS = getattr(settings, 'SCHEDULE_OVERLAP_VALIDATION_DAYS', 365)
+
+
+class Conflict(object):
+    """
+    Two transmissions on air at the same time
+    """
+    __slots__ = ('transmissions', 'start', 'end')
+
+    def __init__(self, transmission, other):
+        self.transmissions = (transmission, other)
+        self.start = max(transmission.start, other.start)
+        self.end = min(transmission.end, other.end)
+
+
+def find_conflicts(transmissions):
+    """
+    Sweep-line over transmissions sorted by start date, only the transmissions still on air are compared
+    Returns: A generator of conflicts sorted by the start date of the second transmission
+    """
+    on_air = []
+    # Transmissions aren't comparable, the counter breaks ties in the heap
+    counter = count()
+    for transmission in transmissions:
+        while on_air and on_air[0][0] <= transmission.start:
+            heapq.heappop(on_air)
+        for _, _, other in sorted(on_air, key=lambda item: (item[2].start, item[1])):
+            yield Conflict(other, transmission)
+        heapq.heappush(on_air, (transmission.end, next(counter), transmission))
+
+
+class IntervalIndex(object):
+    """
+    Transmissions sorted by start date, finding the ones overlapping a period of time doesn't need to compare them all
+    """
+
+    def __init__(self, transmissions):
+        self.transmissions = sorted(transmissions, key=lambda transmission: transmission.start)
+        self.starts = [transmission.start for transmission in self.transmissions]
+        self.max_duration = max(
+            [transmission.end - transmission.start for transmission in self.transmissions],
+            default=datetime.timedelta(0)
+        )
+
+    def overlapping(self, start, end):
+        """
+        Returns: A list of the transmissions on air between start and end (excluded)
+        """
+        # A transmission starting before start - max_duration has to be finished at start
+        first = bisect.bisect_right(self.starts, start - self.max_duration)
+        last = bisect.bisect_left(self.starts, end)
+        return [transmission for transmission in self.transmissions[first:last] if transmission.end > start]
+
+
+def find_schedule_conflicts(schedule, after=None, before=None):
+    """
+    Returns: A list of conflicts between the transmissions of a schedule, which could be unsaved, and the ones of the
+    other schedules of its calendar
+    """
+    if after is None:
+        after = max(schedule.start_dt, timezone.now())
+    if before is None:
+        before = after + datetime.timedelta(days=SCHEDULE_OVERLAP_VALIDATION_DAYS)
+
+    dates = list(schedule.dates_between(after, before))
+    if not dates:
+        return []
+    other_schedules = Schedule.objects.filter(calendar=schedule.calendar)
+    if schedule.pk:
+        other_schedules = other_schedules.exclude(pk=schedule.pk)
+    # Only the period of time of the schedule is relevant
+    index = IntervalIndex(Transmission.between(dates[0], dates[-1] + schedule.runtime, schedules=other_schedules))
+
+    conflicts = []
+    for date in dates:
+        transmission = Transmission(schedule, date)
+        for other in index.overlapping(transmission.start, transmission.end):
+            conflicts.append(Conflict(other, transmission))
+    return conflicts
+
+
+def find_transmission_conflicts(schedule, start, moved_from=None):
+    """
+    Returns: A list of conflicts between a transmission of the schedule starting at the given date and the other
+    transmissions of its calendar, the transmission of the schedule at moved_from is skipped because it's the one moved
+    """
+    transmission = Transmission(schedule, start)
+    other_schedules = Schedule.objects.filter(calendar=schedule.calendar)
+    index = IntervalIndex(
+        Transmission(other_schedule, date)
+        for date, other_schedule in Transmission.dates_between(
+            transmission.start, transmission.end, schedules=other_schedules)
+        if other_schedule.pk != schedule.pk or date != moved_from
+    )
+    return [Conflict(other, transmission) for other in index.overlapping(transmission.start, transmission.end)]
+
+
+def validate_no_conflicts(conflicts):
+    if conflicts:
+        transmission = conflicts[0].transmissions[0]
+        raise ValidationError('Schedule overlaps with %s at %s' % (transmission.name, transmission.start.isoformat()))
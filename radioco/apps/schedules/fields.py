@@ -0,0 +1,54 @@
+from django.utils import six
+from recurrence.fields import RecurrenceField
+
+
+class LazyRecurrenceDescriptor(object):
+    """
+    Keeps the text stored in the database until the recurrence is accessed for the first time
+    """
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, obj, type=None):
+        if obj is None:
+            return self
+        if self.field.attname not in obj.__dict__:
+            # Deferred field, loaded like Django's DeferredAttribute does
+            obj.refresh_from_db(fields=[self.field.attname])
+        value = obj.__dict__[self.field.name]
+        if isinstance(value, six.string_types):
+            value = obj.__dict__[self.field.name] = self.field.to_python(value)
+        return value
+
+    def __set__(self, obj, value):
+        if not isinstance(value, six.string_types):
+            value = self.field.to_python(value)
+        obj.__dict__[self.field.name] = value
+
+
+class LazyRecurrenceField(RecurrenceField):
+    """
+    A RecurrenceField parsing the recurrence on first access instead of when the object is loaded
+    """
+
+    def from_db_value(self, value, *args, **kwargs):
+        return value
+
+    def pre_save(self, model_instance, add):
+        value = self.get_unparsed_value(model_instance)
+        if value is not None:
+            return value
+        return super(LazyRecurrenceField, self).pre_save(model_instance, add)
+
+    def contribute_to_class(self, cls, *args, **kwargs):
+        super(LazyRecurrenceField, self).contribute_to_class(cls, *args, **kwargs)
+        setattr(cls, self.name, LazyRecurrenceDescriptor(self))
+
+    def get_unparsed_value(self, obj):
+        """
+        Returns: The text of the recurrence if it hasn't been accessed yet, None otherwise
+        """
+        value = obj.__dict__.get(self.name)
+        if isinstance(value, six.string_types):
+            return value
+        return None
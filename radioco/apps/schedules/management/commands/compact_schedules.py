@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from radioco.apps.schedules.models import Schedule, compact_schedules
+
+
+class Command(BaseCommand):
+    help = 'Move the past excluded dates of the schedules to new schedules ending before now'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-excluded-dates', type=int, default=10,
+            help='Only schedules with at least this number of past excluded dates are compacted'
+        )
+
+    def handle(self, *args, **options):
+        past_schedules = compact_schedules(
+            Schedule.objects.all(), timezone.now(), min_excluded_dates=options['min_excluded_dates'])
+        self.stdout.write('%s schedules compacted' % len(past_schedules))
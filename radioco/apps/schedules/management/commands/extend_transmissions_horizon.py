@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from radioco.apps.schedules.models import Schedule, get_transmissions_horizon
+
+
+class Command(BaseCommand):
+    help = 'Move the window of stored occurrences to the configured horizon around now'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true', default=False,
+            help='Discard the stored occurrences and generate them again'
+        )
+
+    def handle(self, *args, **options):
+        after, before = get_transmissions_horizon()
+        schedules = Schedule.objects.select_related('programme', 'calendar')
+        for schedule in schedules.iterator():
+            schedule.update_recurrence_anchor()
+            if options['rebuild']:
+                schedule.materialize_occurrences(after, before)
+            else:
+                schedule.extend_occurrences(after, before)
+        self.stdout.write('Occurrences stored between %s and %s' % (after, before))
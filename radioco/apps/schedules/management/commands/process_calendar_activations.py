@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from radioco.apps.schedules.models import CalendarActivation
+
+
+class Command(BaseCommand):
+    help = 'Process the pending calendar activations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Number of processes rearranging the episodes of the programmes'
+        )
+        parser.add_argument(
+            '--once', action='store_true', default=False,
+            help='Exit when there are no pending activations'
+        )
+        parser.add_argument(
+            '--interval', type=int, default=10,
+            help='Seconds to wait before looking for new activations'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            activation = CalendarActivation.objects.claim()
+            if activation:
+                self.stdout.write('Activating calendar %s' % activation.calendar)
+                try:
+                    activation.run(workers=options['workers'])
+                except Exception:
+                    self.stderr.write('Calendar %s could not be activated:\n%s' % (
+                        activation.calendar, activation.error))
+                else:
+                    self.stdout.write('Calendar %s activated' % activation.calendar)
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
@@ -0,0 +1,56 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from radioco.apps.programmes.models import Programme
+from radioco.apps.schedules.models import Schedule, close_connections, recompute_effective_dates, \
+    rearrange_episodes_on_commit, suspend_rearrange_episodes
+
+
+def _recompute_effective_dates(schedule_ids):
+    """
+    Returns: The programme ids of the changed schedules of the batch
+    """
+    # The episodes are rearranged once at the end of the command
+    with suspend_rearrange_episodes():
+        changed = recompute_effective_dates(
+            Schedule.objects.select_related('programme').filter(pk__in=schedule_ids))
+        for schedule in changed:
+            # The stored occurrences depend on the effective dates
+            schedule.materialize_occurrences()
+    return [schedule.programme_id for schedule in changed]
+
+
+class Command(BaseCommand):
+    help = 'Recalculate the effective start and end dates of every schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--parallel', type=int, default=1,
+            help='Number of processes recalculating the schedules'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of schedules processed in each batch'
+        )
+
+    def handle(self, *args, **options):
+        schedule_ids = list(Schedule.objects.order_by('pk').values_list('pk', flat=True))
+        batch_size = options['batch_size']
+        batches = [schedule_ids[index:index + batch_size] for index in range(0, len(schedule_ids), batch_size)]
+
+        programme_ids = []
+        if options['parallel'] > 1:
+            # Expanding the recurrences is CPU-bound, processes are used instead of threads because of the GIL
+            close_connections()
+            with ProcessPoolExecutor(max_workers=options['parallel']) as executor:
+                for batch_programme_ids in executor.map(_recompute_effective_dates, batches):
+                    programme_ids.extend(batch_programme_ids)
+        else:
+            for batch in batches:
+                programme_ids.extend(_recompute_effective_dates(batch))
+
+        # Episodes depend on the effective dates
+        for programme in Programme.objects.filter(pk__in=set(programme_ids)):
+            rearrange_episodes_on_commit(programme)
+        self.stdout.write('%s of %s schedules updated' % (len(programme_ids), len(schedule_ids)))
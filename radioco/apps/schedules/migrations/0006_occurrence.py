@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 19:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('programmes', '0012__v5_0__podcast_podcast_file'),
+        ('schedules', '0005__v3_0__migrating_schedules_to_unique_calendar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Occurrence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField(db_index=True)),
+                ('end', models.DateTimeField()),
+                ('calendar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='schedules.Calendar')),
+                ('programme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='programmes.Programme')),
+            ],
+            options={
+                'verbose_name': 'occurrence',
+                'verbose_name_plural': 'occurrences',
+            },
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='materialized_after',
+            field=models.DateTimeField(blank=True, help_text='This field is dynamically generated to improve performance', null=True, verbose_name='occurrences stored from'),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='materialized_before',
+            field=models.DateTimeField(blank=True, help_text='This field is dynamically generated to improve performance', null=True, verbose_name='occurrences stored until'),
+        ),
+        migrations.AddField(
+            model_name='occurrence',
+            name='schedule',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='schedules.Schedule'),
+        ),
+        migrations.AlterIndexTogether(
+            name='occurrence',
+            index_together=set([('start', 'end'), ('calendar', 'start')]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 19:24
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedules', '0006_occurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='recurrence_anchor_dt',
+            field=models.DateTimeField(blank=True, help_text='This field is dynamically generated to improve performance', null=True, verbose_name='recurrence anchor'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 19:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedules', '0007_schedule_recurrence_anchor_dt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarActivation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('P', 'pending'), ('R', 'running'), ('D', 'done'), ('F', 'failed')], db_index=True, default='P', max_length=1, verbose_name='status')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='programmes')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='processed programmes')),
+                ('error', models.TextField(blank=True, verbose_name='error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finished at')),
+                ('calendar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activations', to='schedules.Calendar', verbose_name='calendar')),
+            ],
+            options={
+                'verbose_name': 'calendar activation',
+                'verbose_name_plural': 'calendar activations',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 20:12
+from __future__ import unicode_literals
+
+from django.db import migrations
+import radioco.apps.schedules.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedules', '0008_calendaractivation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='schedule',
+            name='recurrences',
+            field=radioco.apps.schedules.fields.LazyRecurrenceField(help_text='Excluded dates will appear in this list as result of dragging and dropping.', verbose_name='recurrences'),
+        ),
+    ]
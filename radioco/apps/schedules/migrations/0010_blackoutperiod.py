@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 20:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedules', '0009_schedule_lazy_recurrences'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlackoutPeriod',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=255, verbose_name='name')),
+                ('start', models.DateTimeField(verbose_name='start date')),
+                ('end', models.DateTimeField(verbose_name='end date')),
+            ],
+            options={
+                'verbose_name': 'blackout period',
+                'verbose_name_plural': 'blackout periods',
+                'ordering': ('start',),
+            },
+        ),
+        migrations.AddField(
+            model_name='calendar',
+            name='has_blackout_periods',
+            field=models.BooleanField(default=False, editable=False, help_text='This field is dynamically generated to improve performance'),
+        ),
+        migrations.AddField(
+            model_name='blackoutperiod',
+            name='calendar',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blackout_periods', to='schedules.Calendar', verbose_name='calendar'),
+        ),
+    ]
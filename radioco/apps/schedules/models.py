@@ -13,20 +13,35 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import bisect
 import datetime
 import heapq
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 from functools import partial, total_ordering
+from itertools import chain, dropwhile, islice, takewhile
 
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import connection, connections, models, transaction
 from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
-from recurrence.fields import RecurrenceField
 
 from radioco.apps.programmes.models import Programme, Episode
+from radioco.apps.radioco.utils import bulk_update
+from radioco.apps.radioco.recurrence_utils import calculate_recurrence_anchor
+from radioco.apps.schedules.cache import get_schedules_version, bump_schedules_version
+from radioco.apps.schedules.compiled import CompiledSchedule
+from radioco.apps.schedules.fields import LazyRecurrenceField
 from radioco.apps.radioco.tz_utils import transform_datetime_tz, fix_recurrence_dst, transform_dt_to_default_tz, \
-    fix_recurrence_date, recurrence_after, recurrence_before
+    fix_recurrence_date, recurrence_after, recurrence_before, recurrence_between, recurrence_xafter
 
 EMISSION_TYPE = (
     ("L", _("live")),
@@ -42,6 +57,14 @@ FR = 4
 SA = 5
 SU = 6
 
+TRANSMISSIONS_HORIZON_PAST_DAYS = getattr(settings, 'TRANSMISSIONS_HORIZON_PAST_DAYS', 90)
+TRANSMISSIONS_HORIZON_FUTURE_DAYS = getattr(settings, 'TRANSMISSIONS_HORIZON_FUTURE_DAYS', 365)
+CALENDAR_ACTIVATION_TIMEOUT_MINUTES = getattr(settings, 'CALENDAR_ACTIVATION_TIMEOUT_MINUTES', 60)
+TRANSMISSIONS_INDEX_DURATION = datetime.timedelta(hours=12)
+EPISODES_BATCH_SIZE = 500
+ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+BULK_CREATE_BATCH_SIZE = 500
+
 WEEKDAY_CHOICES = (
     (MO, _('Monday')),
     (TU, _('Tuesday')),
@@ -66,19 +89,102 @@ class Calendar(models.Model):
 
     name = models.CharField(max_length=255, unique=True, verbose_name=_("name"))
     is_active = models.BooleanField(default=False)
+    has_blackout_periods = models.BooleanField(
+        default=False, editable=False,
+        help_text=_('This field is dynamically generated to improve performance')
+    )
 
     def save(self, *args, **kwargs):
-        if self.is_active:
+        if self.pk:
+            # This instance could have been loaded before a blackout period was added or deleted
+            self.has_blackout_periods = BlackoutPeriod.objects.filter(calendar_id=self.pk).exists()
+        # Saving the active calendar (or its inlines in the admin) doesn't rearrange the episodes again
+        if self.becomes_active():
             active_calendars = Calendar.objects.filter(is_active=True)
             active_calendars.update(is_active=False)
             self.rearrange_episodes()
         super(Calendar, self).save(*args, **kwargs)
 
+    def becomes_active(self):
+        return self.is_active and not Calendar.objects.filter(pk=self.pk, is_active=True).exists()
+
     def rearrange_episodes(self):
         now = timezone.now()
         for programme in Programme.objects.filter(Q(end_date__gte=now) | Q(end_date__isnull=True)):
             programme.rearrange_episodes(now, self)
 
+    def activate_in_background(self):
+        """
+        Queue the activation of the calendar, the current active calendar is used until the job is finished
+        """
+        activation = self.activations.filter(
+            status__in=[CalendarActivation.PENDING, CalendarActivation.RUNNING]).first()
+        return activation or CalendarActivation.objects.create(calendar=self)
+
+    def get_last_activation(self):
+        return self.activations.order_by('-id').first()
+
+    @transaction.atomic
+    def clone(self, name):
+        """
+        Copy the calendar with its schedules, excluded dates, blackout periods and stored occurrences
+        Everything is copied in bulk, the values calculated from the schedules don't change so they are copied too
+        Returns: The new inactive calendar
+        """
+        # The copy isn't active, its episodes don't have to be rearranged
+        with suspend_rearrange_episodes():
+            calendar = Calendar.objects.create(name=name, has_blackout_periods=self.has_blackout_periods)
+            BlackoutPeriod.objects.bulk_create([
+                BlackoutPeriod(calendar=calendar, name=period_name, start=start, end=end)
+                for period_name, start, end in self.blackout_periods.values_list('name', 'start', 'end')
+            ])
+
+            schedules = list(Schedule.objects.filter(calendar=self).order_by('id'))
+            old_ids = [schedule.id for schedule in schedules]
+            for schedule in schedules:
+                schedule.id = schedule.pk = None
+                schedule.calendar = calendar
+            Schedule.objects.bulk_create(schedules, batch_size=BULK_CREATE_BATCH_SIZE)
+            if not connection.features.can_return_ids_from_bulk_insert:
+                # Rows are inserted in order, the new calendar only has these schedules
+                new_ids = Schedule.objects.filter(calendar=calendar).order_by('id').values_list('id', flat=True)
+                for schedule, new_id in zip(schedules, new_ids):
+                    schedule.id = schedule.pk = new_id
+            ids = dict(zip(old_ids, [schedule.id for schedule in schedules]))
+
+            # References to schedules of the original calendar have to point to the copies
+            changed = []
+            for schedule in schedules:
+                if schedule.source_id in ids or schedule.from_collection_id in ids:
+                    schedule.source_id = ids.get(schedule.source_id, schedule.source_id)
+                    schedule.from_collection_id = ids.get(schedule.from_collection_id, schedule.from_collection_id)
+                    changed.append(schedule)
+            bulk_update(Schedule, changed, ['source', 'from_collection'])
+
+            ExcludedDates.objects.bulk_create([
+                ExcludedDates(schedule_id=ids[schedule_id], datetime=dt)
+                for schedule_id, dt in ExcludedDates.objects.filter(schedule__calendar=self).values_list(
+                    'schedule_id', 'datetime').iterator()
+            ], batch_size=BULK_CREATE_BATCH_SIZE)
+            Occurrence.objects.bulk_create((
+                Occurrence(
+                    schedule_id=ids[schedule_id], programme_id=programme_id, calendar=calendar, start=start, end=end)
+                for schedule_id, programme_id, start, end in Occurrence.objects.filter(calendar=self).values_list(
+                    'schedule_id', 'programme_id', 'start', 'end').iterator()
+            ), batch_size=BULK_CREATE_BATCH_SIZE)
+
+        # Signals aren't sent by bulk operations
+        bump_schedules_version()
+        return calendar
+
+    def get_blackout_periods(self):
+        """
+        Returns: The BlackoutPeriods of the calendar, they are only queried if the calendar has any
+        """
+        if not self.has_blackout_periods:
+            return NO_BLACKOUT_PERIODS
+        return BlackoutPeriod.objects.for_calendar(self.id)
+
     @classmethod
     def get_active(cls):
         try:
@@ -89,7 +195,301 @@ class Calendar(models.Model):
     def __str__(self):
         return "%s" % (self.name)
 
-# We are not rearranging episodes during deletion
+
+def close_connections():
+    """
+    Close the database and cache connections before forking, the processes can't share their sockets
+    Every process opens its own connections when they are needed
+    """
+    connections.close_all()
+    for cache in caches.all():
+        cache.close()
+
+
+class CalendarActivationManager(models.Manager):
+
+    def claim(self):
+        """
+        Returns: The oldest pending activation marked as running or None
+        Activations running for longer than CALENDAR_ACTIVATION_TIMEOUT_MINUTES are claimed again, their worker died
+        """
+        now = timezone.now()
+        stale = now - datetime.timedelta(minutes=CALENDAR_ACTIVATION_TIMEOUT_MINUTES)
+        with transaction.atomic():
+            activation = self.select_for_update().filter(
+                Q(status=CalendarActivation.PENDING) |
+                Q(status=CalendarActivation.RUNNING, started_at__lt=stale)
+            ).order_by('id').first()
+            if activation:
+                activation.status = CalendarActivation.RUNNING
+                activation.started_at = now
+                activation.processed = 0
+                activation.save()
+            return activation
+
+
+class CalendarActivation(models.Model):
+    """
+    Background job activating a calendar, episodes are rearranged before switching the active calendar
+    """
+    PENDING = 'P'
+    RUNNING = 'R'
+    DONE = 'D'
+    FAILED = 'F'
+    STATUS_CHOICES = (
+        (PENDING, _('pending')),
+        (RUNNING, _('running')),
+        (DONE, _('done')),
+        (FAILED, _('failed')),
+    )
+
+    class Meta:
+        verbose_name = _('calendar activation')
+        verbose_name_plural = _('calendar activations')
+
+    objects = CalendarActivationManager()
+
+    calendar = models.ForeignKey(
+        Calendar, related_name='activations', on_delete=models.CASCADE, verbose_name=_('calendar'))
+    status = models.CharField(
+        max_length=1, choices=STATUS_CHOICES, default=PENDING, db_index=True, verbose_name=_('status'))
+    total = models.PositiveIntegerField(default=0, verbose_name=_('programmes'))
+    processed = models.PositiveIntegerField(default=0, verbose_name=_('processed programmes'))
+    error = models.TextField(blank=True, verbose_name=_('error'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('created at'))
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name=_('started at'))
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name=_('finished at'))
+
+    def run(self, workers=1):
+        """
+        Rearrange the episodes of every programme using the new calendar and switch the active calendar
+        The current active calendar is used until everything is committed in a single transaction
+        With several workers the connections are closed before forking, it can't be called inside a transaction
+        """
+        try:
+            now = timezone.now()
+            calendar = self.calendar
+            programmes = list(Programme.objects.filter(Q(end_date__gte=now) | Q(end_date__isnull=True)))
+            self._update_progress(total=len(programmes))
+
+            moves = []
+            if workers > 1:
+                # Expanding the recurrences is CPU-bound, processes are used instead of threads because of the GIL
+                close_connections()
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [
+                        executor.submit(programme.get_episode_moves, now, calendar)
+                        for programme in programmes
+                    ]
+                    for future in as_completed(futures):
+                        moves.extend(future.result())
+                        self._update_progress(processed=self.processed + 1)
+            else:
+                for programme in programmes:
+                    moves.extend(programme.get_episode_moves(now, calendar))
+                    self._update_progress(processed=self.processed + 1)
+
+            with transaction.atomic():
+                bulk_update(Episode, [move.episode for move in moves], ['issue_date'])
+                Calendar.objects.exclude(pk=self.calendar_id).update(is_active=False)
+                Calendar.objects.filter(pk=self.calendar_id).update(is_active=True)
+                bump_schedules_version()
+                self._update_progress(status=CalendarActivation.DONE, finished_at=timezone.now())
+        except Exception:
+            self._update_progress(
+                status=CalendarActivation.FAILED, finished_at=timezone.now(), error=traceback.format_exc())
+            raise
+
+    def _update_progress(self, **fields):
+        for field, value in fields.items():
+            setattr(self, field, value)
+        CalendarActivation.objects.filter(pk=self.pk).update(**fields)
+
+    def __str__(self):
+        return "%s (%s)" % (self.calendar, self.get_status_display())
+
+
+_rearrangement_state = threading.local()
+
+
+class PendingRearrangements(object):
+    """
+    Programmes waiting for the current transaction to be committed to rearrange their episodes
+    """
+    def __init__(self):
+        self.programmes = OrderedDict()
+
+    def add(self, programme):
+        self.programmes[programme.pk] = programme
+
+    def run(self):
+        if getattr(_rearrangement_state, 'pending', None) is self:
+            _rearrangement_state.pending = None
+        # The first callback of the transaction rearranges every programme, the next ones don't have anything to do
+        programmes, self.programmes = self.programmes, OrderedDict()
+        if not programmes:
+            return
+        now = timezone.now()
+        calendar = Calendar.get_active()
+        for programme in programmes.values():
+            programme.rearrange_episodes(now, calendar)
+
+
+def rearrange_episodes_on_commit(programme):
+    """
+    Rearrange the episodes of a programme when the current transaction is committed
+    Several requests for the same programme in a transaction are run only once
+    """
+    suspended = getattr(_rearrangement_state, 'suspended', [])
+    if suspended:
+        for skipped in suspended:
+            skipped.add(programme)
+        return
+
+    pending = getattr(_rearrangement_state, 'pending', None)
+    if pending is None:
+        pending = _rearrangement_state.pending = PendingRearrangements()
+    pending.add(programme)
+    # The callbacks of a savepoint are discarded when it's rolled back, registering one for every request
+    # the programmes are rearranged while any of them is left. Without a transaction it's executed immediately
+    transaction.on_commit(pending.run)
+
+
+@contextmanager
+def suspend_rearrange_episodes():
+    """
+    Skip the rearrangement of episodes inside the block, the caller is responsible of rearranging them
+    Yields: A set with the programmes which have been skipped
+    """
+    if not hasattr(_rearrangement_state, 'suspended'):
+        _rearrangement_state.suspended = []
+    skipped = set()
+    _rearrangement_state.suspended.append(skipped)
+    try:
+        yield skipped
+    finally:
+        _rearrangement_state.suspended.remove(skipped)
+
+
+class BlackoutPeriods(object):
+    """
+    Sorted periods of time without transmissions, overlapping periods are merged
+    """
+    def __init__(self, periods):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(periods):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def get_period(self, dt):
+        """
+        Returns: A tuple with the start and end of the period containing dt, None if there isn't any
+        """
+        index = bisect.bisect_right(self.starts, dt) - 1
+        if index >= 0 and dt < self.ends[index]:
+            return self.starts[index], self.ends[index]
+        return None
+
+    def __contains__(self, dt):
+        return self.get_period(dt) is not None
+
+    def __bool__(self):
+        return bool(self.starts)
+
+
+NO_BLACKOUT_PERIODS = BlackoutPeriods([])
+
+_blackout_periods_cache = {'version': None, 'calendars': {}}
+
+
+class BlackoutPeriodManager(models.Manager):
+
+    def for_calendar(self, calendar_id):
+        """
+        Returns: The BlackoutPeriods of a calendar, cached per process until the schedules version changes
+        """
+        version = get_schedules_version()
+        if _blackout_periods_cache['version'] != version:
+            _blackout_periods_cache['version'] = version
+            _blackout_periods_cache['calendars'] = {}
+        calendars = _blackout_periods_cache['calendars']
+        try:
+            return calendars[calendar_id]
+        except KeyError:
+            blackout_periods = calendars[calendar_id] = BlackoutPeriods(
+                self.filter(calendar_id=calendar_id).values_list('start', 'end'))
+            return blackout_periods
+
+
+class BlackoutPeriod(models.Model):
+    """
+    Period of time where all the transmissions of a calendar are cancelled
+    """
+    class Meta:
+        verbose_name = _('blackout period')
+        verbose_name_plural = _('blackout periods')
+        ordering = ('start',)
+
+    calendar = models.ForeignKey(
+        Calendar, on_delete=models.CASCADE, related_name='blackout_periods', verbose_name=_('calendar'))
+    name = models.CharField(max_length=255, blank=True, verbose_name=_('name'))
+    start = models.DateTimeField(verbose_name=_('start date'))
+    end = models.DateTimeField(verbose_name=_('end date'))
+
+    objects = BlackoutPeriodManager()
+
+    def clean(self):
+        if self.start and self.end and self.start >= self.end:
+            raise ValidationError(_('The end date has to be greater than the start date.'))
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        periods = [(self.start, self.end)]
+        if self.pk:
+            # The occurrences of the previous period have to be stored again
+            periods.extend(BlackoutPeriod.objects.filter(pk=self.pk).values_list('start', 'end'))
+        super(BlackoutPeriod, self).save(*args, **kwargs)
+        self._update_calendar(periods)
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        periods = [(self.start, self.end)]
+        result = super(BlackoutPeriod, self).delete(*args, **kwargs)
+        self._update_calendar(periods)
+        return result
+
+    def _update_calendar(self, periods):
+        has_blackout_periods = BlackoutPeriod.objects.filter(calendar_id=self.calendar_id).exists()
+        Calendar.objects.filter(pk=self.calendar_id).update(has_blackout_periods=has_blackout_periods)
+        bump_schedules_version()
+        # Only the stored occurrences starting inside the changed periods are affected
+        schedules = list(Schedule.objects.filter(
+            calendar_id=self.calendar_id, materialized_after__isnull=False, materialized_before__isnull=False
+        ).select_related('programme', 'calendar'))
+        for start, end in periods:
+            Occurrence.objects.filter(calendar_id=self.calendar_id, start__gte=start, start__lt=end).delete()
+            Occurrence.objects.bulk_create([
+                occurrence
+                for schedule in schedules
+                if schedule.materialized_after < end and start <= schedule.materialized_before
+                for occurrence in schedule._build_occurrences([
+                    date for date in schedule.dates_between(
+                        max(start, schedule.materialized_after), min(end, schedule.materialized_before))
+                    if start <= date < end
+                ])
+            ], batch_size=BULK_CREATE_BATCH_SIZE)
+        # Episodes of the active calendar have to be moved to the next transmissions
+        if Calendar.objects.filter(pk=self.calendar_id, is_active=True).exists():
+            for programme in Programme.objects.filter(
+                    schedule__calendar_id=self.calendar_id, schedule__type='L').distinct():
+                rearrange_episodes_on_commit(programme)
+
+    def __str__(self):
+        return '%s - %s' % (self.start, self.end)
 
 
 class ExcludedDates(models.Model):
@@ -122,7 +522,7 @@ class Schedule(models.Model):
     programme = models.ForeignKey(Programme, verbose_name=_("programme"), on_delete=models.CASCADE)
     type = models.CharField(verbose_name=_("type"), choices=EMISSION_TYPE, max_length=1)
     calendar = models.ForeignKey(Calendar, verbose_name=_("calendar"), on_delete=models.CASCADE)
-    recurrences = RecurrenceField(
+    recurrences = LazyRecurrenceField(
         verbose_name=_("recurrences"),
         help_text=_("Excluded dates will appear in this list as result of dragging and dropping.")
     )
@@ -149,6 +549,21 @@ class Schedule(models.Model):
         help_text=_("Main schedule when (if this is a broadcast).")
     )
 
+    recurrence_anchor_dt = models.DateTimeField(
+        blank=True, null=True, verbose_name=_('recurrence anchor'),
+        help_text=_('This field is dynamically generated to improve performance')
+    )
+
+    materialized_after = models.DateTimeField(
+        blank=True, null=True, verbose_name=_('occurrences stored from'),
+        help_text=_('This field is dynamically generated to improve performance')
+    )
+
+    materialized_before = models.DateTimeField(
+        blank=True, null=True, verbose_name=_('occurrences stored until'),
+        help_text=_('This field is dynamically generated to improve performance')
+    )
+
     def save(self, *args, **kwargs):
         assert self.start_dt, 'start_dt is required'
         self._update_recurrence_dates()
@@ -158,9 +573,13 @@ class Schedule(models.Model):
 
         self._update_effective_dates()
 
+        self._update_recurrence_anchor()
+
         super(Schedule, self).save(*args, **kwargs)
 
-        self.programme.rearrange_episodes(timezone.now(), Calendar.get_active())
+        self.materialize_occurrences()
+
+        rearrange_episodes_on_commit(self.programme)
 
     def _update_recurrence_dates(self):
         """
@@ -179,11 +598,14 @@ class Schedule(models.Model):
         We need to update dates inside ExcludedDates and the recurrence library
         """
         exdates = []
+        changed = []
         for excluded in ExcludedDates.objects.filter(schedule=self):
             new_excluded_dt = excluded.get_new_excluded_datetime(self.start_dt)
-            excluded.datetime = new_excluded_dt
-            excluded.save()
+            if excluded.datetime != new_excluded_dt:
+                excluded.datetime = new_excluded_dt
+                changed.append(excluded)
             exdates.append(fix_recurrence_date(self.start_dt, new_excluded_dt))
+        bulk_update(ExcludedDates, changed, ['datetime'])
         self.recurrences.exdates = exdates
 
     def _update_effective_dates(self):
@@ -191,10 +613,83 @@ class Schedule(models.Model):
         self.effective_start_dt = calculate_effective_schedule_start_dt(self)
         self.effective_end_dt = calculate_effective_schedule_end_dt(self)
 
+    def _update_recurrence_anchor(self):
+        """
+        Recurrences are expanded from a recent occurrence instead of start_dt, see AnchoredRecurrence
+        """
+        after = get_transmissions_horizon()[0]
+        start_dt = transform_dt_to_default_tz(self.start_dt)
+        self.recurrence_anchor_dt = fix_recurrence_dst(
+            calculate_recurrence_anchor(self.recurrences, start_dt, transform_dt_to_default_tz(after)))
+
+    def update_recurrence_anchor(self):
+        self._update_recurrence_anchor()
+        # Avoiding save, the recurrences are not changing
+        Schedule.objects.filter(pk=self.pk).update(recurrence_anchor_dt=self.recurrence_anchor_dt)
+
+    def materialize_occurrences(self, after=None, before=None):
+        """
+        Replace the stored occurrences of this schedule with the ones between after and before
+        By default the configured horizon around now is used
+        """
+        if after is None or before is None:
+            after, before = get_transmissions_horizon()
+        Occurrence.objects.filter(schedule=self).delete()
+        Occurrence.objects.bulk_create(self._build_occurrences(self.dates_between(after, before)))
+        self._update_materialized_window(after, before)
+
+    def extend_occurrences(self, after, before):
+        """
+        Move the stored window to [after, before] reusing the occurrences already stored
+        """
+        if not self.materialized_after or not self.materialized_before \
+                or not self.materialized_after <= after <= self.materialized_before:
+            return self.materialize_occurrences(after, before)
+
+        # Keeping the transmission which is still running at after
+        Occurrence.objects.filter(schedule=self, end__lte=after).delete()
+        if before > self.materialized_before:
+            last_before = self.materialized_before
+            dates = [_dt for _dt in self.dates_between(last_before, before) if _dt > last_before]
+            Occurrence.objects.bulk_create(self._build_occurrences(dates))
+        self._update_materialized_window(after, max(before, self.materialized_before))
+
+    def is_materialized(self, after, before):
+        """
+        Returns True if the occurrences between after and before are stored
+        """
+        return bool(
+            self.materialized_after and self.materialized_before and
+            self.materialized_after <= after and before <= self.materialized_before
+        )
+
+    def _build_occurrences(self, dates):
+        runtime = self.runtime
+        return [
+            Occurrence(
+                schedule=self, programme_id=self.programme_id, calendar_id=self.calendar_id,
+                start=date, end=date + runtime
+            ) for date in dates
+        ]
+
+    def _update_materialized_window(self, after, before):
+        self.materialized_after = after
+        self.materialized_before = before
+        # Avoiding save, the recurrences are not changing
+        Schedule.objects.filter(pk=self.pk).update(materialized_after=after, materialized_before=before)
+
     @property
     def runtime(self):
         return self.programme.runtime
 
+    @property
+    def compiled(self):
+        return CompiledSchedule.get(self)
+
+    @property
+    def blackout_periods(self):
+        return self.calendar.get_blackout_periods()
+
     @staticmethod
     def get_schedule_which_excluded_dt(programme, dt):
         try:
@@ -215,6 +710,50 @@ class Schedule(models.Model):
     def has_recurrences(self):
         return self.recurrences
 
+    @transaction.atomic
+    def compact(self, before):
+        """
+        Split the schedule to keep the excluded dates before the given date out of its recurrences
+        The past is moved to a new schedule ending the day before the next transmission, where this schedule starts now.
+        Transmissions don't change.
+
+        Returns: The new schedule with the past transmissions or None if there was nothing to compact
+        """
+        if not self.has_recurrences() or any(rrule.count for rrule in self.recurrences.rrules):
+            return None
+        if not ExcludedDates.objects.filter(schedule=self, datetime__lt=before).exists():
+            return None
+        new_start_dt = self.date_after(before)
+        if not new_start_dt or new_start_dt <= self.start_dt \
+                or self.effective_end_dt and new_start_dt >= self.effective_end_dt:
+            return None
+
+        default_tz = timezone.get_default_timezone()
+        last_day = transform_dt_to_default_tz(new_start_dt).date() - datetime.timedelta(days=1)
+        until = default_tz.localize(datetime.datetime.combine(last_day, datetime.time(23, 59, 59)))
+
+        # The transmissions don't change, the episodes don't have to be rearranged
+        with suspend_rearrange_episodes():
+            past_schedule = Schedule.objects.get(id=self.id)
+            past_schedule.id = past_schedule.pk = None
+            for rrule in past_schedule.recurrences.rrules:
+                if not rrule.until or rrule.until > until:
+                    rrule.until = until
+            past_schedule.recurrences.rdates = [_dt for _dt in self.recurrences.rdates if _dt < new_start_dt]
+            # Only the row is inserted, the excluded dates need its id before calculating anything
+            models.Model.save(past_schedule, force_insert=True)
+            ExcludedDates.objects.filter(schedule=self, datetime__lt=new_start_dt).update(schedule=past_schedule)
+            # Expired transmissions moved from the recurrences belong to the past
+            Schedule.objects.filter(from_collection=self, effective_end_dt__lte=before).update(
+                from_collection=past_schedule)
+            # The excluded dates are read from the database on save
+            past_schedule.save()
+
+            self.start_dt = new_start_dt
+            self.recurrences.rdates = [_dt for _dt in self.recurrences.rdates if _dt >= new_start_dt]
+            self.save()
+        return past_schedule
+
     def dates_between(self, after, before):
         """
             Return a sorted list of dates between after and before
@@ -224,34 +763,71 @@ class Schedule(models.Model):
             return
         after_date = transform_dt_to_default_tz(after_date)
         before_date = transform_dt_to_default_tz(self._merge_before(before))
-        start_dt = transform_dt_to_default_tz(self.start_dt)
+        compiled = self.compiled
 
         # We need to send the dates in the default timezone
-        recurrence_dates_between = self.recurrences.between(after_date, before_date, inc=True, dtstart=start_dt)
+        recurrence_dates_between = recurrence_between(
+            compiled.recurrences, after_date, before_date, compiled.start_dt, expander=compiled.expander)
 
         # Special case to include started episodes
         date_before = self.date_before(after_date)
         if date_before and date_before < after_date < date_before + self.runtime:
             yield date_before  # Date was already fixed
 
+        blackout_periods = self.blackout_periods
         for date in recurrence_dates_between:
-            yield fix_recurrence_dst(date)  # Fixing date
+            date = fix_recurrence_dst(date)  # Fixing date
+            if date not in blackout_periods:
+                yield date
 
     def date_before(self, before):
+        date = self._date_before(before)
+        blackout_periods = self.blackout_periods
+        period = blackout_periods.get_period(date) if date else None
+        while period:
+            date = self._date_before(period[0] - ONE_MICROSECOND)
+            period = blackout_periods.get_period(date) if date else None
+        return date
+
+    def _date_before(self, before):
         before_date = transform_dt_to_default_tz(self._merge_before(before))
-        start_dt = transform_dt_to_default_tz(self.start_dt)
-        date = recurrence_before(self.recurrences, before_date, start_dt)
+        compiled = self.compiled
+        date = recurrence_before(compiled.recurrences, before_date, compiled.start_dt, expander=compiled.expander)
         return fix_recurrence_dst(date)
 
     def date_after(self, after):
+        date = self._date_after(after)
+        blackout_periods = self.blackout_periods
+        period = blackout_periods.get_period(date) if date else None
+        while period:
+            date = self._date_after(period[1])
+            period = blackout_periods.get_period(date) if date else None
+        return date
+
+    def _date_after(self, after):
         after_date = self._merge_after(after)
         if not after_date:
             return
         after_date = transform_dt_to_default_tz(after_date)
-        start_dt = transform_dt_to_default_tz(self.start_dt)
-        date = recurrence_after(self.recurrences, after_date, start_dt)
+        compiled = self.compiled
+        date = recurrence_after(compiled.recurrences, after_date, compiled.start_dt, expander=compiled.expander)
         return fix_recurrence_dst(date)
 
+    def dates_after(self, after):
+        """
+            Return a generator of sorted dates after the given date (included)
+        """
+        after_date = self._merge_after(after)
+        if not after_date:
+            return
+        after_date = transform_dt_to_default_tz(after_date)
+        compiled = self.compiled
+        blackout_periods = self.blackout_periods
+        for date in recurrence_xafter(compiled.recurrences, after_date, compiled.start_dt, expander=compiled.expander):
+            date = fix_recurrence_dst(date)
+            if date not in blackout_periods:
+                yield date
+
     def __lt__(self, other):
         if not isinstance(other, Schedule):
             return NotImplemented
@@ -287,8 +863,9 @@ def calculate_effective_schedule_start_dt(schedule):
     """
     Calculation of the first start date to improve performance
     """
-    programme_start_dt = schedule.programme.start_dt
-    programme_end_dt = schedule.programme.end_dt
+    compiled = schedule.compiled
+    programme_start_dt = compiled.programme_start_dt
+    programme_end_dt = compiled.programme_end_dt
 
     # If there are no rrules
     if not schedule.has_recurrences():
@@ -303,7 +880,8 @@ def calculate_effective_schedule_start_dt(schedule):
     if programme_start_dt:
         after_dt = max(schedule.start_dt, programme_start_dt)
     first_start_dt = fix_recurrence_dst(recurrence_after(
-        schedule.recurrences, transform_dt_to_default_tz(after_dt), transform_dt_to_default_tz(schedule.start_dt)))
+        compiled.recurrences, transform_dt_to_default_tz(after_dt), compiled.start_dt,
+        expander=compiled.unanchored_expander))
     if first_start_dt:
         if programme_end_dt and programme_end_dt < first_start_dt:
             return None
@@ -315,8 +893,9 @@ def calculate_effective_schedule_end_dt(schedule):
     """
     Calculation of the last end date to improve performance
     """
-    programme_start_dt = schedule.programme.start_dt
-    programme_end_dt = schedule.programme.end_dt
+    compiled = schedule.compiled
+    programme_start_dt = compiled.programme_start_dt
+    programme_end_dt = compiled.programme_end_dt
 
     # If there are no rrules
     if not schedule.has_recurrences():
@@ -328,7 +907,8 @@ def calculate_effective_schedule_end_dt(schedule):
     # If we have a programme restriction
     if programme_end_dt:
         last_effective_start_date = fix_recurrence_dst(recurrence_before(
-            schedule.recurrences, transform_dt_to_default_tz(programme_end_dt), transform_dt_to_default_tz(schedule.start_dt)))
+            compiled.recurrences, transform_dt_to_default_tz(programme_end_dt), compiled.start_dt,
+            expander=compiled.unanchored_expander))
         if last_effective_start_date:
             if programme_start_dt and programme_start_dt > last_effective_start_date:
                 return None
@@ -346,8 +926,7 @@ def calculate_effective_schedule_end_dt(schedule):
 
     # Get the biggest possible start_date. It could be that the biggest date is excluded
     biggest_date = max(possible_limit_dates)
-    last_effective_start_date = schedule.recurrences.before(
-        transform_dt_to_default_tz(biggest_date), True, dtstart=transform_dt_to_default_tz(schedule.start_dt))
+    last_effective_start_date = compiled.unanchored_expander.before(transform_dt_to_default_tz(biggest_date), True)
     if last_effective_start_date:
         if programme_start_dt and programme_start_dt > last_effective_start_date:
             return None
@@ -355,16 +934,116 @@ def calculate_effective_schedule_end_dt(schedule):
     return None
 
 
+def recompute_effective_dates(schedules):
+    """
+    Update effective_start_dt and effective_end_dt of the given schedules without calling save
+    Returns: A list with the schedules whose dates have changed
+    """
+    changed = []
+    for schedule in schedules:
+        previous_dates = (schedule.effective_start_dt, schedule.effective_end_dt)
+        schedule._update_effective_dates()
+        if previous_dates != (schedule.effective_start_dt, schedule.effective_end_dt):
+            changed.append(schedule)
+    with transaction.atomic():
+        bulk_update(Schedule, changed, ['effective_start_dt', 'effective_end_dt'])
+    if changed:
+        bump_schedules_version()
+    return changed
+
+
+def compact_schedules(schedules, before, min_excluded_dates=1):
+    """
+    Compact the schedules with at least min_excluded_dates excluded dates before the given date
+    Returns: A list with the new schedules holding the past transmissions
+    """
+    schedule_ids = ExcludedDates.objects.filter(
+        schedule__in=schedules, datetime__lt=before
+    ).values('schedule').annotate(
+        excluded_dates=models.Count('id')
+    ).filter(excluded_dates__gte=min_excluded_dates).values_list('schedule', flat=True)
+
+    past_schedules = []
+    for schedule in Schedule.objects.filter(id__in=list(schedule_ids)).select_related('programme', 'calendar'):
+        past_schedule = schedule.compact(before)
+        if past_schedule:
+            past_schedules.append(past_schedule)
+    return past_schedules
+
+
+def get_transmissions_horizon(now=None):
+    """
+    Returns: A tuple with the period of time where occurrences are stored
+    """
+    if not now:
+        now = timezone.now()
+    return (
+        now - datetime.timedelta(days=TRANSMISSIONS_HORIZON_PAST_DAYS),
+        now + datetime.timedelta(days=TRANSMISSIONS_HORIZON_FUTURE_DAYS)
+    )
+
+
+class Occurrence(models.Model):
+    """
+    Concrete transmission of a schedule, stored to avoid expanding recurrences on every request
+    """
+    class Meta:
+        verbose_name = _('occurrence')
+        verbose_name_plural = _('occurrences')
+        index_together = (('calendar', 'start'), ('start', 'end'))
+
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE)
+    programme = models.ForeignKey(Programme, on_delete=models.CASCADE)
+    calendar = models.ForeignKey(Calendar, on_delete=models.CASCADE)
+    start = models.DateTimeField(db_index=True)
+    end = models.DateTimeField()
+
+    def __str__(self):
+        return "%s - %s" % (self.programme_id, self.start)
+
+
+class ProgrammeTransmissionData(object):
+    """
+    Values shared by all the transmissions of a programme, calculated once per programme instance
+    """
+    __slots__ = ('slug', 'minutes', 'runtime', '_url')
+
+    def __init__(self, programme):
+        self.slug = programme.slug
+        self.minutes = programme._runtime
+        self.runtime = datetime.timedelta(minutes=programme._runtime) if programme._runtime else None
+        self._url = None
+
+    @classmethod
+    def get(cls, programme):
+        data = programme.__dict__.get('_transmission_data')
+        # The programme could have been modified after the data was calculated
+        if data is None or data.slug != programme.slug or data.minutes != programme._runtime:
+            data = programme._transmission_data = cls(programme)
+        return data
+
+    @property
+    def url(self):
+        if self._url is None:
+            self._url = reverse('programmes:detail', args=[self.slug])
+        return self._url
+
+
 class Transmission(object):
     """
     Temporal object generated according to recurrence rules or schedule information
     It contains concrete dates
     """
+    __slots__ = ('schedule', 'programme', 'start', 'episode', '_programme_data', '_end', '_episode_url')
+
     def __init__(self, schedule, date, episode=None):
         self.schedule = schedule
         self.programme = schedule.programme
         self.start = date
         self.episode = episode
+        self._programme_data = ProgrammeTransmissionData.get(self.programme)
+        self._end = None
+        self._episode_url = None
 
     @property
     def name(self):
@@ -376,45 +1055,75 @@ class Transmission(object):
 
     @property
     def end(self):
-        return self.start + self.programme.runtime
+        if self._end is None:
+            runtime = self._programme_data.runtime
+            if runtime is None:
+                runtime = self.programme.runtime  # Raises the error of programmes without runtime
+            self._end = self.start + runtime
+        return self._end
 
     @property
     def programme_url(self):
-        return reverse('programmes:detail', args=[self.programme.slug])
+        return self._programme_data.url
 
     @property
     def episode_url(self):
         if not self.episode:
             return None
-        return reverse(
-            'programmes:episode_detail',
-            args=(self.slug, self.episode.season, self.episode.number_in_season)
-        )
+        if self._episode_url is None:
+            self._episode_url = reverse(
+                'programmes:episode_detail',
+                args=(self.slug, self.episode.season, self.episode.number_in_season)
+            )
+        return self._episode_url
 
     @classmethod
     def at(cls, at):
+        # Callers usually take the current date before, the index is used as long as it covers the given date
+        index = TransmissionIndex.get_current(timezone.now())
+        if index.covers(at):
+            return index.at(at)
+        return cls._at(at)
+
+    @classmethod
+    def _at(cls, at):
         schedules = Schedule.objects.filter(
             calendar__is_active=True, effective_start_dt__lte=at
         ).filter(
             Q(effective_end_dt__gt=at) |
             Q(effective_end_dt__isnull=True)
-        ).select_related('programme')
+        ).select_related('programme', 'calendar')
+        schedules = list(schedules)
+
+        materialized_dates = {}
+        materialized_ids = [_schedule.id for _schedule in schedules if _schedule.is_materialized(at, at)]
+        if materialized_ids:
+            materialized_dates = dict(Occurrence.objects.filter(
+                schedule_id__in=materialized_ids, start__lte=at, end__gt=at
+            ).values_list('schedule_id', 'start'))
+
+        transmission_dates = []
         for schedule in schedules:
-            date = schedule.date_before(at)
+            if schedule.id in materialized_ids:
+                date = materialized_dates.get(schedule.id)
+            else:
+                date = schedule.date_before(at)
             if date and date <= at < date + schedule.runtime:
-                # Get episode
-                try:
-                    episode = Episode.objects.get(issue_date=date)
-                except Episode.DoesNotExist:
-                    episode = None
-                # yield transmission
-                yield cls(schedule, date, episode)
+                transmission_dates.append((date, schedule))
+        return cls._with_episodes(transmission_dates)
 
     @classmethod
     def between(cls, after, before, schedules=None):
         """
         Return a tuple of Schedule and Transmissions sorted by date
         """
+        return cls._with_episodes(cls.dates_between(after, before, schedules))
+
+    @classmethod
+    def dates_between(cls, after, before, schedules=None):
+        """
+        Returns: A generator of tuples of date and schedule sorted by date, without querying the episodes
+        """
         if schedules is None:
             schedules = Schedule.objects.filter(calendar__is_active=True)
 
@@ -423,23 +1132,170 @@ class Transmission(object):
         ).filter(
             Q(effective_end_dt__gt=after) |
             Q(effective_end_dt__isnull=True)
-        ).select_related('programme')
+        ).select_related('programme', 'calendar')
 
-        # Querying episodes episodes in that period of time
-        episodes = Episode.objects.filter(
-            issue_date__lt=before, issue_date__gte=after
-        )
-        episodes = {_episode.issue_date: _episode for _episode in episodes}
+        materialized_schedules = {}
+        transmission_dates = []
+        for schedule in schedules:
+            if schedule.is_materialized(after, before):
+                materialized_schedules[schedule.id] = schedule
+            else:
+                transmission_dates.append(
+                    map(partial(_return_tuple, item2=schedule), schedule.dates_between(after, before))
+                )
+        if materialized_schedules:
+            transmission_dates.append(_materialized_dates_between(after, before, materialized_schedules))
+        return heapq.merge(*transmission_dates)
 
-        transmission_dates = [
-            map(partial(_return_tuple, item2=schedule), schedule.dates_between(after, before))
-            for schedule in schedules
-        ]
-        sorted_transmission_dates = heapq.merge(*transmission_dates)
-        for sorted_transmission_date, schedule in sorted_transmission_dates:
-            # Adding episodes matching by date, we don't care about if this info is not correct
-            yield cls(schedule, sorted_transmission_date, episodes.get(sorted_transmission_date))
+    @classmethod
+    def starting_after(cls, after, cursor=None, before=None, schedules=None):
+        """
+        Return a generator of transmissions running at after or starting later sorted by date and schedule id
+        If cursor is given, a tuple of date and schedule id, only the transmissions following it are returned
+        Dates are calculated on demand so the period of time doesn't need to be limited
+        """
+        if cursor is None:
+            transmission_dates = cls._merged_dates_after(after, before, schedules, include_running=True)
+        else:
+            transmission_dates = dropwhile(
+                lambda transmission_date: transmission_date[:2] <= cursor,
+                cls._merged_dates_after(cursor[0], before, schedules)
+            )
+            if after and cursor[0] < after:
+                # The cursor is a transmission running at after, the ones which ended before after are skipped
+                transmission_dates = (
+                    (date, schedule_id, schedule) for date, schedule_id, schedule in transmission_dates
+                    if date + schedule.runtime > after
+                )
+        return cls._with_episodes((date, schedule) for date, _, schedule in transmission_dates)
+
+    @classmethod
+    def next(cls, after, n, schedules=None):
+        """
+        Return a list of the first n transmissions running at after or starting later sorted by date and schedule id
+        Only the dates needed are calculated, no matter how far the last transmission is
+        """
+        transmission_dates = islice(cls._merged_dates_after(after, None, schedules, include_running=True), n)
+        return list(cls._with_episodes((date, schedule) for date, _, schedule in transmission_dates))
+
+    @classmethod
+    def _merged_dates_after(cls, after, before, schedules, include_running=False):
+        """
+        Returns: A lazy generator of sorted tuples of date, schedule id and schedule
+        The schedule id is part of the tuples to get a deterministic order when transmissions start together
+        """
+        if schedules is None:
+            schedules = Schedule.objects.filter(calendar__is_active=True)
+
+        schedules = schedules.filter(
+            Q(effective_end_dt__gte=after) |
+            Q(effective_end_dt__isnull=True)
+        ).select_related('programme', 'calendar')
+        if before:
+            schedules = schedules.filter(effective_start_dt__lte=before)
+
+        transmission_dates = []
+        for schedule in schedules:
+            last_date = schedule._merge_before(before) if before else schedule.effective_end_dt
+            dates = schedule.dates_after(after)
+            if last_date:
+                dates = takewhile(partial(_is_before_or_equal, before=last_date), dates)
+            if include_running:
+                date_before = schedule.date_before(after)
+                if date_before and date_before < after < date_before + schedule.runtime:
+                    dates = chain((date_before,), dates)
+            transmission_dates.append(map(partial(_return_cursor_tuple, schedule=schedule), dates))
+        return heapq.merge(*transmission_dates)
+
+    @classmethod
+    def _with_episodes(cls, transmission_dates):
+        """
+        Returns: A generator of transmissions for the given tuples of date and schedule
+        Episodes are queried in batches, long periods of time are not kept in memory
+        """
+        transmission_dates = iter(transmission_dates)
+        while True:
+            batch = list(islice(transmission_dates, EPISODES_BATCH_SIZE))
+            if not batch:
+                return
+            episodes = Episode.objects.by_programme_and_date(
+                (schedule.programme_id, date) for date, schedule in batch)
+            for date, schedule in batch:
+                yield cls(schedule, date, episodes.get((schedule.programme_id, date)))
+
+
+class TransmissionIndex(object):
+    """
+    In-memory index of the upcoming transmissions of the active calendar to know what is on without querying the db
+    Every process builds its own index, it's discarded when the schedules version changes
+    """
+    _current = None
+
+    def __init__(self, version, after, before):
+        self.version = version
+        self.after = after
+        self.before = before
+
+        self.max_runtime = datetime.timedelta(0)
+        schedules = Schedule.objects.filter(calendar__is_active=True).select_related('programme', 'calendar')
+        for schedule in schedules:
+            self.max_runtime = max(self.max_runtime, schedule.runtime)
+
+        # Transmissions starting before the period could be still running
+        self.transmissions = list(Transmission.between(after - self.max_runtime, before, schedules=schedules))
+        self.transmissions.sort(key=lambda transmission: (transmission.start, transmission.schedule.id))
+        self.starts = [transmission.start for transmission in self.transmissions]
+
+    @classmethod
+    def get_current(cls, now):
+        index = cls._current
+        version = get_schedules_version()
+        if not index or index.version != version or not index.covers(now):
+            index = cls._current = cls(version, now, now + TRANSMISSIONS_INDEX_DURATION)
+        return index
+
+    @classmethod
+    def clear(cls):
+        cls._current = None
+
+    def covers(self, at):
+        return self.after <= at < self.before
+
+    def at(self, at):
+        """
+        Returns: A generator of transmissions running at the given date
+        """
+        first = bisect.bisect_right(self.starts, at - self.max_runtime)
+        last = bisect.bisect_right(self.starts, at)
+        for transmission in self.transmissions[first:last]:
+            if transmission.start <= at < transmission.end:
+                yield transmission
+
+
+def _materialized_dates_between(after, before, schedules):
+    """
+    Returns: A generator of sorted tuples of date and schedule using the stored occurrences
+    """
+    occurrences = Occurrence.objects.filter(
+        schedule_id__in=schedules.keys(), start__lte=before, end__gt=after
+    ).order_by('start', 'schedule__start_dt').values_list('start', 'schedule_id')
+    for start, schedule_id in occurrences.iterator():
+        yield start, schedules[schedule_id]
 
 
 def _return_tuple(item1, item2):
     return item1, item2
+
+
+def _return_cursor_tuple(date, schedule):
+    return date, schedule.id, schedule
+
+
+def _is_before_or_equal(date, before):
+    return date <= before
+
+
+for _model in (Calendar, Schedule, ExcludedDates, BlackoutPeriod, Programme, Episode):
+    post_save.connect(bump_schedules_version, sender=_model, dispatch_uid='bump_schedules_version')
+    # We are not rearranging episodes during deletion
+    post_delete.connect(bump_schedules_version, sender=_model, dispatch_uid='bump_schedules_version')
@@ -0,0 +1,157 @@
+import bisect
+import datetime
+
+from radioco.apps.schedules.models import Transmission
+
+
+def get_slot_windows(after, before, tz, calendar_configuration):
+    """
+    Returns: A generator of tuples with the start and end of the displayed hours of every day between after and before
+    (both dates included) in the given timezone. The end is rounded up to the slot duration, so every window is made of
+    whole slots starting before max_time
+    """
+    slot_duration = calendar_configuration.slot_duration
+    min_time = calendar_configuration.min_time
+    max_time = calendar_configuration.max_time
+    day = datetime.datetime.combine(datetime.date.min, datetime.time())
+    displayed = datetime.datetime.combine(day, max_time) - datetime.datetime.combine(day, min_time)
+    number_of_slots = -(-displayed // slot_duration)  # Rounding up
+
+    date = after
+    while date <= before:
+        start = tz.localize(datetime.datetime.combine(date, min_time))
+        yield start, start + number_of_slots * slot_duration
+        date += datetime.timedelta(days=1)
+
+
+def merge_busy_intervals(transmission_dates):
+    """
+    Returns: A generator of sorted and non overlapping tuples with the start and end of the time on air
+    """
+    current_start = current_end = None
+    for date, schedule in transmission_dates:
+        end = date + schedule.runtime
+        if current_end is not None and date <= current_end:
+            current_end = max(current_end, end)
+            continue
+        if current_end is not None:
+            yield current_start, current_end
+        current_start, current_end = date, end
+    if current_end is not None:
+        yield current_start, current_end
+
+
+def find_free_slots(busy_intervals, windows, slot_duration, min_duration=None):
+    """
+    Complement of the busy intervals inside the windows in one pass, both have to be sorted
+    Free periods are reduced to whole slots of each window, the ones of contiguous windows are joined
+    Returns: A generator of tuples with the start and end of the free periods of at least min_duration
+    """
+    min_duration = min_duration or slot_duration
+    current_start = current_end = None
+    for start, end in _find_free_periods(busy_intervals, windows, slot_duration):
+        if current_end is not None and start == current_end:
+            current_end = end
+            continue
+        if current_end is not None and current_end - current_start >= min_duration:
+            yield current_start, current_end
+        current_start, current_end = start, end
+    if current_end is not None and current_end - current_start >= min_duration:
+        yield current_start, current_end
+
+
+def _find_free_periods(busy_intervals, windows, slot_duration):
+    busy_intervals = iter(busy_intervals)
+    busy = next(busy_intervals, None)
+    for window_start, window_end in windows:
+        cursor = window_start
+        while busy and busy[1] <= cursor:
+            busy = next(busy_intervals, None)
+        while busy and busy[0] < window_end:
+            if busy[0] > cursor:
+                free_period = _round_to_slots(cursor, busy[0], window_start, slot_duration)
+                if free_period[0] < free_period[1]:
+                    yield free_period
+            cursor = max(cursor, busy[1])
+            if busy[1] > window_end:
+                # It continues in the next window
+                break
+            busy = next(busy_intervals, None)
+        if cursor < window_end:
+            free_period = _round_to_slots(cursor, window_end, window_start, slot_duration)
+            if free_period[0] < free_period[1]:
+                yield free_period
+
+
+def _round_to_slots(start, end, window_start, slot_duration):
+    first_slot = -(-(start - window_start) // slot_duration)  # Rounding up
+    last_slot = (end - window_start) // slot_duration
+    return window_start + first_slot * slot_duration, window_start + max(first_slot, last_slot) * slot_duration
+
+
+def get_free_slots(calendar, after, before, tz, calendar_configuration, min_duration=None):
+    """
+    Returns: A generator of the free periods of a calendar between the dates after and before (both included)
+    """
+    windows = list(get_slot_windows(after, before, tz, calendar_configuration))
+    if not windows:
+        return iter(())
+    transmission_dates = Transmission.dates_between(
+        windows[0][0], windows[-1][1], schedules=calendar.schedule_set.all())
+    return find_free_slots(
+        merge_busy_intervals(transmission_dates), windows, calendar_configuration.slot_duration, min_duration)
+
+
+def get_week_start(date, calendar_configuration):
+    """
+    Returns: The first day of the week of the given date, weeks begin on the first day of the calendar configuration
+    """
+    return date - datetime.timedelta(days=(date.weekday() - calendar_configuration.first_day) % 7)
+
+
+def find_slot_programmes(transmission_dates, windows, slot_duration):
+    """
+    Returns: A list with the id of the programme on air in every slot of the windows, None for the empty ones
+    The programme with more time on air in a slot takes it, the first one if they are tied
+    """
+    slot_starts = [
+        window_start + number * slot_duration
+        for window_start, window_end in windows
+        for number in range((window_end - window_start) // slot_duration)
+    ]
+    programmes = [None] * len(slot_starts)
+    time_on_air = [datetime.timedelta(0)] * len(slot_starts)
+    for date, schedule in transmission_dates:
+        end = date + schedule.runtime
+        index = max(bisect.bisect_right(slot_starts, date) - 1, 0)
+        while index < len(slot_starts) and slot_starts[index] < end:
+            slot_start = slot_starts[index]
+            overlap = min(end, slot_start + slot_duration) - max(date, slot_start)
+            if overlap > time_on_air[index]:
+                time_on_air[index] = overlap
+                programmes[index] = schedule.programme_id
+            index += 1
+    return programmes
+
+
+def run_length_encode(values):
+    """
+    Returns: A list of pairs of value and number of consecutive repetitions
+    """
+    encoded = []
+    for value in values:
+        if encoded and encoded[-1][0] == value:
+            encoded[-1][1] += 1
+        else:
+            encoded.append([value, 1])
+    return encoded
+
+
+def get_week_occupancy(calendar, week_start, tz, calendar_configuration):
+    """
+    Returns: A tuple with the windows of the days of the week and the programme ids of every slot
+    """
+    windows = list(get_slot_windows(week_start, week_start + datetime.timedelta(days=6), tz, calendar_configuration))
+    transmission_dates = Transmission.dates_between(
+        windows[0][0], windows[-1][1], schedules=calendar.schedule_set.all())
+    return windows, find_slot_programmes(transmission_dates, windows, calendar_configuration.slot_duration)
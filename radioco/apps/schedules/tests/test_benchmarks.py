@@ -0,0 +1,69 @@
+import datetime
+from itertools import islice
+
+from django.test import TestCase
+from django.test import override_settings
+from pytz import utc
+
+from radioco.apps.programmes.models import Episode
+from radioco.apps.schedules.benchmarks import NUMBER_OF_EPISODES, NUMBER_OF_SEASON_DAYS, DictTransmission, \
+    create_calendar_configuration, create_programmes_with_schedules, create_schedules_with_excluded_dates, \
+    create_transmissions, create_weekly_schedules, load_parsed_schedules, search_free_slots, search_next_dates
+from radioco.apps.schedules.models import Calendar, Schedule, Transmission
+from radioco.apps.schedules.slots import get_free_slots
+from radioco.apps.schedules.utils import next_dates
+
+
+@override_settings(TIME_ZONE='UTC')
+class NextDatesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.programme = create_weekly_schedules()
+        cls.calendar = Calendar.get_active()
+        cls.after = utc.localize(datetime.datetime(2015, 1, 1))
+
+    def test_next_dates(self):
+        self.assertListEqual(
+            list(islice(next_dates(self.calendar, self.programme, self.after), NUMBER_OF_EPISODES)),
+            list(islice(search_next_dates(self.calendar, self.programme, self.after), NUMBER_OF_EPISODES))
+        )
+
+    def test_rearrange_episodes(self):
+        self.programme.rearrange_episodes(self.after, self.calendar)
+        self.assertFalse(Episode.objects.filter(programme=self.programme, issue_date__isnull=True).exists())
+
+    def test_transmissions(self):
+        schedule = Schedule.objects.select_related('programme').filter(programme=self.programme).first()
+        for transmission, dict_transmission in zip(
+                create_transmissions(Transmission, schedule, self.after),
+                create_transmissions(DictTransmission, schedule, self.after)):
+            self.assertEqual(
+                (transmission.start, transmission.end, transmission.programme),
+                (dict_transmission.start, dict_transmission.end, dict_transmission.programme))
+
+
+@override_settings(TIME_ZONE='UTC')
+class LoadSchedulesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_schedules_with_excluded_dates()
+
+    def test_load_schedules(self):
+        self.assertEqual(
+            [schedule.recurrences for schedule in Schedule.objects.all()],
+            [schedule.recurrences for schedule in load_parsed_schedules()])
+
+
+@override_settings(TIME_ZONE='UTC')
+class FreeSlotsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.calendar = create_programmes_with_schedules()
+        cls.calendar_configuration = create_calendar_configuration()
+        cls.after = datetime.date(2015, 1, 1)
+        cls.before = cls.after + datetime.timedelta(days=NUMBER_OF_SEASON_DAYS - 1)
+
+    def test_free_slots(self):
+        self.assertListEqual(
+            list(get_free_slots(self.calendar, self.after, self.before, utc, self.calendar_configuration)),
+            search_free_slots(self.calendar, self.after, self.before, utc, self.calendar_configuration))
@@ -0,0 +1,133 @@
+import datetime
+from itertools import combinations
+
+import mock
+import recurrence
+from django.test import TestCase
+from django.test import override_settings
+from pytz import utc
+
+from radioco.apps.programmes.models import Programme
+from radioco.apps.radioco.test_utils import TestDataMixin
+from radioco.apps.schedules.conflicts import (
+    IntervalIndex, find_conflicts, find_schedule_conflicts, find_transmission_conflicts
+)
+from radioco.apps.schedules.models import Schedule, Transmission
+
+
+AFTER = utc.localize(datetime.datetime(2015, 1, 1))
+BEFORE = utc.localize(datetime.datetime(2015, 2, 1))
+
+
+def mock_now():
+    return utc.localize(datetime.datetime(2015, 1, 1))
+
+
+def _summary(conflicts):
+    return sorted(
+        tuple(sorted((transmission.schedule.id, transmission.start) for transmission in conflict.transmissions))
+        for conflict in conflicts
+    )
+
+
+@override_settings(TIME_ZONE='UTC')
+@mock.patch('django.utils.timezone.now', mock_now)
+class ConflictsTests(TestDataMixin, TestCase):
+    def setUp(self):
+        self.morning_news = Programme.objects.get(slug='morning-news')
+        # Overlaps with every transmission of Classic hits (14:00 - 15:00)
+        self.overlapping_schedule = Schedule.objects.create(
+            programme=self.morning_news,
+            type='B',
+            calendar=self.calendar,
+            recurrences=recurrence.Recurrence(
+                rrules=[recurrence.Rule(recurrence.WEEKLY, until=utc.localize(datetime.datetime(2015, 1, 25)))]),
+            start_dt=utc.localize(datetime.datetime(2015, 1, 2, 14, 30, 0)))
+
+    def _get_transmissions(self):
+        return list(Transmission.between(AFTER, BEFORE))
+
+    def test_find_conflicts(self):
+        conflicts = list(find_conflicts(self._get_transmissions()))
+        self.assertEqual(len(conflicts), 4)
+        self.assertListEqual(
+            [(conflict.start, conflict.end) for conflict in conflicts],
+            [
+                (utc.localize(datetime.datetime(2015, 1, day, 14, 30)),
+                 utc.localize(datetime.datetime(2015, 1, day, 15, 0)))
+                for day in (2, 9, 16, 23)
+            ]
+        )
+        for conflict in conflicts:
+            self.assertListEqual(
+                [transmission.schedule for transmission in conflict.transmissions],
+                [self.schedule, self.overlapping_schedule])
+
+    def test_find_conflicts_same_as_pairwise(self):
+        transmissions = self._get_transmissions()
+        expected = [
+            (transmission, other) for transmission, other in combinations(transmissions, 2)
+            if transmission.start < other.end and other.start < transmission.end
+        ]
+        self.assertListEqual(
+            _summary(find_conflicts(transmissions)),
+            sorted(
+                tuple(sorted((transmission.schedule.id, transmission.start) for transmission in pair))
+                for pair in expected
+            )
+        )
+
+    def test_contiguous_transmissions(self):
+        self.assertListEqual(list(find_conflicts(Transmission.between(AFTER, AFTER + datetime.timedelta(days=1)))), [])
+
+    def test_interval_index(self):
+        index = IntervalIndex(self._get_transmissions())
+        self.assertListEqual(
+            [
+                (transmission.schedule, transmission.start)
+                for transmission in index.overlapping(
+                    utc.localize(datetime.datetime(2015, 1, 9, 14, 59)),
+                    utc.localize(datetime.datetime(2015, 1, 9, 15, 30)))
+            ],
+            [
+                (self.schedule, utc.localize(datetime.datetime(2015, 1, 9, 14, 0))),
+                (self.overlapping_schedule, utc.localize(datetime.datetime(2015, 1, 9, 14, 30))),
+            ]
+        )
+        self.assertListEqual(
+            index.overlapping(
+                utc.localize(datetime.datetime(2015, 1, 9, 15, 30)), utc.localize(datetime.datetime(2015, 1, 9, 16))),
+            []
+        )
+
+    def test_interval_index_empty(self):
+        self.assertListEqual(IntervalIndex([]).overlapping(AFTER, BEFORE), [])
+
+    def test_find_schedule_conflicts(self):
+        schedule = Schedule(
+            programme=self.morning_news, type='L', calendar=self.calendar,
+            start_dt=utc.localize(datetime.datetime(2015, 1, 3, 11, 30, 0)))
+        schedule._update_effective_dates()
+        conflicts = find_schedule_conflicts(schedule)
+        self.assertListEqual(
+            [[transmission.programme.slug for transmission in conflict.transmissions] for conflict in conflicts],
+            [['the-best-wine', 'morning-news'], ['local-gossips', 'morning-news']]
+        )
+
+    def test_find_schedule_conflicts_existing_schedule(self):
+        self.assertEqual(len(find_schedule_conflicts(self.overlapping_schedule)), 4)
+        self.assertEqual(len(find_schedule_conflicts(self.overlapping_schedule, after=BEFORE)), 0)
+
+    def test_find_transmission_conflicts(self):
+        start = utc.localize(datetime.datetime(2015, 1, 9, 14, 0))
+        self.assertListEqual(
+            [conflict.transmissions[0].schedule for conflict in find_transmission_conflicts(self.schedule, start)],
+            [self.schedule, self.overlapping_schedule]
+        )
+        self.assertListEqual(
+            [
+                conflict.transmissions[0].schedule
+                for conflict in find_transmission_conflicts(self.schedule, start, moved_from=start)
+            ],
+            [self.overlapping_schedule]
+        )
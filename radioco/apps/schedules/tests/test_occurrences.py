@@ -0,0 +1,111 @@
+import datetime
+
+import mock
+import recurrence
+from django.core.management import call_command
+from django.test import TestCase
+from django.test import override_settings
+from pytz import utc
+
+from radioco.apps.radioco.test_utils import TestDataMixin
+from radioco.apps.schedules.models import Schedule, Transmission, Occurrence, get_transmissions_horizon
+
+
+WINDOW_AFTER = utc.localize(datetime.datetime(2015, 1, 1))
+WINDOW_BEFORE = utc.localize(datetime.datetime(2015, 3, 1))
+
+
+def mock_now():
+    return utc.localize(datetime.datetime(2015, 1, 15, 14, 30, 0))
+
+
+def _summary(transmissions):
+    return [(t.schedule.id, t.slug, t.start) for t in transmissions]
+
+
+@override_settings(TIME_ZONE='UTC')
+class OccurrenceTests(TestDataMixin, TestCase):
+    def setUp(self):
+        self.weekly_schedule = Schedule.objects.create(
+            programme=self.programme,
+            type='L',
+            calendar=self.calendar,
+            recurrences=recurrence.Recurrence(
+                rrules=[recurrence.Rule(recurrence.WEEKLY, until=utc.localize(datetime.datetime(2015, 2, 10)))]),
+            start_dt=utc.localize(datetime.datetime(2015, 1, 2, 23, 30, 0)))
+        self.weekly_schedule.exclude_date(utc.localize(datetime.datetime(2015, 1, 16, 23, 30, 0)))
+        self.weekly_schedule.save()
+
+    def _materialize_all(self, after=WINDOW_AFTER, before=WINDOW_BEFORE):
+        for schedule in Schedule.objects.all():
+            schedule.materialize_occurrences(after, before)
+
+    @mock.patch('django.utils.timezone.now', mock_now)
+    def test_save_stores_occurrences(self):
+        self.weekly_schedule.save()
+        self.weekly_schedule.refresh_from_db()
+        self.assertEqual(
+            (self.weekly_schedule.materialized_after, self.weekly_schedule.materialized_before),
+            get_transmissions_horizon())
+        self.assertEqual(Occurrence.objects.filter(schedule=self.weekly_schedule).count(), 5)
+
+    def test_stored_occurrences(self):
+        self.weekly_schedule.materialize_occurrences(WINDOW_AFTER, WINDOW_BEFORE)
+        self.assertListEqual(
+            [(o.start, o.end) for o in Occurrence.objects.filter(schedule=self.weekly_schedule).order_by('start')],
+            [
+                (utc.localize(datetime.datetime(2015, 1, 2, 23, 30)), utc.localize(datetime.datetime(2015, 1, 3, 0, 30))),
+                (utc.localize(datetime.datetime(2015, 1, 9, 23, 30)), utc.localize(datetime.datetime(2015, 1, 10, 0, 30))),
+                (utc.localize(datetime.datetime(2015, 1, 23, 23, 30)), utc.localize(datetime.datetime(2015, 1, 24, 0, 30))),
+                (utc.localize(datetime.datetime(2015, 1, 30, 23, 30)), utc.localize(datetime.datetime(2015, 1, 31, 0, 30))),
+                (utc.localize(datetime.datetime(2015, 2, 6, 23, 30)), utc.localize(datetime.datetime(2015, 2, 7, 0, 30))),
+            ]
+        )
+
+    def test_between_matches_recurrences(self):
+        after = utc.localize(datetime.datetime(2015, 1, 10, 0, 0, 0))
+        before = utc.localize(datetime.datetime(2015, 1, 24, 23, 59, 59))
+        expected = _summary(Transmission.between(after, before))
+
+        self._materialize_all()
+        with mock.patch.object(Schedule, 'dates_between', side_effect=AssertionError('Expanding recurrences')):
+            self.assertListEqual(_summary(Transmission.between(after, before)), expected)
+
+    def test_between_outside_window_uses_recurrences(self):
+        after = utc.localize(datetime.datetime(2015, 2, 20, 0, 0, 0))
+        before = utc.localize(datetime.datetime(2015, 3, 10, 23, 59, 59))
+        expected = _summary(Transmission.between(after, before))
+
+        self._materialize_all()
+        self.assertListEqual(_summary(Transmission.between(after, before)), expected)
+
+    def test_at_matches_recurrences(self):
+        for at in [
+            utc.localize(datetime.datetime(2015, 1, 10, 0, 0, 0)),
+            utc.localize(datetime.datetime(2015, 1, 16, 23, 45, 0)),
+            utc.localize(datetime.datetime(2015, 1, 20, 14, 30, 0)),
+        ]:
+            expected = _summary(Transmission.at(at))
+            self._materialize_all()
+            with mock.patch.object(Schedule, 'date_before', side_effect=AssertionError('Expanding recurrences')):
+                self.assertListEqual(_summary(Transmission.at(at)), expected)
+
+    def test_extend_occurrences(self):
+        self.schedule.materialize_occurrences(WINDOW_AFTER, WINDOW_BEFORE)
+        new_after = WINDOW_AFTER + datetime.timedelta(days=10, hours=14, minutes=30)
+        new_before = WINDOW_BEFORE + datetime.timedelta(days=10)
+        self.schedule.extend_occurrences(new_after, new_before)
+        extended = list(Occurrence.objects.filter(schedule=self.schedule).order_by('start').values_list('start'))
+
+        self.schedule.materialize_occurrences(new_after, new_before)
+        rebuilt = list(Occurrence.objects.filter(schedule=self.schedule).order_by('start').values_list('start'))
+        self.assertListEqual(extended, rebuilt)
+        self.assertEqual(self.schedule.materialized_after, new_after)
+        self.assertEqual(self.schedule.materialized_before, new_before)
+
+    @mock.patch('django.utils.timezone.now', mock_now)
+    def test_extend_transmissions_horizon_command(self):
+        call_command('extend_transmissions_horizon', stdout=mock.MagicMock())
+        after, before = get_transmissions_horizon()
+        self.assertFalse(Schedule.objects.exclude(materialized_after=after, materialized_before=before).exists())
+        self.assertTrue(Occurrence.objects.filter(schedule=self.weekly_schedule).exists())
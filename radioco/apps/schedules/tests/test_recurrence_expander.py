@@ -0,0 +1,280 @@
+import datetime
+import itertools
+
+import mock
+import pytz
+import recurrence
+from django.test import TestCase
+from django.test import override_settings
+
+from radioco.apps.programmes.models import Programme
+from radioco.apps.radioco.recurrence_utils import SimpleRecurrence, AnchoredRecurrence, get_recurrence_expander, \
+    calculate_recurrence_anchor
+from radioco.apps.radioco.test_utils import TestDataMixin, SPAIN_TZ
+from radioco.apps.radioco.tz_utils import recurrence_after, recurrence_before, fix_recurrence_dst
+from radioco.apps.schedules.models import Schedule, get_transmissions_horizon
+
+
+def generic_expander(_recurrence, start_dt, anchor_dt=None):
+    return _recurrence.to_dateutil_rruleset(start_dt)
+
+
+def use_generic_expander():
+    return mock.patch.multiple(
+        'radioco.apps.schedules.compiled', get_recurrence_expander=generic_expander
+    ), mock.patch.dict(
+        'radioco.apps.schedules.compiled._compiled_schedules', clear=True
+    ), mock.patch.multiple(
+        'radioco.apps.radioco.tz_utils', get_recurrence_expander=generic_expander
+    )
+
+
+def _simple_recurrences(until):
+    return [
+        recurrence.Recurrence(),
+        recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.DAILY)]),
+        recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.DAILY, interval=3)]),
+        recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.DAILY, until=until)]),
+        recurrence.Recurrence(rrules=[recurrence.Rule(
+            recurrence.DAILY, interval=2, byday=[recurrence.MO, recurrence.WE, recurrence.FR])]),
+        recurrence.Recurrence(rrules=[recurrence.Rule(
+            recurrence.DAILY, interval=4, byday=[recurrence.MO, recurrence.SA])]),
+        recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.WEEKLY)]),
+        recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.WEEKLY, interval=2, until=until)]),
+        recurrence.Recurrence(rrules=[recurrence.Rule(
+            recurrence.WEEKLY, byday=[recurrence.MO, recurrence.TU, recurrence.WE, recurrence.TH, recurrence.FR])]),
+        recurrence.Recurrence(rrules=[recurrence.Rule(
+            recurrence.WEEKLY, interval=3, wkst=recurrence.SU, byday=[recurrence.SA, recurrence.SU])]),
+        recurrence.Recurrence(rrules=[
+            recurrence.Rule(recurrence.WEEKLY, byday=[recurrence.MO]),
+            recurrence.Rule(recurrence.DAILY, interval=5, until=until)]),
+    ]
+
+
+class SimpleRecurrenceTests(TestCase):
+    """
+    Differential tests between SimpleRecurrence and dateutil
+    """
+    def assertSameResults(self, _recurrence, start_dt, dts):
+        simple = SimpleRecurrence(_recurrence, start_dt)
+        generic = _recurrence.to_dateutil_rruleset(start_dt)
+        for dt, inc in itertools.product(dts, (True, False)):
+            self.assertEqual(simple.after(dt, inc), generic.after(dt, inc), (_recurrence, start_dt, dt, inc))
+            self.assertEqual(simple.before(dt, inc), generic.before(dt, inc), (_recurrence, start_dt, dt, inc))
+        for after, before in itertools.combinations(dts, 2):
+            for inc in (True, False):
+                simple_dates = simple.between(after, before, inc)
+                generic_dates = generic.between(after, before, inc)
+                self.assertListEqual(simple_dates, generic_dates, (_recurrence, start_dt, after, before, inc))
+                # Same offsets than dateutil
+                self.assertListEqual(
+                    [_dt.utcoffset() for _dt in simple_dates], [_dt.utcoffset() for _dt in generic_dates])
+
+    def _check_recurrences(self, start_dts, dts, until):
+        for start_dt in start_dts:
+            for _recurrence in _simple_recurrences(until):
+                self.assertTrue(SimpleRecurrence.is_supported(_recurrence))
+                self.assertSameResults(_recurrence, start_dt, dts)
+
+                excluded = _recurrence.to_dateutil_rruleset(start_dt).between(dts[0], dts[-1], True)[1::3]
+                _recurrence.exdates = excluded
+                self.assertSameResults(_recurrence, start_dt, dts)
+
+    def test_naive_dates(self):
+        start_dt = datetime.datetime(2014, 1, 20, 14, 0, 0)
+        dts = [start_dt + datetime.timedelta(days=days, hours=hours) for days in (-3, 0, 1, 9, 40) for hours in (-1, 0)]
+        self._check_recurrences([start_dt], dts, until=datetime.datetime(2014, 2, 10, 14, 0, 0))
+
+    def test_utc(self):
+        start_dts = [
+            pytz.utc.localize(datetime.datetime(2014, 1, 20, 14, 0, 0)),
+            pytz.utc.localize(datetime.datetime(2014, 1, 23, 23, 30, 0)),
+        ]
+        dts = [
+            pytz.utc.localize(datetime.datetime(2014, 1, 1) + datetime.timedelta(days=days, hours=hours))
+            for days in (0, 19, 22, 23, 30, 61) for hours in (0, 14, 23.5)
+        ]
+        self._check_recurrences(start_dts, dts, until=pytz.utc.localize(datetime.datetime(2014, 2, 12)))
+
+    def test_dst_transitions(self):
+        start_dts = [
+            SPAIN_TZ.localize(datetime.datetime(2017, 3, 20, 10, 0, 0)),  # CET
+            SPAIN_TZ.localize(datetime.datetime(2017, 3, 24, 2, 30, 0)),  # Hour that doesn't exist on 26th March
+            SPAIN_TZ.localize(datetime.datetime(2017, 10, 25, 14, 0, 0)),  # CEST
+            SPAIN_TZ.localize(datetime.datetime(2017, 10, 27, 2, 30, 0)),  # Ambiguous hour on 29th March
+        ]
+        dts = [
+            SPAIN_TZ.normalize(SPAIN_TZ.localize(datetime.datetime(2017, 3, 18)) + datetime.timedelta(days=days))
+            for days in range(0, 240, 16)
+        ] + [
+            SPAIN_TZ.localize(datetime.datetime(2017, 3, 26, 10, 0, 0)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 3, 26, 9, 30, 0)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 10, 29, 14, 0, 0)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 10, 29, 14, 30, 0)),
+        ]
+        dts.sort()
+        self._check_recurrences(start_dts, dts, until=SPAIN_TZ.localize(datetime.datetime(2017, 4, 2, 23, 59, 59)))
+
+    def test_unsupported_rules(self):
+        start_dt = pytz.utc.localize(datetime.datetime(2014, 1, 20, 14, 0, 0))
+        for _recurrence in [
+            recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.MONTHLY)]),
+            recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.DAILY, count=3)]),
+            recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.WEEKLY, bymonth=[1])]),
+            recurrence.Recurrence(
+                rrules=[recurrence.Rule(recurrence.DAILY, interval=2)],
+                exrules=[recurrence.Rule(recurrence.WEEKLY, byday=[recurrence.MO, recurrence.TU])]),
+            recurrence.Recurrence(rdates=[start_dt + datetime.timedelta(days=3)]),
+        ]:
+            self.assertFalse(SimpleRecurrence.is_supported(_recurrence))
+            self.assertNotIsInstance(get_recurrence_expander(_recurrence, start_dt), SimpleRecurrence)
+
+    def test_rule_without_dates(self):
+        start_dt = pytz.utc.localize(datetime.datetime(2014, 1, 21, 14, 0, 0))  # Tuesday
+        _recurrence = recurrence.Recurrence(
+            rrules=[recurrence.Rule(recurrence.DAILY, interval=7, byday=[recurrence.MO])], include_dtstart=False)
+        simple = SimpleRecurrence(_recurrence, start_dt)
+        self.assertIsNone(simple.after(start_dt))
+        self.assertIsNone(simple.before(pytz.utc.localize(datetime.datetime(9999, 1, 1))))
+        self.assertListEqual(simple.between(start_dt, pytz.utc.localize(datetime.datetime(9999, 1, 1))), [])
+
+    def test_impossible_recurrence(self):
+        """
+        Same cases than test_recurrences.RecurrenceTests
+        """
+        start_dt = datetime.datetime(2014, 1, 20, 14, 0, 0)
+        until_dt = datetime.datetime(2014, 1, 19, 14, 0, 0)
+        daily_recurrence = recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.DAILY, until=until_dt)])
+        self.assertEqual(SimpleRecurrence(daily_recurrence, start_dt).after(start_dt, True), start_dt)
+        self.assertIsNone(recurrence_after(daily_recurrence, start_dt, start_dt))
+        self.assertIsNone(recurrence_before(daily_recurrence, start_dt + datetime.timedelta(seconds=1), start_dt))
+
+
+class AnchoredRecurrenceTests(TestCase):
+    def setUp(self):
+        self.start_dt = SPAIN_TZ.localize(datetime.datetime(2009, 1, 5, 10, 0, 0))
+        self.recurrence = recurrence.Recurrence(
+            rrules=[recurrence.Rule(recurrence.MONTHLY, byday=[recurrence.MO(1)])])
+        self.anchor_dt = calculate_recurrence_anchor(
+            self.recurrence, self.start_dt, SPAIN_TZ.localize(datetime.datetime(2017, 6, 1)))
+
+    def assertSameResults(self, _recurrence, anchor_dt, dts):
+        anchored = get_recurrence_expander(_recurrence, self.start_dt, anchor_dt)
+        self.assertIsInstance(anchored, AnchoredRecurrence)
+        generic = _recurrence.to_dateutil_rruleset(self.start_dt)
+        for dt, inc in itertools.product(dts, (True, False)):
+            self.assertEqual(anchored.after(dt, inc), generic.after(dt, inc))
+            self.assertEqual(anchored.before(dt, inc), generic.before(dt, inc))
+        for after, before in itertools.combinations(dts, 2):
+            self.assertListEqual(anchored.between(after, before, True), generic.between(after, before, True))
+
+    def test_anchor(self):
+        self.assertEqual(fix_recurrence_dst(self.anchor_dt), SPAIN_TZ.localize(datetime.datetime(2017, 5, 1, 10, 0, 0)))
+        self.assertIsNone(calculate_recurrence_anchor(
+            recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.DAILY)]),
+            self.start_dt, SPAIN_TZ.localize(datetime.datetime(2017, 6, 1))))
+        self.assertIsNone(calculate_recurrence_anchor(
+            recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.MONTHLY, count=200)]),
+            self.start_dt, SPAIN_TZ.localize(datetime.datetime(2017, 6, 1))))
+
+    def test_same_results(self):
+        dts = [
+            SPAIN_TZ.localize(datetime.datetime(2008, 12, 1)),
+            SPAIN_TZ.localize(datetime.datetime(2016, 12, 1)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 5, 1, 10, 0, 0)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 5, 1, 10, 30, 0)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 11, 6, 10, 0, 0)),
+            SPAIN_TZ.localize(datetime.datetime(2018, 3, 1)),
+        ]
+        self.assertSameResults(self.recurrence, self.anchor_dt, dts)
+
+        # Excluding the anchor
+        self.recurrence.exdates = [self.anchor_dt, SPAIN_TZ.localize(datetime.datetime(2017, 6, 5, 10, 0, 0))]
+        self.assertSameResults(self.recurrence, self.anchor_dt, dts)
+
+    def test_anchor_in_other_offset(self):
+        # Anchor stored in CEST while the start is in CET
+        anchor_dt = pytz.utc.localize(datetime.datetime(2017, 5, 1, 8, 0, 0))
+        dts = [
+            SPAIN_TZ.localize(datetime.datetime(2017, 4, 3, 10, 30, 0)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 5, 1, 9, 30, 0)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 5, 1, 10, 0, 0)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 12, 4, 9, 0, 0)),
+        ]
+        self.assertSameResults(self.recurrence, anchor_dt, dts)
+
+
+class ScheduleExpanderTests(TestDataMixin, TestCase):
+    """
+    Schedules have to return the same dates using both expanders
+    """
+    def _assertSameDates(self, schedule, dts):
+        results = []
+        for patches in [(), use_generic_expander()]:
+            for patch in patches:
+                patch.start()
+            try:
+                results.append([
+                    (list(schedule.dates_between(after, before)), schedule.date_before(after), schedule.date_after(after))
+                    for after, before in itertools.combinations(dts, 2)
+                ])
+            finally:
+                for patch in patches:
+                    patch.stop()
+        self.assertListEqual(results[0], results[1])
+
+    @override_settings(TIME_ZONE='Europe/Madrid')
+    def test_timezone_schedules(self):
+        programme = Programme.objects.create(
+            name='Timezone', current_season=1, _runtime=60,
+            start_date=datetime.date(2017, 3, 1), end_date=datetime.date(2017, 10, 31))
+        cest_schedule = Schedule.objects.create(
+            programme=programme, type='L', calendar=self.calendar,
+            recurrences=recurrence.Recurrence(
+                rrules=[recurrence.Rule(recurrence.DAILY, until=SPAIN_TZ.localize(datetime.datetime(2017, 3, 27)))]),
+            start_dt=SPAIN_TZ.localize(datetime.datetime(2017, 3, 25, 10, 00, 00)))
+        cet_schedule = Schedule.objects.create(
+            programme=programme, type='L', calendar=self.calendar,
+            recurrences=recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.DAILY)]),
+            start_dt=SPAIN_TZ.localize(datetime.datetime(2017, 10, 28, 14, 00, 00)))
+        cet_schedule.exclude_date(SPAIN_TZ.localize(datetime.datetime(2017, 10, 29, 14, 00, 00)))
+        cet_schedule.save()
+
+        dts = [
+            SPAIN_TZ.localize(datetime.datetime(2017, 2, 1)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 3, 26, 10, 30)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 10, 28, 14, 0, 0)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 10, 30, 14, 0, 0)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 11, 30)),
+        ]
+        for schedule in (cest_schedule, cet_schedule):
+            self._assertSameDates(schedule, dts)
+
+    @override_settings(TIME_ZONE='Europe/Madrid')
+    @mock.patch('django.utils.timezone.now', lambda: pytz.utc.localize(datetime.datetime(2017, 9, 1)))
+    def test_anchored_schedule(self):
+        schedule = Schedule.objects.create(
+            programme=self.programme, type='L', calendar=self.calendar,
+            recurrences=recurrence.Recurrence(
+                rrules=[recurrence.Rule(recurrence.MONTHLY, byday=[recurrence.SA(-1)])]),
+            start_dt=SPAIN_TZ.localize(datetime.datetime(2009, 1, 31, 20, 00, 00)))
+        self.assertLess(schedule.recurrence_anchor_dt, get_transmissions_horizon()[0])
+        self.assertEqual(schedule.recurrence_anchor_dt, SPAIN_TZ.localize(datetime.datetime(2017, 5, 27, 20, 0, 0)))
+
+        dts = [
+            SPAIN_TZ.localize(datetime.datetime(2016, 2, 1)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 6, 1)),
+            SPAIN_TZ.localize(datetime.datetime(2017, 10, 28, 20, 30)),
+            SPAIN_TZ.localize(datetime.datetime(2018, 1, 1)),
+        ]
+        self._assertSameDates(schedule, dts)
+
+    @override_settings(TIME_ZONE='UTC')
+    def test_example_schedules(self):
+        dts = [
+            pytz.utc.localize(datetime.datetime(2014, 12, 1)),
+            pytz.utc.localize(datetime.datetime(2015, 1, 6, 14, 30)),
+            pytz.utc.localize(datetime.datetime(2015, 2, 1)),
+        ]
+        for schedule in Schedule.objects.all():
+            self._assertSameDates(schedule, dts)
@@ -15,24 +15,31 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import datetime
 from functools import partial
+from io import StringIO
+from itertools import islice
 
 import mock
 import pytz
 import recurrence
 from django.contrib.admin import AdminSite
 from django.core.exceptions import ValidationError, FieldError
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
+from django.db import DatabaseError, connection, transaction
 from django.forms import modelform_factory
 from django.test import TestCase
+from django.test import TransactionTestCase
 from django.test import override_settings
 from django.utils import timezone
 from pytz import utc
 
 from radioco.apps.programmes.models import Programme, Episode
-from radioco.apps.radioco.test_utils import TestDataMixin
+from radioco.apps.radioco.test_utils import TestDataMixin, run_on_commit_callbacks
 from radioco.apps.schedules.admin import CalendarAdmin
-from radioco.apps.schedules.models import Calendar, CalendarManager
-from radioco.apps.schedules.models import Schedule, Transmission
+from radioco.apps.schedules.models import Calendar, CalendarActivation, CalendarManager, BlackoutPeriod, \
+    ExcludedDates, Occurrence
+from radioco.apps.schedules.models import Schedule, Transmission, TransmissionIndex, suspend_rearrange_episodes, \
+    recompute_effective_dates, compact_schedules
 from radioco.apps.schedules.utils import next_dates
 
 
@@ -94,6 +101,39 @@ class ScheduleModelTests(TestDataMixin, TestCase):
         self.assertEqual(
             self.schedule.start_dt, utc.localize(datetime.datetime(2014, 1, 6, 14, 0, 0)))
 
+    def test_recurrences_parsed_on_access(self):
+        recurrences_field = Schedule._meta.get_field('recurrences')
+        schedule = Schedule.objects.get(pk=self.schedule.pk)
+        self.assertIsNotNone(recurrences_field.get_unparsed_value(schedule))
+        self.assertEqual(schedule.recurrences, self.schedule.recurrences)
+        self.assertIsNone(recurrences_field.get_unparsed_value(schedule))
+
+    def test_recurrences_deferred(self):
+        schedule = Schedule.objects.defer('recurrences').get(pk=self.schedule.pk)
+        self.assertSetEqual(schedule.get_deferred_fields(), {'recurrences'})
+        with self.assertNumQueries(1):
+            self.assertEqual(schedule.recurrences, self.schedule.recurrences)
+        schedule = Schedule.objects.only('id', 'programme').get(pk=self.schedule.pk)
+        self.assertEqual(schedule.recurrences, self.schedule.recurrences)
+
+    def test_compiled(self):
+        compiled = Schedule.objects.select_related('programme').get(pk=self.schedule.pk).compiled
+        self.assertIs(Schedule.objects.select_related('programme').get(pk=self.schedule.pk).compiled, compiled)
+        self.assertEqual(compiled.start_dt, self.schedule.start_dt)
+        self.assertEqual(compiled.recurrences, self.schedule.recurrences)
+
+        compiled = self.schedule.compiled
+        self.assertIs(self.schedule.compiled, compiled)
+
+        self.schedule.exclude_date(utc.localize(datetime.datetime(2014, 1, 13, 14, 0, 0)))
+        self.assertIsNot(self.schedule.compiled, compiled)
+        self.assertEqual(
+            self.schedule.date_after(utc.localize(datetime.datetime(2014, 1, 7))),
+            utc.localize(datetime.datetime(2014, 1, 20, 14, 0, 0)))
+
+        self.programme.end_date = datetime.date(2014, 1, 20)
+        self.assertEqual(self.schedule.compiled.programme_end_dt, self.programme.end_dt)
+
     def test_start_lt_calendar(self):
         self.programme.start_date = datetime.date(2014, 1, 14)
         self.programme.save()
@@ -110,6 +150,22 @@ class ScheduleModelTests(TestDataMixin, TestCase):
             utc.localize(datetime.datetime(2014, 1, 13, 15, 0, 0))  # last date including runtime duration
         )
 
+    def test_recompute_effective_dates(self):
+        Schedule.objects.filter(pk=self.schedule.pk).update(effective_start_dt=None, effective_end_dt=None)
+        with mock.patch.object(Schedule, 'save', side_effect=AssertionError('Saving schedule')):
+            changed = recompute_effective_dates(Schedule.objects.filter(programme=self.programme))
+        self.assertListEqual(changed, [self.schedule])
+        self.assertListEqual(recompute_effective_dates(Schedule.objects.filter(programme=self.programme)), [])
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.effective_start_dt, utc.localize(datetime.datetime(2014, 1, 6, 14, 0, 0)))
+        self.assertEqual(self.schedule.effective_end_dt, utc.localize(datetime.datetime(2014, 1, 27, 15, 0, 0)))
+
+    def test_recompute_effective_dates_command(self):
+        Schedule.objects.filter(pk=self.schedule.pk).update(effective_start_dt=None, effective_end_dt=None)
+        call_command('recompute_effective_dates', stdout=mock.MagicMock())
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.effective_start_dt, utc.localize(datetime.datetime(2014, 1, 6, 14, 0, 0)))
+
     def test_recurrence_rules(self):
         self.assertListEqual(
             self.schedule.recurrences.rrules, self.recurrences.rrules)
@@ -180,7 +236,8 @@ class ScheduleModelTests(TestDataMixin, TestCase):
         self.assertEqual(self.episode.issue_date, utc.localize(datetime.datetime(2014, 1, 6, 14, 0, 0)))
         self.episode.issue_date = None
         self.episode.save()
-        self.schedule.save()
+        with run_on_commit_callbacks():
+            self.schedule.save()
         self.episode.refresh_from_db()
         self.assertEqual(self.episode.issue_date, utc.localize(datetime.datetime(2014, 1, 6, 14, 0, 0)))
 
@@ -266,12 +323,294 @@ class CalendarValidationTests(TestCase):
 #            board.full_clean()
 
 
+@override_settings(TIME_ZONE='UTC')
+@mock.patch('django.utils.timezone.now', partial(mock_now, dt=utc.localize(datetime.datetime(2015, 2, 1, 12))))
+class ScheduleCompactionTests(TestDataMixin, TestCase):
+    def setUp(self):
+        # The schedule is modified by the tests
+        self.schedule = Schedule.objects.get(pk=self.schedule.pk)
+        with run_on_commit_callbacks():
+            for day in [(1, 10), (1, 12), (1, 20), (2, 10)]:
+                self.schedule.exclude_date(utc.localize(datetime.datetime(2015, day[0], day[1], 14, 0, 0)))
+            self.schedule.save()
+            self.moved_schedule = Schedule.objects.create(
+                programme=self.programme, type='L', calendar=self.calendar, from_collection=self.schedule,
+                start_dt=utc.localize(datetime.datetime(2015, 1, 20, 16, 0, 0)))
+
+    def _get_transmissions(self):
+        return [
+            (transmission.schedule.programme_id, transmission.start)
+            for transmission in Transmission.between(
+                utc.localize(datetime.datetime(2014, 12, 1)), utc.localize(datetime.datetime(2015, 3, 1)))
+        ]
+
+    def test_compact(self):
+        transmissions = self._get_transmissions()
+        past_schedule = self.schedule.compact(timezone.now())
+
+        self.assertListEqual(self._get_transmissions(), transmissions)
+        self.assertEqual(self.schedule.start_dt, utc.localize(datetime.datetime(2015, 2, 1, 14, 0, 0)))
+        self.assertListEqual(
+            self.schedule.recurrences.exdates, [utc.localize(datetime.datetime(2015, 2, 10, 14, 0, 0))])
+        self.assertEqual(len(past_schedule.recurrences.exdates), 3)
+        self.assertEqual(past_schedule.effective_end_dt, utc.localize(datetime.datetime(2015, 1, 31, 15, 0, 0)))
+        self.assertTrue(Occurrence.objects.filter(
+            schedule=past_schedule, start=utc.localize(datetime.datetime(2015, 1, 11, 14, 0, 0))).exists())
+        self.assertFalse(Occurrence.objects.filter(
+            schedule=past_schedule, start=utc.localize(datetime.datetime(2015, 1, 10, 14, 0, 0))).exists())
+        self.moved_schedule.refresh_from_db()
+        self.assertEqual(self.moved_schedule.from_collection, past_schedule)
+
+    def test_compact_rearrange_episodes(self):
+        with mock.patch.object(Programme, 'rearrange_episodes') as rearrange_episodes:
+            with run_on_commit_callbacks():
+                self.schedule.compact(timezone.now())
+        self.assertFalse(rearrange_episodes.called)
+
+    def test_compact_nothing_to_do(self):
+        self.assertIsNone(self.schedule.compact(utc.localize(datetime.datetime(2015, 1, 5))))
+
+    def test_compact_schedules(self):
+        transmissions = self._get_transmissions()
+        self.assertListEqual(compact_schedules(Schedule.objects.all(), timezone.now(), min_excluded_dates=4), [])
+        self.assertEqual(len(compact_schedules(Schedule.objects.all(), timezone.now(), min_excluded_dates=3)), 1)
+        self.assertListEqual(self._get_transmissions(), transmissions)
+
+    def test_compact_schedules_command(self):
+        call_command('compact_schedules', min_excluded_dates=1, stdout=mock.Mock())
+        self.assertEqual(Schedule.objects.get(pk=self.schedule.pk).start_dt.date(), datetime.date(2015, 2, 1))
+
+
+@override_settings(TIME_ZONE='UTC')
+@mock.patch('django.utils.timezone.now', partial(mock_now, dt=utc.localize(datetime.datetime(2015, 2, 1, 12))))
+class BlackoutPeriodTests(TestDataMixin, TestCase):
+    def setUp(self):
+        Schedule.objects.get(pk=self.schedule.pk).materialize_occurrences(
+            utc.localize(datetime.datetime(2015, 1, 1)), utc.localize(datetime.datetime(2015, 3, 1)))
+        with run_on_commit_callbacks():
+            self.blackout_period = BlackoutPeriod.objects.create(
+                calendar=self.calendar, name='Holidays',
+                start=utc.localize(datetime.datetime(2015, 2, 5)), end=utc.localize(datetime.datetime(2015, 2, 7)))
+        self.schedule = Schedule.objects.select_related('calendar').get(pk=self.schedule.pk)
+
+    def _get_dates(self, after, before):
+        return [
+            transmission.start
+            for transmission in Transmission.between(after, before)
+            if transmission.schedule.id == self.schedule.id
+        ]
+
+    def test_calendar_flag(self):
+        self.assertTrue(Calendar.objects.get(pk=self.calendar.pk).has_blackout_periods)
+        self.blackout_period.delete()
+        self.assertFalse(Calendar.objects.get(pk=self.calendar.pk).has_blackout_periods)
+
+    def test_calendar_flag_stale_instance(self):
+        calendar = Calendar.objects.get(pk=self.calendar.pk)
+        BlackoutPeriod.objects.filter(pk=self.blackout_period.pk).delete()
+        calendar.save()
+        self.assertFalse(Calendar.objects.get(pk=self.calendar.pk).has_blackout_periods)
+
+    def _get_occurrences(self):
+        return list(Occurrence.objects.filter(
+            schedule=self.schedule,
+            start__gte=utc.localize(datetime.datetime(2015, 2, 4)),
+            start__lt=utc.localize(datetime.datetime(2015, 2, 9))
+        ).order_by('start').values_list('pk', 'start'))
+
+    def test_move_materialized(self):
+        occurrences = self._get_occurrences()
+        blackout_period = BlackoutPeriod.objects.get(pk=self.blackout_period.pk)
+        blackout_period.start = utc.localize(datetime.datetime(2015, 2, 6))
+        blackout_period.end = utc.localize(datetime.datetime(2015, 2, 8))
+        blackout_period.save()
+        moved_occurrences = self._get_occurrences()
+        self.assertListEqual(
+            [start for pk, start in moved_occurrences],
+            [
+                utc.localize(datetime.datetime(2015, 2, 4, 14, 0)),
+                utc.localize(datetime.datetime(2015, 2, 5, 14, 0)),
+                utc.localize(datetime.datetime(2015, 2, 8, 14, 0)),
+            ]
+        )
+        # The occurrences outside of the periods aren't stored again
+        self.assertEqual(moved_occurrences[0], occurrences[0])
+        self.assertEqual(moved_occurrences[-1], occurrences[-1])
+
+        blackout_period.delete()
+        self.assertEqual(len(self._get_occurrences()), 5)
+
+    def test_clean(self):
+        blackout_period = BlackoutPeriod(
+            calendar=self.calendar, start=utc.localize(datetime.datetime(2015, 2, 7)),
+            end=utc.localize(datetime.datetime(2015, 2, 5)))
+        with self.assertRaises(ValidationError):
+            blackout_period.clean()
+
+    def _assert_between(self):
+        self.assertListEqual(
+            self._get_dates(utc.localize(datetime.datetime(2015, 2, 4)), utc.localize(datetime.datetime(2015, 2, 9))),
+            [
+                utc.localize(datetime.datetime(2015, 2, 4, 14, 0)),
+                utc.localize(datetime.datetime(2015, 2, 7, 14, 0)),
+                utc.localize(datetime.datetime(2015, 2, 8, 14, 0)),
+            ]
+        )
+
+    def test_between(self):
+        Schedule.objects.filter(pk=self.schedule.pk).update(materialized_after=None, materialized_before=None)
+        self._assert_between()
+
+    def test_between_materialized(self):
+        self.assertFalse(Occurrence.objects.filter(
+            schedule=self.schedule,
+            start__gte=self.blackout_period.start, start__lt=self.blackout_period.end).exists())
+        self.assertTrue(self.schedule.is_materialized(
+            utc.localize(datetime.datetime(2015, 2, 4)), utc.localize(datetime.datetime(2015, 2, 9))))
+        self._assert_between()
+
+    def test_at(self):
+        self.assertFalse([
+            transmission for transmission in Transmission.at(utc.localize(datetime.datetime(2015, 2, 5, 14, 30)))
+            if transmission.schedule.id == self.schedule.id
+        ])
+
+    def test_date_before(self):
+        self.assertEqual(
+            self.schedule.date_before(utc.localize(datetime.datetime(2015, 2, 6, 20, 0))),
+            utc.localize(datetime.datetime(2015, 2, 4, 14, 0)))
+
+    def test_date_after(self):
+        self.assertEqual(
+            self.schedule.date_after(utc.localize(datetime.datetime(2015, 2, 4, 20, 0))),
+            utc.localize(datetime.datetime(2015, 2, 7, 14, 0)))
+
+    def test_next_dates(self):
+        dates = next_dates(self.calendar, self.programme, utc.localize(datetime.datetime(2015, 2, 4, 20, 0)))
+        self.assertEqual(next(dates), utc.localize(datetime.datetime(2015, 2, 7, 14, 0)))
+
+    def test_another_calendar(self):
+        BlackoutPeriod.objects.create(
+            calendar=self.another_calendar,
+            start=utc.localize(datetime.datetime(2015, 2, 7)), end=utc.localize(datetime.datetime(2015, 2, 8)))
+        self.test_between()
+
+    def test_rearrange_episodes(self):
+        with mock.patch.object(Programme, 'rearrange_episodes') as rearrange_episodes:
+            with run_on_commit_callbacks():
+                BlackoutPeriod.objects.create(
+                    calendar=self.calendar,
+                    start=utc.localize(datetime.datetime(2015, 3, 1)), end=utc.localize(datetime.datetime(2015, 3, 2)))
+        self.assertTrue(rearrange_episodes.called)
+
+    def test_inactive_calendar_not_rearranged(self):
+        with mock.patch.object(Programme, 'rearrange_episodes') as rearrange_episodes:
+            with run_on_commit_callbacks():
+                BlackoutPeriod.objects.create(
+                    calendar=self.another_calendar,
+                    start=utc.localize(datetime.datetime(2015, 3, 1)), end=utc.localize(datetime.datetime(2015, 3, 2)))
+        self.assertFalse(rearrange_episodes.called)
+
+
+@override_settings(TIME_ZONE='UTC')
+class ExcludedDatesSyncTests(TestDataMixin, TestCase):
+    def setUp(self):
+        # The schedule is modified by the tests
+        self.schedule = Schedule.objects.get(pk=self.schedule.pk)
+        for day in range(10, 20):
+            self.schedule.exclude_date(utc.localize(datetime.datetime(2015, 1, day, 14, 0, 0)))
+        self.schedule.save()
+
+    def test_excluded_dates_follow_start_dt(self):
+        self.schedule.start_dt = self.schedule.start_dt.replace(hour=16)
+        with mock.patch.object(ExcludedDates, 'save') as save:
+            self.schedule.save()
+        self.assertFalse(save.called)
+        self.assertListEqual(
+            list(ExcludedDates.objects.filter(schedule=self.schedule).order_by('datetime').values_list(
+                'datetime', flat=True)),
+            [utc.localize(datetime.datetime(2015, 1, day, 16, 0, 0)) for day in range(10, 20)]
+        )
+        self.assertNotIn(
+            utc.localize(datetime.datetime(2015, 1, 12, 16, 0, 0)),
+            list(self.schedule.dates_between(
+                utc.localize(datetime.datetime(2015, 1, 11)), utc.localize(datetime.datetime(2015, 1, 13))))
+        )
+
+    def test_unchanged_excluded_dates_not_updated(self):
+        with mock.patch('radioco.apps.schedules.models.bulk_update') as bulk_update:
+            self.schedule.save()
+        bulk_update.assert_any_call(ExcludedDates, [], ['datetime'])
+
+
 @override_settings(TIME_ZONE='UTC')
 class CalendarModelTests(TestDataMixin, TestCase):
 
     def test_str(self):
         self.assertEqual(str(self.calendar), "Example")
 
+    def test_save_active_calendar(self):
+        with mock.patch.object(Calendar, 'rearrange_episodes') as rearrange_episodes:
+            calendar = Calendar.objects.get(pk=self.calendar.pk)
+            calendar.name = 'Renamed'
+            calendar.save()
+            self.assertFalse(rearrange_episodes.called)
+
+            another_calendar = Calendar.objects.get(pk=self.another_calendar.pk)
+            another_calendar.is_active = True
+            another_calendar.save()
+            rearrange_episodes.assert_called_once_with()
+        self.assertEqual(Calendar.get_active(), another_calendar)
+
+    def test_clone(self):
+        with run_on_commit_callbacks():
+            schedule = Schedule.objects.get(pk=self.schedule.pk)
+            schedule.exclude_date(utc.localize(datetime.datetime(2015, 1, 10, 14, 0, 0)))
+            schedule.save()
+            schedule.materialize_occurrences(
+                utc.localize(datetime.datetime(2015, 1, 1)), utc.localize(datetime.datetime(2015, 2, 1)))
+            broadcast = Schedule.objects.create(
+                programme=self.programme, type='B', calendar=self.calendar, source=schedule,
+                start_dt=utc.localize(datetime.datetime(2015, 1, 6, 20, 0, 0)))
+            BlackoutPeriod.objects.create(
+                calendar=self.calendar,
+                start=utc.localize(datetime.datetime(2015, 1, 20)), end=utc.localize(datetime.datetime(2015, 1, 21)))
+
+        with mock.patch.object(Programme, 'rearrange_episodes') as rearrange_episodes:
+            with run_on_commit_callbacks():
+                cloned_calendar = Calendar.objects.get(pk=self.calendar.pk).clone('Next season')
+        self.assertFalse(rearrange_episodes.called)
+        self.assertFalse(cloned_calendar.is_active)
+        self.assertTrue(cloned_calendar.has_blackout_periods)
+
+        cloned_schedule = cloned_calendar.schedule_set.get(start_dt=schedule.start_dt, programme=self.programme)
+        self.assertEqual(cloned_calendar.schedule_set.get(source__isnull=False).source, cloned_schedule)
+        self.assertNotEqual(cloned_schedule.pk, schedule.pk)
+        self.assertListEqual(
+            list(cloned_schedule.excludeddates_set.values_list('datetime', flat=True)),
+            [utc.localize(datetime.datetime(2015, 1, 10, 14, 0, 0))]
+        )
+        self.assertEqual(
+            Occurrence.objects.filter(schedule=cloned_schedule, calendar=cloned_calendar).count(),
+            Occurrence.objects.filter(schedule=schedule).count()
+        )
+
+        after = utc.localize(datetime.datetime(2015, 1, 1))
+        before = utc.localize(datetime.datetime(2015, 2, 1))
+        self.assertListEqual(
+            [
+                (transmission.schedule.programme_id, transmission.schedule.type, transmission.start)
+                for transmission in Transmission.between(
+                    after, before, schedules=Schedule.objects.filter(calendar=cloned_calendar))
+            ],
+            [
+                (transmission.schedule.programme_id, transmission.schedule.type, transmission.start)
+                for transmission in Transmission.between(
+                    after, before, schedules=Schedule.objects.filter(calendar=self.calendar))
+            ]
+        )
+        self.assertEqual(broadcast.source, schedule)
+
 
 class CalendarAdminTests(TestDataMixin, TestCase):
 
@@ -299,6 +638,42 @@ class CalendarAdminTests(TestDataMixin, TestCase):
             frozenset([_schedule.id for _schedule in cloned_calendar.schedule_set.all()]),
         )
 
+    def test_set_active(self):
+        with mock.patch.object(self.app_admin, 'message_user'):
+            self.app_admin.set_active(request=None, queryset=Calendar.objects.filter(id=self.another_calendar.id))
+        self.another_calendar.refresh_from_db()
+        self.assertFalse(self.another_calendar.is_active)
+        self.assertEqual(self.another_calendar.activations.get().status, CalendarActivation.PENDING)
+
+    @mock.patch('django.utils.timezone.now', partial(mock_now, dt=utc.localize(datetime.datetime(2015, 2, 1, 12))))
+    def test_compact_schedules(self):
+        schedule = Schedule.objects.get(pk=self.schedule.pk)
+        schedule.exclude_date(utc.localize(datetime.datetime(2015, 1, 10, 14, 0, 0)))
+        schedule.save()
+        with mock.patch.object(self.app_admin, 'message_user'):
+            self.app_admin.compact_schedules(request=None, queryset=Calendar.objects.filter(id=self.calendar.id))
+        self.assertEqual(Schedule.objects.get(pk=self.schedule.pk).start_dt.date(), datetime.date(2015, 2, 1))
+
+    def test_save_model_active(self):
+        self.another_calendar.is_active = True
+        with mock.patch.object(self.app_admin, 'message_user'):
+            self.app_admin.save_model(request=None, obj=self.another_calendar, form=None, change=True)
+        self.assertEqual(Calendar.get_active(), self.calendar)
+        self.assertTrue(self.another_calendar.activations.exists())
+
+    def test_save_model_already_active(self):
+        calendar = Calendar.objects.get(pk=self.calendar.pk)
+        with mock.patch.object(Calendar, 'rearrange_episodes') as rearrange_episodes:
+            self.app_admin.save_model(request=None, obj=calendar, form=None, change=True)
+        self.assertFalse(rearrange_episodes.called)
+        self.assertFalse(calendar.activations.exists())
+
+    def test_activation_progress(self):
+        self.assertEqual(self.app_admin.activation_progress(self.another_calendar), '')
+        CalendarActivation.objects.create(
+            calendar=self.another_calendar, status=CalendarActivation.RUNNING, total=10, processed=4)
+        self.assertEqual(self.app_admin.activation_progress(self.another_calendar), 'running 4/10')
+
     # @mock.patch('django.utils.timezone.now', mock_now)
     # @mock.patch('radioco.apps.schedules.utils.rearrange_programme_episodes')
     # def test_delete(self, rearrange_programme_episodes):
@@ -310,6 +685,101 @@ class CalendarAdminTests(TestDataMixin, TestCase):
     #     rearrange_programme_episodes.assert_has_calls(calls(), any_order=True)
 
 
+@override_settings(TIME_ZONE='UTC')
+class CalendarActivationTests(TestDataMixin, TestCase):
+
+    def test_activate_in_background(self):
+        activation = self.another_calendar.activate_in_background()
+        self.assertEqual(self.another_calendar.activate_in_background(), activation)
+        self.assertEqual(CalendarActivation.objects.claim(), activation)
+        self.assertIsNone(CalendarActivation.objects.claim())
+        activation.refresh_from_db()
+        self.assertEqual(activation.status, CalendarActivation.RUNNING)
+
+    def _claim_at(self, hour, minute):
+        dt = utc.localize(datetime.datetime(2015, 1, 1, hour, minute))
+        with mock.patch('django.utils.timezone.now', partial(mock_now, dt=dt)):
+            return CalendarActivation.objects.claim()
+
+    def test_claim_stale_activation(self):
+        activation = self.another_calendar.activate_in_background()
+        self._claim_at(0, 0)
+        # The worker died, the activation is still running
+        self.assertIsNone(self._claim_at(0, 59))
+        self.assertEqual(self.another_calendar.activate_in_background(), activation)
+        self.assertEqual(self._claim_at(1, 1), activation)
+        activation.refresh_from_db()
+        self.assertEqual(activation.status, CalendarActivation.RUNNING)
+        self.assertEqual(activation.started_at, utc.localize(datetime.datetime(2015, 1, 1, 1, 1)))
+
+    @mock.patch('django.utils.timezone.now', mock_now)
+    def test_run(self):
+        activation = self.another_calendar.activate_in_background()
+        activation.run()
+        activation.refresh_from_db()
+        self.assertEqual(activation.status, CalendarActivation.DONE)
+        self.assertEqual(activation.processed, Programme.objects.count())
+        self.assertEqual(Calendar.get_active(), self.another_calendar)
+        # The new calendar doesn't have live schedules
+        self.assertFalse(Episode.objects.filter(issue_date__isnull=False).exists())
+
+    @mock.patch('django.utils.timezone.now', mock_now)
+    def test_run_failed(self):
+        activation = self.another_calendar.activate_in_background()
+        with mock.patch.object(Programme, 'get_episode_moves', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                activation.run()
+        activation.refresh_from_db()
+        self.assertEqual(activation.status, CalendarActivation.FAILED)
+        self.assertIn('ValueError', activation.error)
+        self.assertEqual(Calendar.get_active(), self.calendar)
+        self.assertTrue(Episode.objects.filter(issue_date__isnull=False).exists())
+
+    @mock.patch('django.utils.timezone.now', mock_now)
+    def test_command(self):
+        self.another_calendar.activate_in_background()
+        call_command('process_calendar_activations', once=True, workers=1, stdout=mock.MagicMock())
+        self.assertEqual(Calendar.get_active(), self.another_calendar)
+
+
+@override_settings(TIME_ZONE='UTC')
+class CalendarActivationWorkersTests(TestDataMixin, TransactionTestCase):
+    # The forked processes only see committed data through their own connections
+    def setUp(self):
+        self.setUpTestData()
+
+    @mock.patch('django.utils.timezone.now', mock_now)
+    def test_run_workers(self):
+        expected = {
+            move.episode.pk: move.new_issue_date
+            for programme in Programme.objects.all()
+            for move in programme.get_episode_moves(mock_now(), self.another_calendar)
+        }
+        activation = self.another_calendar.activate_in_background()
+        activation.run(workers=2)
+        activation.refresh_from_db()
+        self.assertEqual(activation.status, CalendarActivation.DONE)
+        self.assertEqual(activation.processed, Programme.objects.count())
+        self.assertEqual(Calendar.get_active(), self.another_calendar)
+        self.assertDictEqual(
+            dict(Episode.objects.filter(pk__in=expected.keys()).values_list('pk', 'issue_date')), expected)
+
+
+@override_settings(TIME_ZONE='UTC')
+class RecomputeEffectiveDatesWorkersTests(TestDataMixin, TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('The changes of the processes are only visible through a shared database')
+        self.setUpTestData()
+
+    def test_command_parallel(self):
+        Schedule.objects.update(effective_start_dt=None, effective_end_dt=None)
+        stdout = StringIO()
+        call_command('recompute_effective_dates', parallel=2, batch_size=2, stdout=stdout)
+        self.assertIn('%s of %s schedules updated' % ((Schedule.objects.count(), ) * 2), stdout.getvalue())
+        self.assertFalse(Schedule.objects.filter(effective_start_dt__isnull=True).exists())
+
+
 @override_settings(TIME_ZONE='UTC')
 class TransmissionModelTests(TestDataMixin, TestCase):
     def setUp(self):
@@ -362,6 +832,25 @@ class TransmissionModelTests(TestDataMixin, TestCase):
         now = Transmission.at(utc.localize(datetime.datetime(2015, 1, 6, 13, 0, 0)))
         self.assertListEqual(list(now), [])
 
+    @mock.patch('django.utils.timezone.now', partial(mock_now, dt=utc.localize(datetime.datetime(2015, 1, 6, 10))))
+    def test_at_index(self):
+        TransmissionIndex.clear()
+        for hour, minute in [(11, 59), (12, 0), (12, 59), (13, 0), (14, 30)]:
+            at = utc.localize(datetime.datetime(2015, 1, 6, hour, minute))
+            expected = [(t.slug, t.start, t.episode) for t in Transmission._at(at)]
+            self.assertListEqual([(t.slug, t.start, t.episode) for t in Transmission.at(at)], expected)
+
+        with self.assertNumQueries(0):
+            list(Transmission.at(utc.localize(datetime.datetime(2015, 1, 6, 12, 30))))
+
+    @mock.patch('django.utils.timezone.now', partial(mock_now, dt=utc.localize(datetime.datetime(2015, 1, 6, 10))))
+    def test_at_index_invalidation(self):
+        at = utc.localize(datetime.datetime(2015, 1, 6, 14, 30))
+        self.assertListEqual([t.slug for t in Transmission.at(at)], ['classic-hits'])
+        self.schedule.start_dt = utc.localize(datetime.datetime(2015, 1, 1, 15, 0, 0))
+        self.schedule.save()
+        self.assertListEqual([t.slug for t in Transmission.at(at)], [])
+
     def test_between(self):
         between = Transmission.between(
             utc.localize(datetime.datetime(2015, 1, 6, 11, 0, 0)),
@@ -372,6 +861,34 @@ class TransmissionModelTests(TestDataMixin, TestCase):
              ('local-gossips', utc.localize(datetime.datetime(2015, 1, 6, 12, 0))),
              ('classic-hits', utc.localize(datetime.datetime(2015, 1, 6, 14, 0)))])
 
+    def test_between_episodes_by_programme(self):
+        dt = utc.localize(datetime.datetime(2015, 1, 6, 14, 0, 0))
+        programme = Programme.objects.create(name='Same time', current_season=1, runtime=60)
+        Schedule.objects.create(programme=programme, calendar=self.calendar, type='L', start_dt=dt)
+        episode = Episode.objects.create_episode(date=dt, programme=programme)
+
+        with self.assertNumQueries(2):
+            between = list(Transmission.between(dt, dt + datetime.timedelta(hours=1)))
+        self.assertListEqual(
+            sorted([(t.slug, t.episode) for t in between]),
+            [('classic-hits', self.episode_in_transmission), ('same-time', episode)])
+
+    def test_next(self):
+        transmissions = Transmission.next(utc.localize(datetime.datetime(2015, 1, 6, 11, 30, 0)), 3)
+        self.assertListEqual(
+            [(t.slug, t.start) for t in transmissions],
+            [('the-best-wine', utc.localize(datetime.datetime(2015, 1, 6, 11, 0))),
+             ('local-gossips', utc.localize(datetime.datetime(2015, 1, 6, 12, 0))),
+             ('classic-hits', utc.localize(datetime.datetime(2015, 1, 6, 14, 0)))])
+        self.assertEqual(transmissions[2].episode, self.episode_in_transmission)
+
+    def test_next_same_as_between(self):
+        after = utc.localize(datetime.datetime(2015, 1, 6, 11, 30, 0))
+        between = Transmission.between(after, after + datetime.timedelta(days=7))
+        self.assertListEqual(
+            [(t.slug, t.start) for t in Transmission.next(after, 20)],
+            [(t.slug, t.start) for t in islice(between, 20)])
+
     def test_between_by_queryset(self):
         between = Transmission.between(
             utc.localize(datetime.datetime(2015, 1, 6, 12, 0, 0)),
@@ -395,12 +912,13 @@ class ScheduleUtilsTests(TestDataMixin, TestCase):
         programme.save()
         self.programme = programme
 
-        Schedule.objects.get_or_create(
-            programme=programme,
-            type='L',
-            calendar=self.calendar,
-            recurrences=recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.DAILY)]),
-            start_dt=pytz.utc.localize(datetime.datetime(2015, 1, 1, 14, 0, 0)))
+        with run_on_commit_callbacks():
+            Schedule.objects.get_or_create(
+                programme=programme,
+                type='L',
+                calendar=self.calendar,
+                recurrences=recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.DAILY)]),
+                start_dt=pytz.utc.localize(datetime.datetime(2015, 1, 1, 14, 0, 0)))
 
         for number in range(1, 11):
             Episode.objects.create(
@@ -431,6 +949,40 @@ class ScheduleUtilsTests(TestDataMixin, TestCase):
         with self.assertRaises(StopIteration):
             next(dates)
 
+    def test_available_dates_same_time(self):
+        Schedule.objects.create(
+            programme=self.programme,
+            calendar=self.calendar,
+            type="L",
+            start_dt=utc.localize(datetime.datetime(2015, 1, 6, 14, 0, 0)),
+            recurrences=recurrence.Recurrence(
+                rrules=[recurrence.Rule(recurrence.WEEKLY)]))
+
+        dates = next_dates(self.calendar, self.programme, utc.localize(datetime.datetime(2015, 1, 5)))
+        self.assertEqual(next(dates), utc.localize(datetime.datetime(2015, 1, 5, 14, 0)))
+        self.assertEqual(next(dates), utc.localize(datetime.datetime(2015, 1, 6, 14, 0)))
+        self.assertEqual(next(dates), utc.localize(datetime.datetime(2015, 1, 7, 14, 0)))
+
+    def test_available_dates_match_date_after(self):
+        Schedule.objects.create(
+            programme=self.programme,
+            calendar=self.calendar,
+            type="L",
+            start_dt=utc.localize(datetime.datetime(2015, 1, 6, 16, 0, 0)),
+            recurrences=recurrence.Recurrence(
+                rrules=[recurrence.Rule(recurrence.MONTHLY, bymonthday=[6, 20])]))
+        schedules = Schedule.objects.filter(programme=self.programme, type='L', calendar=self.calendar)
+
+        expected = []
+        after = utc.localize(datetime.datetime(2014, 12, 20))
+        for _ in range(60):
+            after = min(filter(None, [schedule.date_after(after) for schedule in schedules]))
+            expected.append(after)
+            after += datetime.timedelta(seconds=1)
+
+        dates = next_dates(self.calendar, self.programme, utc.localize(datetime.datetime(2014, 12, 20)))
+        self.assertListEqual([next(dates) for _ in range(60)], expected)
+
     def test_rearrange_episodes(self):
         self.programme.rearrange_episodes(pytz.utc.localize(datetime.datetime(2015, 1, 1)), Calendar.get_active())
         self.assertListEqual(
@@ -444,22 +996,80 @@ class ScheduleUtilsTests(TestDataMixin, TestCase):
             ]
         )
 
+    def test_rearrange_episodes_on_commit(self):
+        schedule = self.programme.schedule_set.get(type='L')
+        with mock.patch.object(Programme, 'rearrange_episodes') as rearrange_episodes:
+            with run_on_commit_callbacks():
+                schedule.save()
+                schedule.save()
+                self.assertFalse(rearrange_episodes.called)
+        self.assertEqual(rearrange_episodes.call_count, 1)
+
+    def test_rearrange_episodes_on_commit_rollback(self):
+        schedule = self.programme.schedule_set.get(type='L')
+        with mock.patch.object(Programme, 'rearrange_episodes') as rearrange_episodes:
+            with run_on_commit_callbacks():
+                try:
+                    with transaction.atomic():
+                        schedule.save()
+                        raise DatabaseError
+                except DatabaseError:
+                    pass
+                schedule.save()
+        self.assertEqual(rearrange_episodes.call_count, 1)
+
+    def test_suspend_rearrange_episodes(self):
+        schedule = self.programme.schedule_set.get(type='L')
+        with mock.patch.object(Programme, 'rearrange_episodes') as rearrange_episodes:
+            with run_on_commit_callbacks():
+                with suspend_rearrange_episodes() as skipped:
+                    schedule.save()
+        self.assertFalse(rearrange_episodes.called)
+        self.assertSetEqual(skipped, {self.programme})
+
+    def test_rearrange_episodes_unchanged(self):
+        calendar = Calendar.get_active()
+        with self.assertNumQueries(2):
+            moves = self.programme.rearrange_episodes(pytz.utc.localize(datetime.datetime(2015, 1, 1)), calendar)
+        self.assertListEqual(moves, [])
+
+    def test_rearrange_episodes_moves(self):
+        episode = self.programme.episode_set.get(season=1, number_in_season=3)
+        Episode.objects.filter(pk=episode.pk).update(issue_date=None)
+
+        moves = self.programme.rearrange_episodes(
+            pytz.utc.localize(datetime.datetime(2015, 1, 1)), Calendar.get_active())
+        self.assertListEqual(
+            [(move.episode.pk, move.old_issue_date, move.new_issue_date) for move in moves],
+            [(episode.pk, None, utc.localize(datetime.datetime(2015, 1, 3, 14, 0)))]
+        )
+        episode.refresh_from_db()
+        self.assertEqual(episode.issue_date, utc.localize(datetime.datetime(2015, 1, 3, 14, 0)))
+
+    def test_rearrange_episodes_unschedule(self):
+        Schedule.objects.filter(programme=self.programme).delete()
+        moves = self.programme.rearrange_episodes(
+            pytz.utc.localize(datetime.datetime(2015, 1, 1)), Calendar.get_active())
+        self.assertEqual(len(moves), 10)
+        self.assertFalse(self.programme.episode_set.filter(issue_date__isnull=False).exists())
+
     @mock.patch('django.utils.timezone.now', partial(mock_now, dt=utc.localize(datetime.datetime(2015, 1, 1))))
     def test_rearrange_episodes_new_schedule(self):
-        # Next calendar shouldn't appear due to doesn't belong to the active calendar
-        Schedule.objects.create(
-            programme=self.programme,
-            calendar=Calendar.objects.create(),
-            type="L",
-            start_dt=utc.localize(datetime.datetime(2015, 1, 3, 16, 0, 0)),
-            recurrences=recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.WEEKLY)]))
-
-        Schedule.objects.create(
-            programme=self.programme,
-            calendar=self.calendar,
-            type="L",
-            start_dt=utc.localize(datetime.datetime(2015, 1, 3, 17, 0, 0)),
-            recurrences=recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.WEEKLY)]))
+        with run_on_commit_callbacks():
+            # Next calendar shouldn't appear due to doesn't belong to the active calendar
+            Schedule.objects.create(
+                programme=self.programme,
+                calendar=Calendar.objects.create(),
+                type="L",
+                start_dt=utc.localize(datetime.datetime(2015, 1, 3, 16, 0, 0)),
+                recurrences=recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.WEEKLY)]))
+
+            Schedule.objects.create(
+                programme=self.programme,
+                calendar=self.calendar,
+                type="L",
+                start_dt=utc.localize(datetime.datetime(2015, 1, 3, 17, 0, 0)),
+                recurrences=recurrence.Recurrence(rrules=[recurrence.Rule(recurrence.WEEKLY)]))
         # save should call rearrange
         # rearrange_programme_episodes(self.programme, pytz.utc.localize(datetime.datetime(2015, 1, 1)))
         self.assertListEqual(
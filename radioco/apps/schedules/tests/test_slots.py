@@ -0,0 +1,135 @@
+import datetime
+
+import mock
+import pytz
+from django.test import TestCase
+from django.test import override_settings
+from pytz import utc
+
+from radioco.apps.global_settings.models import CalendarConfiguration
+from radioco.apps.programmes.models import Programme
+from radioco.apps.radioco.test_utils import TestDataMixin
+from radioco.apps.schedules.models import BlackoutPeriod
+from radioco.apps.schedules.models import Schedule
+from radioco.apps.schedules.slots import find_free_slots, get_free_slots, get_slot_windows, get_week_start, \
+    find_slot_programmes, run_length_encode, get_week_occupancy
+
+
+SLOT_DURATION = datetime.timedelta(minutes=30)
+
+
+def _dt(day, hour, minute=0):
+    return utc.localize(datetime.datetime(2015, 1, day, hour, minute))
+
+
+@override_settings(TIME_ZONE='UTC')
+class SlotsTests(TestDataMixin, TestCase):
+    def setUp(self):
+        self.calendar_configuration = CalendarConfiguration(
+            slot_duration=SLOT_DURATION, min_time=datetime.time(8, 0), max_time=datetime.time(16, 0))
+
+    def test_windows(self):
+        self.assertListEqual(
+            list(get_slot_windows(
+                datetime.date(2015, 1, 1), datetime.date(2015, 1, 2), utc, self.calendar_configuration)),
+            [(_dt(1, 8), _dt(1, 16)), (_dt(2, 8), _dt(2, 16))]
+        )
+
+    def test_windows_rounded_to_slots(self):
+        self.calendar_configuration.max_time = datetime.time(23, 59, 59)
+        self.assertListEqual(
+            list(get_slot_windows(
+                datetime.date(2015, 1, 1), datetime.date(2015, 1, 1), utc, self.calendar_configuration)),
+            [(_dt(1, 8), _dt(2, 0))]
+        )
+
+    def test_find_free_slots(self):
+        windows = [(_dt(1, 8), _dt(1, 16)), (_dt(2, 8), _dt(2, 16))]
+        busy_intervals = [
+            (_dt(1, 7), _dt(1, 9)),
+            (_dt(1, 10, 10), _dt(1, 11)),
+            (_dt(1, 12), _dt(1, 12, 40)),
+            (_dt(1, 15, 30), _dt(2, 9)),
+        ]
+        self.assertListEqual(
+            list(find_free_slots(busy_intervals, windows, SLOT_DURATION)),
+            [
+                (_dt(1, 9), _dt(1, 10)),
+                (_dt(1, 11), _dt(1, 12)),
+                (_dt(1, 13), _dt(1, 15, 30)),
+                (_dt(2, 9), _dt(2, 16)),
+            ]
+        )
+        self.assertListEqual(
+            list(find_free_slots(busy_intervals, windows, SLOT_DURATION, min_duration=datetime.timedelta(hours=2))),
+            [(_dt(1, 13), _dt(1, 15, 30)), (_dt(2, 9), _dt(2, 16))]
+        )
+
+    def test_find_free_slots_without_transmissions(self):
+        windows = [(_dt(1, 8), _dt(1, 16))]
+        self.assertListEqual(list(find_free_slots([], windows, SLOT_DURATION)), windows)
+
+    def test_get_free_slots(self):
+        # Transmissions from 8 to 9, 10 to 13 and 14 to 15
+        self.assertListEqual(
+            list(get_free_slots(
+                self.calendar, datetime.date(2015, 1, 5), datetime.date(2015, 1, 5), utc, self.calendar_configuration)),
+            [(_dt(5, 9), _dt(5, 10)), (_dt(5, 13), _dt(5, 14)), (_dt(5, 15), _dt(5, 16))]
+        )
+
+    def test_get_free_slots_timezone(self):
+        tz = pytz.timezone('Europe/Madrid')
+        self.assertListEqual(
+            list(get_free_slots(
+                self.calendar, datetime.date(2015, 1, 5), datetime.date(2015, 1, 5), tz, self.calendar_configuration)),
+            [(_dt(5, 7), _dt(5, 8)), (_dt(5, 9), _dt(5, 10)), (_dt(5, 13), _dt(5, 14))]
+        )
+
+    @mock.patch('django.utils.timezone.now', lambda: _dt(1, 0))
+    def test_get_free_slots_blackout_period(self):
+        BlackoutPeriod.objects.create(calendar=self.calendar, start=_dt(5, 0), end=_dt(6, 0))
+        self.assertListEqual(
+            list(get_free_slots(
+                self.calendar, datetime.date(2015, 1, 5), datetime.date(2015, 1, 5), utc, self.calendar_configuration)),
+            [(_dt(5, 8), _dt(5, 16))]
+        )
+
+    def test_week_start(self):
+        self.calendar_configuration.first_day = 6  # Sunday
+        self.assertEqual(
+            get_week_start(datetime.date(2015, 1, 7), self.calendar_configuration), datetime.date(2015, 1, 4))
+        self.assertEqual(
+            get_week_start(datetime.date(2015, 1, 4), self.calendar_configuration), datetime.date(2015, 1, 4))
+
+    def test_run_length_encode(self):
+        self.assertListEqual(run_length_encode([]), [])
+        self.assertListEqual(run_length_encode([None, None, 1, 1, 1, None, 2]), [[None, 2], [1, 3], [None, 1], [2, 1]])
+
+    def test_find_slot_programmes(self):
+        programme = Programme(id=1, _runtime=40)
+        other_programme = Programme(id=2, _runtime=60)
+        transmission_dates = [
+            (_dt(1, 7, 50), Schedule(programme=programme)),
+            (_dt(1, 8, 40), Schedule(programme=other_programme)),
+            (_dt(1, 9, 40), Schedule(programme=programme)),
+        ]
+        self.assertListEqual(
+            find_slot_programmes(transmission_dates, [(_dt(1, 8), _dt(1, 11))], SLOT_DURATION),
+            [1, 2, 2, 1, 1, None]
+        )
+
+    def test_get_week_occupancy(self):
+        windows, programme_ids = get_week_occupancy(
+            self.calendar, datetime.date(2015, 1, 5), utc, self.calendar_configuration)
+        self.assertEqual(len(windows), 7)
+        self.assertEqual(len(programme_ids), 7 * 16)
+        # Every day from 8 to 16: Morning News, a free hour, 3 programmes, a free hour, Classic hits and a free hour
+        ids = {programme.slug: programme.id for programme in Programme.objects.all()}
+        self.assertListEqual(
+            run_length_encode(programme_ids[:16]),
+            [
+                [ids['morning-news'], 2], [None, 2], [ids['places-to-go'], 2], [ids['the-best-wine'], 2],
+                [ids['local-gossips'], 2], [None, 2], [ids['classic-hits'], 2], [None, 2],
+            ]
+        )
+        self.assertListEqual(programme_ids[16:32], programme_ids[:16])
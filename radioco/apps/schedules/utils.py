@@ -1,4 +1,4 @@
-import datetime
+import heapq
 
 
 def next_dates(calendar, programme, after):
@@ -10,17 +10,12 @@ def next_dates(calendar, programme, after):
 
     from radioco.apps.schedules.models import Schedule
     # Only taking into account schedules which belong to the active calendar
-    schedules = Schedule.objects.filter(programme=programme, type='L', calendar=calendar)
-
-    while True:
-        candidates = [s.date_after(after) for s in schedules]
-        try:
-            next_date = min([_dt for _dt in candidates if _dt is not None])
-        except ValueError:
-            break
-
-        yield next_date
-        after = next_date + datetime.timedelta(seconds=1)
-        # schedules = filter(lambda t: t[1] is not None, zip(schedules, candidates))
-        schedules = [_tuple[0] for _tuple in zip(schedules, candidates) if _tuple[1] is not None]
+    schedules = Schedule.objects.filter(
+        programme=programme, type='L', calendar=calendar).select_related('programme', 'calendar')
 
+    # Every schedule is a sorted iterator, merging them we only advance the one with the smallest date
+    last_date = None
+    for date in heapq.merge(*[schedule.dates_after(after) for schedule in schedules]):
+        if date != last_date:
+            yield date
+        last_date = date
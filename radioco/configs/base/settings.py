@@ -187,6 +187,26 @@ FILEBROWSER_ADMIN_VERSIONS = [
 
 USERNAME_RADIOCO_RECORDER = 'RadioCo_Recorder'
 
+# Period of time (around now) where transmissions are stored instead of calculated
+TRANSMISSIONS_HORIZON_PAST_DAYS = 90
+TRANSMISSIONS_HORIZON_FUTURE_DAYS = 365
+
+# Seconds to keep the transmissions API responses, they are discarded when schedules change
+TRANSMISSIONS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Maximum number of transmissions returned in a page of the transmissions API
+TRANSMISSIONS_MAX_LIMIT = 500
+
+# Number of compiled schedules (recurrence rules ready to be expanded) kept in memory by each process
+COMPILED_SCHEDULES_CACHE_SIZE = 5000
+
+# Reject schedules created through the API overlapping other transmissions during the next days
+SCHEDULE_OVERLAP_VALIDATION = False
+SCHEDULE_OVERLAP_VALIDATION_DAYS = 365
+
+# Minutes after which a running calendar activation is considered dead and can be claimed again
+CALENDAR_ACTIVATION_TIMEOUT_MINUTES = 60
+
 # CKEditor
 CKEDITOR_UPLOAD_PATH = "uploads/"
 CKEDITOR_JQUERY_URL = '//ajax.googleapis.com/ajax/libs/jquery/2.1.1/jquery.min.js'